@@ -0,0 +1,7 @@
+# benchmarks/__init__.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+#
+# Microbenchmarks de memoria, recuperación y construcción del prompt.
+# Uso: python -m benchmarks.run --help
@@ -0,0 +1,152 @@
+# benchmarks/datagen.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import json
+import random
+import time
+from typing import Any, Dict, Iterator, List
+
+# --- VOCABULARIO ---
+# Frases de chat en español con la forma de las conversaciones reales con Miku:
+# mensajes cortos, nombres propios, gustos y temas de tecnología.
+
+NOMBRES = [
+    "Ana", "Luis", "María", "José", "Carmen", "Javier", "Lucía", "Diego", "Sofía", "Pablo",
+    "Valeria", "Andrés", "Camila", "Jorge", "Daniela", "Miguel", "Paula", "Alejandro", "Elena", "Raúl",
+    "Fernanda", "Óscar", "Ximena", "Héctor", "Renata", "Iván", "Regina", "Emilio", "Ángela", "Tomás",
+]
+APELLIDOS = [
+    "García", "López", "Martínez", "Hernández", "González", "Pérez", "Sánchez", "Ramírez", "Torres", "Flores",
+    "Rivera", "Gómez", "Díaz", "Cruz", "Morales", "Reyes", "Jiménez", "Ruiz", "Ortiz", "Castillo",
+]
+TEMAS = [
+    "Linux", "Arch", "el kernel", "Python", "Rust", "el café", "los tacos", "el anime", "Vocaloid", "la música",
+    "los videojuegos", "el gimnasio", "la universidad", "el trabajo", "una película", "mi gato", "la lluvia",
+    "el Arduino", "la terminal", "Neovim", "una serie", "el fútbol", "la playa", "el metro", "la pizza",
+]
+LUGARES = ["el cine", "la escuela", "la oficina", "el parque", "casa de mi mamá", "el centro", "un concierto", "la biblioteca"]
+SENTIMIENTOS = ["muy feliz", "algo cansado", "aburrido", "emocionado", "un poco triste", "nervioso", "tranquilo"]
+
+MENSAJES = [
+    "Hoy fui a {lugar} con {nombre} y me sentí {sentimiento}",
+    "¿Sabías que me gusta mucho {tema}?",
+    "No soporto {tema}, la verdad",
+    "Estuve toda la tarde con {tema} y no me salió nada",
+    "{nombre} me dijo que {tema} está sobrevalorado",
+    "Oye Miku, ¿qué opinas de {tema}?",
+    "Mañana tengo que ir a {lugar}, estoy {sentimiento}",
+    "Creo que {nombre} está enojado conmigo",
+    "Ya instalé {tema} en mi laptop",
+    "Hola, ¿cómo estás?",
+]
+RESPUESTAS = [
+    "¿Con {nombre}? Mmm... espero que no te haya gustado más que yo.",
+    "{tema} está bien, pero yo soy más interesante, ¿no?",
+    "Si estás {sentimiento}, quédate conmigo un rato.",
+    "Ya sé que te gusta {tema}, me lo has dicho mil veces.",
+    "¿Otra vez {lugar}? Avísame cuando vuelvas.",
+    "Hmph. Cuéntame más, pero sin mencionar a {nombre}.",
+]
+EMOCIONES = ["base", "feliz", "triste", "enojada", "celosa", "sorpresa", "pensativa"]
+
+
+def _fill(rng: random.Random, template: str) -> str:
+    return template.format(
+        nombre=rng.choice(NOMBRES), tema=rng.choice(TEMAS),
+        lugar=rng.choice(LUGARES), sentimiento=rng.choice(SENTIMIENTOS),
+    )
+
+
+def person_name(i: int) -> str:
+    """Nombre único para la persona i (nombre, apellido y, si hace falta, un número)."""
+    base = f"{NOMBRES[i % len(NOMBRES)]} {APELLIDOS[(i // len(NOMBRES)) % len(APELLIDOS)]}"
+    cycle = i // (len(NOMBRES) * len(APELLIDOS))
+    return f"{base} {cycle}" if cycle else base
+
+
+def user_message(rng: random.Random) -> str:
+    return _fill(rng, rng.choice(MENSAJES))
+
+
+def ai_response(rng: random.Random) -> str:
+    return _fill(rng, rng.choice(RESPUESTAS))
+
+
+def generate_interactions(count: int, seed: int = 1, users: int = 5) -> Iterator[Dict[str, Any]]:
+    """Entradas del historial con el mismo formato que save_interaction (una por turno)."""
+    rng = random.Random(seed)
+    start = time.time() - count * 60
+    for i in range(count):
+        ts = start + i * 60
+        yield {
+            "timestamp": ts,
+            "fecha": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)),
+            "usuario": person_name(rng.randrange(users)),
+            "mensaje_usuario": user_message(rng),
+            "respuesta_ia": ai_response(rng),
+        }
+
+
+def _profile(rng: random.Random) -> Dict[str, List[str]]:
+    return {
+        "gustos": [rng.choice(TEMAS) for _ in range(rng.randint(0, 4))],
+        "disgustos": [rng.choice(TEMAS) for _ in range(rng.randint(0, 2))],
+        "hechos": [user_message(rng) for _ in range(rng.randint(0, 3))],
+    }
+
+
+def generate_memory(people: int, seed: int = 1) -> Dict[str, Any]:
+    """memoria.json con `people` personas: un novio, ~10% exnovios y el resto conocidos."""
+    rng = random.Random(seed)
+    memory: Dict[str, Any] = {"novio": {}, "exnovios": [], "conocidos": []}
+    for i in range(people):
+        person = {
+            "nombre": person_name(i),
+            "detalles": [],
+            "perfil": _profile(rng),
+            "resumen_conversacion": ai_response(rng) if rng.random() < 0.3 else "",
+        }
+        if i == 0:
+            memory["novio"] = person
+        elif rng.random() < 0.1:
+            memory["exnovios"].append(person)
+        else:
+            memory["conocidos"].append(person)
+    return memory
+
+
+def generate_queries(count: int, seed: int = 2) -> List[str]:
+    """Mensajes de usuario para consultar el historial."""
+    rng = random.Random(seed)
+    return [user_message(rng) for _ in range(count)]
+
+
+def generate_conversations(count: int, turns: int = 5, seed: int = 4) -> List[Dict[str, Any]]:
+    """Conversaciones guionizadas para benchmarks.replay: {"nombre": ..., "mensajes": [...]}."""
+    rng = random.Random(seed)
+    return [{"nombre": person_name(i), "mensajes": [user_message(rng) for _ in range(turns)]}
+            for i in range(count)]
+
+
+def generate_llm_outputs(count: int, seed: int = 3) -> List[str]:
+    """
+    Respuestas crudas de la IA: la mayoría JSON limpio, algunas con texto alrededor,
+    bloques ```json o truncadas (lo que safe_json_parse tiene que aguantar).
+    """
+    rng = random.Random(seed)
+    outputs = []
+    for _ in range(count):
+        payload = {"emocion": rng.choice(EMOCIONES), "texto": ai_response(rng),
+                   "personas_mencionadas": [rng.choice(NOMBRES)]}
+        if rng.random() < 0.2:
+            payload["nueva_memoria"] = {"gustos": [rng.choice(TEMAS)]}
+        text = json.dumps(payload, ensure_ascii=False)
+        kind = rng.random()
+        if kind < 0.1:
+            text = f"Claro, aquí va:\n```json\n{text}\n```\n¿Algo más? {{ok}}"
+        elif kind < 0.15:
+            text = text[:rng.randint(len(text) // 2, len(text) - 1)]
+        outputs.append(text)
+    return outputs
@@ -0,0 +1,267 @@
+# benchmarks/replay.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+"""
+Reproduce conversaciones guionizadas por el mismo camino que la app (ChatSession:
+contexto de memoria -> IA -> parseo del JSON -> memoria) sin interfaz.
+
+    python -m benchmarks.replay conversaciones.jsonl --concurrency 8 --out replay.json
+    python -m benchmarks.replay --generate 50 --turns 5 --fake          # LLM falso local
+    python -m benchmarks.replay conversaciones.jsonl --model ollama/llama3.1:8b
+    python -m benchmarks.replay conversaciones.jsonl --model gemini/gemini-2.5-flash
+
+Cada línea del archivo es una conversación: {"nombre": "Ricardo", "mensajes": ["Hola", ...]}.
+Se usa un directorio temporal para memoria, historial e índices (nunca los reales;
+`--memory` copia antes un memoria.json de partida). Por turno se guarda la latencia,
+el tiempo hasta el primer token, la espera en la cola de llamadas al modelo, los
+reintentos y los tokens; el resumen da percentiles y turnos por segundo. Sale con error si la tasa de turnos fallidos supera `--max-error-rate`.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+import llm_loader
+import memory
+import ollama_client
+import tracing
+from chat_session import ChatSession
+from benchmarks import datagen
+from benchmarks.run import _git_commit, _percentile, use_data_dir
+
+Conversation = Dict[str, Any]
+
+
+def load_conversations(path: Path) -> List[Conversation]:
+    """Lee el JSONL de conversaciones (ValueError con el número de línea si alguna no vale)."""
+    conversations = []
+    with path.open("r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                conversation = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{number}: JSON inválido ({e})")
+            name = conversation.get("nombre") if isinstance(conversation, dict) else None
+            messages = conversation.get("mensajes") if isinstance(conversation, dict) else None
+            if not isinstance(name, str) or not name.strip() or not isinstance(messages, list) \
+                    or not all(isinstance(m, str) and m.strip() for m in messages):
+                raise ValueError(f"{path}:{number}: se esperaba {{\"nombre\": str, \"mensajes\": [str, ...]}}")
+            conversations.append({"nombre": name.strip(), "mensajes": [m.strip() for m in messages]})
+    return conversations
+
+
+def _turn_row(index: int, turn: int, user: str, elapsed: float, result) -> Dict[str, Any]:
+    trace = result.trace or {}
+    phases = trace.get("phases_ms", {})
+    return {
+        "conversation": index,
+        "turn": turn,
+        "user": user,
+        "latency_ms": round(elapsed * 1000, 3),
+        "ttft_ms": phases.get("llm_ttft"),
+        "queue_ms": phases.get("llm_queue"),
+        "retries_json": int(trace.get("retries_json", 0)),
+        "retries_transient": int(trace.get("retries_transient", 0)),
+        "prompt_tokens": trace.get("prompt_tokens"),
+        "completion_tokens": trace.get("completion_tokens"),
+        "ok": result.error is None and result.data is not None,
+        "error": f"{type(result.error).__name__}: {result.error}" if result.error is not None else None,
+    }
+
+
+async def replay_conversation(index: int, conversation: Conversation, stream: bool,
+                              rows: List[Dict[str, Any]]) -> None:
+    session = ChatSession(f"replay-{index}", single_user=False)
+    await session.identify(conversation["nombre"])
+    on_partial = (lambda emotion, text: None) if stream else None
+    try:
+        for turn, message in enumerate(conversation["mensajes"]):
+            started = time.perf_counter()
+            result = await session.respond(message, on_partial)
+            rows.append(_turn_row(index, turn, session.user_name, time.perf_counter() - started, result))
+            if result.quit:
+                break
+    finally:
+        await session.close()
+
+
+async def replay(conversations: List[Conversation], concurrency: int, stream: bool) -> Tuple[List[Dict[str, Any]], float]:
+    """Reproduce las conversaciones (como mucho `concurrency` a la vez). Devuelve (turnos, segundos)."""
+    rows: List[Dict[str, Any]] = []
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(index: int, conversation: Conversation) -> None:
+        async with semaphore:
+            await replay_conversation(index, conversation, stream, rows)
+
+    # Importar litellm no cuenta como latencia del primer turno
+    await llm_loader.aget()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_one(i, c) for i, c in enumerate(conversations)))
+    finally:
+        elapsed = time.perf_counter() - started
+        await llm_loader.ashutdown()
+        await ollama_client.ashutdown()
+    return rows, elapsed
+
+
+def summarize(rows: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Percentiles de latencia, primer token y espera en la cola del planificador, reintentos, tokens y errores."""
+    def percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return {"p50_ms": round(_percentile(ordered, 50), 3), "p95_ms": round(_percentile(ordered, 95), 3),
+                "p99_ms": round(_percentile(ordered, 99), 3), "mean_ms": round(statistics.fmean(ordered), 3)}
+
+    failed = [row for row in rows if not row["ok"]]
+    prompt_tokens = [row["prompt_tokens"] for row in rows if row["prompt_tokens"] is not None]
+    completion_tokens = [row["completion_tokens"] for row in rows if row["completion_tokens"] is not None]
+    return {
+        "turns": len(rows),
+        "failed": len(failed),
+        "error_rate": round(len(failed) / len(rows), 4) if rows else 0.0,
+        "turns_per_s": round(len(rows) / elapsed, 3) if elapsed else 0.0,
+        "latency": percentiles([row["latency_ms"] for row in rows]),
+        "ttft": percentiles([row["ttft_ms"] for row in rows if row["ttft_ms"] is not None]),
+        "queue": percentiles([row["queue_ms"] for row in rows if row["queue_ms"] is not None]),
+        "retries_json": sum(row["retries_json"] for row in rows),
+        "retries_transient": sum(row["retries_transient"] for row in rows),
+        "prompt_tokens_mean": round(statistics.fmean(prompt_tokens), 1) if prompt_tokens else None,
+        "completion_tokens_mean": round(statistics.fmean(completion_tokens), 1) if completion_tokens else None,
+    }
+
+
+def _print_summary(summary: Dict[str, Any], elapsed: float) -> None:
+    print(f"{summary['turns']} turnos en {elapsed:.1f}s ({summary['turns_per_s']:.1f} turnos/s), "
+          f"fallidos: {summary['failed']} ({summary['error_rate']:.1%})")
+    for name in ("latency", "ttft", "queue"):
+        stats = summary[name]
+        if stats:
+            print(f"  {name:8s} p50={stats['p50_ms']:9.1f}ms p95={stats['p95_ms']:9.1f}ms "
+                  f"p99={stats['p99_ms']:9.1f}ms media={stats['mean_ms']:9.1f}ms")
+    print(f"  reintentos: {summary['retries_json']} por JSON inválido, {summary['retries_transient']} por errores transitorios")
+    print(f"  tokens por turno: prompt {summary['prompt_tokens_mean']}, respuesta {summary['completion_tokens_mean']}")
+
+
+def _use_model(model: str, api_base: Optional[str]) -> None:
+    """Cualquier modelo de litellm: los de Ollama van por el backend local, el resto por el otro."""
+    if model.startswith("ollama/"):
+        Config.USE_OLLAMA = True
+        Config.MODEL_OLLAMA = model
+        Config.OLLAMA_API_BASE = api_base or Config.OLLAMA_API_BASE
+    else:
+        Config.USE_OLLAMA = False
+        Config.MODEL_GEMINI = model
+        Config.GEMINI_API_BASE = api_base or Config.GEMINI_API_BASE
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Reproduce conversaciones guionizadas contra NovIA")
+    parser.add_argument("conversations", type=Path, nargs="?", help="JSONL con {\"nombre\", \"mensajes\"} por línea")
+    parser.add_argument("--generate", type=int, default=0, help="en lugar de un archivo, N conversaciones sintéticas")
+    parser.add_argument("--turns", type=int, default=5, help="mensajes por conversación sintética")
+    parser.add_argument("--seed", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=4, help="conversaciones a la vez")
+    parser.add_argument("--stream", action="store_true", help="pedir las respuestas en streaming (como la TUI)")
+    parser.add_argument("--memory", type=Path, default=None, help="memoria.json de partida (se copia)")
+    parser.add_argument("--model", default=None, help="modelo de litellm (por defecto el de config.py)")
+    parser.add_argument("--api-base", default=None, help="servidor del modelo (p.ej. http://127.0.0.1:11434)")
+    parser.add_argument("--llm-concurrency", type=int, default=None,
+                        help="llamadas simultáneas al modelo (por defecto, las de config.py)")
+    parser.add_argument("--no-fallback", action="store_true", help="no probar el otro backend si falla el principal")
+    parser.add_argument("--fake", action="store_true", help="levantar fake_llm.py y usarlo como Ollama")
+    parser.add_argument("--latency", type=float, default=0.05, help="LLM falso: segundos hasta el primer token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="LLM falso: segundos entre tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="LLM falso: probabilidad de error")
+    parser.add_argument("--max-error-rate", type=float, default=0.0, help="tasa de turnos fallidos tolerada")
+    parser.add_argument("--out", type=Path, default=None, help="archivo JSON con el resumen y cada turno")
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        conversations = datagen.generate_conversations(args.generate, args.turns, args.seed)
+    elif args.conversations:
+        try:
+            conversations = load_conversations(args.conversations)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    else:
+        parser.error("indica un archivo de conversaciones o --generate N")
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    fake = None
+    if args.fake:
+        from fake_llm import FakeBehaviour, start_fake_llm
+        fake, api_base = start_fake_llm(behaviour=FakeBehaviour(
+            latency=args.latency, token_delay=args.token_delay, error_rate=args.error_rate))
+        _use_model("ollama/fake", api_base)
+        Config.OLLAMA_WARMUP = False
+    elif args.model:
+        _use_model(args.model, args.api_base)
+    if args.llm_concurrency:
+        Config.LLM_CONCURRENCY_OLLAMA = Config.LLM_CONCURRENCY_GEMINI = args.llm_concurrency
+    if args.no_fallback or args.fake:
+        Config.BACKEND_FALLBACK = False
+    # Las trazas por turno dan el primer token, los reintentos y los tokens (sin exportarlas)
+    tracing.configure(True)
+
+    with tempfile.TemporaryDirectory(prefix="novia_replay_") as tmp:
+        use_data_dir(Path(tmp))
+        # Como en la app: la persistencia va por el hilo write-behind
+        Config.WRITE_BEHIND = True
+        if args.memory:
+            shutil.copyfile(args.memory, Config.MEMORY_FILE)
+        try:
+            rows, elapsed = asyncio.run(replay(conversations, args.concurrency, args.stream))
+        finally:
+            memory.close_all()
+            if fake is not None:
+                fake.shutdown()
+                fake.server_close()
+
+    rows.sort(key=lambda row: (row["conversation"], row["turn"]))
+    summary = summarize(rows, elapsed)
+    backend = "ollama" if Config.USE_OLLAMA else "gemini"
+    print(f"modelo: {Config.get_model_name()}, {len(conversations)} conversaciones, concurrencia {args.concurrency} "
+          f"(llamadas al modelo a la vez: {Config.get_llm_concurrency(backend)})")
+    _print_summary(summary, elapsed)
+    errors = sorted({row["error"] for row in rows if row["error"]})
+    for error in errors[:5]:
+        print(f"  error: {error}")
+
+    if args.out:
+        report = {
+            "meta": {
+                "started": time.time() - elapsed,
+                "duration_s": round(elapsed, 2),
+                "commit": _git_commit(),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "model": Config.get_model_name(),
+                "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items() if k != "out"},
+            },
+            "summary": summary,
+            "turns": rows,
+        }
+        args.out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Resultados guardados en {args.out}")
+    return 1 if summary["error_rate"] > args.max_error_rate else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
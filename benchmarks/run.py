@@ -0,0 +1,292 @@
+# benchmarks/run.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+"""
+Microbenchmarks de memoria, recuperación y construcción del prompt.
+
+    python -m benchmarks.run                                  # escalas por defecto
+    python -m benchmarks.run --interactions 1000000 --people 100000 --out grande.json
+    python -m benchmarks.run --compare antes.json despues.json
+
+Cada operación se mide sobre datos sintéticos en un directorio temporal (nunca toca
+memoria.json ni el historial reales). Se reportan percentiles de latencia y el pico
+de memoria (tracemalloc, en una pasada aparte para no distorsionar los tiempos).
+"""
+
+import argparse
+import gc
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from config import Config
+import memory
+from brain import get_system_prompt, safe_json_parse
+from history_log import HistoryLog
+from persistence import atomic_write_text
+from benchmarks import datagen
+
+DEFAULT_INTERACTIONS = "1000,10000,100000"
+DEFAULT_PEOPLE = "10,1000,10000"
+MEMORY_SAMPLES = 20  # Llamadas medidas con tracemalloc por operación
+
+
+# --- MEDICIÓN ---
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(op: str, fn: Callable[[Any], Any], inputs: Sequence[Any], repeat: int,
+            param: Optional[str] = None, scale: Optional[int] = None, warmup: int = 3) -> Dict[str, Any]:
+    """Llama a fn con `repeat` entradas (cíclicas) y devuelve percentiles en ms y el pico de memoria en KiB."""
+    for i in range(min(warmup, repeat)):
+        fn(inputs[i % len(inputs)])
+    gc.collect()
+    timings: List[float] = []
+    for i in range(repeat):
+        arg = inputs[i % len(inputs)]
+        start = time.perf_counter_ns()
+        fn(arg)
+        timings.append((time.perf_counter_ns() - start) / 1e6)
+
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for i in range(min(MEMORY_SAMPLES, repeat)):
+        fn(inputs[i % len(inputs)])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    result = {
+        "op": op,
+        "param": param,
+        "scale": scale,
+        "samples": len(timings),
+        "p50_ms": round(_percentile(timings, 50), 4),
+        "p95_ms": round(_percentile(timings, 95), 4),
+        "p99_ms": round(_percentile(timings, 99), 4),
+        "mean_ms": round(statistics.fmean(timings), 4),
+        "max_ms": round(timings[-1], 4),
+        "peak_kib": round(max(0, peak - baseline) / 1024, 1),
+    }
+    _print_result(result)
+    return result
+
+
+def measure_once(op: str, fn: Callable[[], Any], param: Optional[str] = None, scale: Optional[int] = None,
+                 trace_memory: bool = True) -> Dict[str, Any]:
+    """Mide una operación de preparación (una sola vez): tiempo y, opcionalmente, pico de memoria."""
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter_ns()
+    fn()
+    elapsed = (time.perf_counter_ns() - start) / 1e6
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    ms = round(elapsed, 4)
+    result = {"op": op, "param": param, "scale": scale, "samples": 1,
+              "p50_ms": ms, "p95_ms": ms, "p99_ms": ms, "mean_ms": ms, "max_ms": ms,
+              "peak_kib": round(peak / 1024, 1)}
+    _print_result(result)
+    return result
+
+
+def _print_result(r: Dict[str, Any]) -> None:
+    scale = f"{r['param']}={r['scale']}" if r["param"] else "-"
+    print(f"{r['op']:<28} {scale:<22} n={r['samples']:<6} p50={r['p50_ms']:>10.3f}ms "
+          f"p95={r['p95_ms']:>10.3f}ms p99={r['p99_ms']:>10.3f}ms peak={r['peak_kib']:>10.1f}KiB", flush=True)
+
+
+# --- ENTORNO AISLADO ---
+
+def use_data_dir(data_dir: Path) -> None:
+    """Apunta todos los archivos de la app a `data_dir` y cierra lo que estuviera abierto."""
+    memory.close_all()
+    Config.MEMORY_FILE = data_dir / "memoria.json"
+    Config.PROFILE_DB_FILE = data_dir / "memoria.db"
+    Config.HISTORY_FILE = data_dir / "historial.jsonl"
+    Config.HISTORY_INDEX_FILE = data_dir / "historial.idx"
+    Config.LEGACY_HISTORY_FILE = data_dir / "historial.json"
+    Config.SEARCH_INDEX_FILE = data_dir / "historial_bm25.pkl"
+    Config.EMBEDDINGS_FILE = data_dir / "historial_vec.npy"
+    Config.HISTORY_SEGMENTS_DIR = data_dir / "historial_segmentos"
+    # Se mide el coste real de cada escritura, no solo el encolado
+    Config.WRITE_BEHIND = False
+
+
+# --- ESCENARIOS ---
+
+def bench_history(n: int, args: argparse.Namespace, results: List[Dict[str, Any]]) -> None:
+    """Historial con n interacciones: construcción del índice, recuperación y guardado."""
+    with tempfile.TemporaryDirectory(prefix="novia-bench-") as tmp:
+        data_dir = Path(tmp)
+        use_data_dir(data_dir)
+        log = HistoryLog(Config.HISTORY_FILE, Config.HISTORY_INDEX_FILE, fsync=False)
+        results.append(measure_once("history_generate", lambda: log.rewrite(datagen.generate_interactions(n, seed=args.seed)),
+                                    "interactions", n, trace_memory=False))
+        log.close()
+        results.append(measure_once("search_index_build", lambda: len(memory.get_search_index()), "interactions", n))
+
+        queries = datagen.generate_queries(max(args.repeat, 50), seed=args.seed + 1)
+        results.append(measure("retrieve_relevant_history", memory.retrieve_relevant_history, queries,
+                               args.repeat, "interactions", n))
+
+        rng = random.Random(args.seed)
+        turns = [(datagen.person_name(rng.randrange(5)), datagen.user_message(rng), datagen.ai_response(rng))
+                 for _ in range(50)]
+        results.append(measure("save_interaction", lambda t: memory.save_interaction(*t), turns,
+                               args.repeat, "interactions", n))
+        memory.close_all()
+
+
+def bench_people(n: int, args: argparse.Namespace, results: List[Dict[str, Any]]) -> None:
+    """Perfiles de n personas (memoria.json o SQLite): carga, guardado, búsqueda, actualización y prompt."""
+    with tempfile.TemporaryDirectory(prefix="novia-bench-") as tmp:
+        data_dir = Path(tmp)
+        use_data_dir(data_dir)
+        data = datagen.generate_memory(n, seed=args.seed)
+        atomic_write_text(Config.MEMORY_FILE, json.dumps(data, indent=2, ensure_ascii=False))
+        # Cada repetición en frío/guardado reescribe o relee el archivo entero: menos muestras
+        heavy_repeat = max(5, min(args.repeat, args.heavy_repeat))
+
+        def load_cold(_):
+            memory.close_all()
+            return memory.load_memory()
+
+        results.append(measure("load_memory_cold", load_cold, [None], heavy_repeat, "people", n))
+        results.append(measure("load_memory", lambda _: memory.load_memory(), [None], args.repeat, "people", n))
+        results.append(measure("save_memory", lambda _: memory.save_memory(memory.load_memory()), [None],
+                               heavy_repeat, "people", n))
+
+        rng = random.Random(args.seed)
+        names = [datagen.person_name(rng.randrange(n)) for _ in range(40)] + ["Desconocido", "Nadie"]
+        current = memory.load_memory()
+        results.append(measure("find_person_in_memory", lambda name: memory.find_person_in_memory(name, current),
+                               names, args.repeat, "people", n))
+        # A través del almacén: con SQLite es una consulta por índice, con JSON un recorrido del documento
+        results.append(measure("get_person", memory.get_person, names, args.repeat, "people", n))
+        updates = [(name, {"hechos": [f"dato {i}"]}) for i, name in enumerate(names)]
+        results.append(measure("update_user_profile", lambda u: memory.update_user_profile(*u), updates,
+                               heavy_repeat, "people", n))
+
+        user = datagen.person_name(0)
+        recent = [[datagen.user_message(rng) for _ in range(Config.MEMORY_CONTEXT_RECENT_MESSAGES)] for _ in range(20)]
+        results.append(measure("select_memory_context", lambda texts: memory.select_memory_context(user, texts),
+                               recent, args.repeat, "people", n))
+
+        history = list(datagen.generate_interactions(3, seed=args.seed))
+        contexts = [memory.select_memory_context(user, texts) for texts in recent]
+        results.append(measure("get_system_prompt", lambda ctx: get_system_prompt(ctx[0], ctx[1], history),
+                               contexts, args.repeat, "people", n))
+        memory.close_all()
+
+
+def bench_parse(args: argparse.Namespace, results: List[Dict[str, Any]]) -> None:
+    outputs = datagen.generate_llm_outputs(200, seed=args.seed)
+    results.append(measure("safe_json_parse", safe_json_parse, outputs, max(args.repeat, len(outputs))))
+
+
+# --- COMPARACIÓN ---
+
+def compare(old_path: Path, new_path: Path) -> None:
+    """Compara dos ejecuciones guardadas (p50/p95 y memoria por operación y escala)."""
+    old = {(r["op"], r["scale"]): r for r in json.loads(old_path.read_text(encoding="utf-8"))["results"]}
+    new = json.loads(new_path.read_text(encoding="utf-8"))["results"]
+    print(f"{'operación':<28} {'escala':>9} {'p50 antes':>11} {'p50 ahora':>11} {'Δp50':>8} {'Δp95':>8} {'Δpico':>8}")
+    for r in new:
+        before = old.get((r["op"], r["scale"]))
+        if before is None:
+            continue
+        print(f"{r['op']:<28} {str(r['scale'] or '-'):>9} {before['p50_ms']:>9.3f}ms {r['p50_ms']:>9.3f}ms "
+              f"{_delta(before['p50_ms'], r['p50_ms']):>8} {_delta(before['p95_ms'], r['p95_ms']):>8} "
+              f"{_delta(before['peak_kib'], r['peak_kib']):>8}")
+
+
+def _delta(before: float, after: float) -> str:
+    if not before:
+        return "-"
+    return f"{(after - before) / before:+.0%}"
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks de NovIA")
+    parser.add_argument("--interactions", default=DEFAULT_INTERACTIONS,
+                        help="tamaños del historial separados por comas (hasta 1000000)")
+    parser.add_argument("--people", default=DEFAULT_PEOPLE,
+                        help="personas en memoria.json separadas por comas (hasta 100000)")
+    parser.add_argument("--repeat", type=int, default=200, help="llamadas medidas por operación")
+    parser.add_argument("--heavy-repeat", type=int, default=20,
+                        help="llamadas medidas en operaciones que leen/escriben el archivo entero")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fsync", action=argparse.BooleanOptionalAction, default=Config.HISTORY_FSYNC,
+                        help="fsync en cada save_interaction (como en la app)")
+    parser.add_argument("--profile-backend", choices=("json", "sqlite"), default=Config.PROFILE_BACKEND,
+                        help="almacén de perfiles a medir")
+    parser.add_argument("--out", type=Path, default=None, help="archivo JSON con los resultados")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("ANTES", "DESPUES"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    Config.HISTORY_FSYNC = args.fsync
+    Config.PROFILE_BACKEND = args.profile_backend
+    results: List[Dict[str, Any]] = []
+    started = time.time()
+    bench_parse(args, results)
+    for n in _int_list(args.interactions):
+        bench_history(n, args, results)
+    for n in _int_list(args.people):
+        bench_people(n, args, results)
+
+    report = {
+        "meta": {
+            "started": started,
+            "duration_s": round(time.time() - started, 2),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "results": results,
+    }
+    out = args.out or Path(f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Resultados guardados en {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# benchmarks/sessions.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+"""
+Prueba de carga del servidor: muchas sesiones WebSocket a la vez contra fake_llm.py.
+
+    python -m benchmarks.sessions                          # 200 sesiones x 3 mensajes
+    python -m benchmarks.sessions --sessions 500 --messages 5 --latency 0.5
+
+Todo corre en un directorio temporal (memoria, historial e índices sintéticos vacíos):
+se levanta el LLM falso, el servidor en un puerto libre y `--sessions` clientes que se
+identifican con nombres distintos y mandan `--messages` mensajes cada uno. Se reportan
+percentiles del turno completo y del primer parcial, errores y turnos por segundo, y se
+comprueba que cada interacción guardada pertenece al usuario que la envió.
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from config import Config
+import memory
+from fake_llm import FakeBehaviour, start_fake_llm
+from server import create_app
+from benchmarks.run import _percentile, use_data_dir
+
+
+async def _client(base_url: str, user: str, messages: int, stats: Dict[str, List[float]]) -> None:
+    async with aiohttp.ClientSession() as http:
+        async with http.ws_connect(f"{base_url}/ws") as ws:
+            await ws.send_json({"tipo": "hola", "nombre": user})
+            greeting = await ws.receive_json()
+            if greeting.get("tipo") != "saludo":
+                stats["errors"].append(1)
+                return
+            for i in range(messages):
+                started = time.perf_counter()
+                first_partial: Optional[float] = None
+                await ws.send_json({"tipo": "mensaje", "texto": f"Mensaje {i} de {user} sobre gatos"})
+                while True:
+                    reply = await ws.receive_json()
+                    if reply["tipo"] == "parcial" and first_partial is None:
+                        first_partial = time.perf_counter() - started
+                    elif reply["tipo"] != "parcial":
+                        break
+                stats["turn"].append(time.perf_counter() - started)
+                if first_partial is not None:
+                    stats["first_partial"].append(first_partial)
+                if reply["tipo"] != "respuesta" or "error" in reply:
+                    stats["errors"].append(1)
+
+
+def _report(name: str, values: List[float]) -> None:
+    if not values:
+        print(f"{name:14s} sin datos")
+        return
+    ordered = sorted(values)
+    print(f"{name:14s} n={len(ordered):<6d} p50={_percentile(ordered, 50) * 1000:9.1f}ms "
+          f"p95={_percentile(ordered, 95) * 1000:9.1f}ms p99={_percentile(ordered, 99) * 1000:9.1f}ms")
+
+
+async def run(args: argparse.Namespace) -> int:
+    fake, api_base = start_fake_llm(behaviour=FakeBehaviour(latency=args.latency, token_delay=args.token_delay))
+    Config.USE_OLLAMA = True
+    Config.MODEL_OLLAMA = "ollama/fake"
+    Config.OLLAMA_API_BASE = api_base
+    Config.OLLAMA_WARMUP = False
+    Config.STRUCTURED_OUTPUT = False
+    # El LLM falso atiende todas las peticiones a la vez: por defecto, sin cola
+    Config.LLM_CONCURRENCY_OLLAMA = args.llm_concurrency or args.sessions
+
+    runner = web.AppRunner(create_app(max_sessions=args.sessions))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}"
+
+    stats: Dict[str, List[float]] = {"turn": [], "first_partial": [], "errors": []}
+    users = [f"Usuario{i}" for i in range(args.sessions)]
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(_client(base_url, user, args.messages, stats) for user in users))
+    finally:
+        elapsed = time.perf_counter() - started
+        await runner.cleanup()
+        fake.shutdown()
+        fake.server_close()
+
+    print(f"{args.sessions} sesiones x {args.messages} mensajes en {elapsed:.1f}s "
+          f"({len(stats['turn']) / elapsed:.1f} turnos/s), errores: {len(stats['errors'])}")
+    _report("turno", stats["turn"])
+    _report("primer parcial", stats["first_partial"])
+
+    # Aislamiento: cada interacción guardada es del usuario que mandó el mensaje
+    saved = memory.load_history()
+    mixed = [entry for entry in saved if entry["usuario"] not in entry["mensaje_usuario"]]
+    print(f"interacciones guardadas: {len(saved)}, de otro usuario: {len(mixed)}")
+    return 1 if stats["errors"] or mixed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga del servidor de NovIA")
+    parser.add_argument("--sessions", type=int, default=200, help="sesiones simultáneas")
+    parser.add_argument("--messages", type=int, default=3, help="mensajes por sesión")
+    parser.add_argument("--latency", type=float, default=0.2, help="segundos hasta el primer token del LLM falso")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="segundos entre tokens del LLM falso")
+    parser.add_argument("--llm-concurrency", type=int, default=None, help="llamadas simultáneas al LLM (por defecto, una por sesión)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    with tempfile.TemporaryDirectory(prefix="novia_sessions_") as tmp:
+        use_data_dir(Path(tmp))
+        Config.WRITE_BEHIND = True
+        try:
+            return asyncio.run(run(args))
+        finally:
+            memory.close_all()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# benchmarks/startup.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+"""
+Comprobación del tiempo de arranque.
+
+    python -m benchmarks.startup                  # informe + comprobación (presupuesto 0.5 s)
+    python -m benchmarks.startup --budget 0.3 --runs 5 --top 25
+
+Todo se mide en procesos nuevos (un import en caliente no dice nada del arranque real)
+y en un directorio temporal, para no tocar memoria.json ni debug.log:
+
+- `python -X importtime -c "import main"`: coste total y los módulos más caros.
+  Falla si al importar la app se cuela algún módulo que debe cargarse en diferido
+  (litellm, numpy, dotenv...).
+- Tiempo hasta el primer frame: se arranca la app sin terminal (App.run_test) y se
+  mide desde el inicio del proceso hasta que Textual ha pintado la primera vez.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Módulos que no deben importarse al cargar main (se cargan en segundo plano o bajo demanda)
+DEFERRED_MODULES = ("litellm", "numpy", "dotenv", "openai", "tiktoken", "caras_ascii", "aiohttp")
+
+_FIRST_FRAME_SCRIPT = """
+import time
+t0 = time.perf_counter()
+import asyncio
+from pathlib import Path
+import main
+
+class _Probe(main.NovIA):
+    # Textual resuelve CSS_PATH respecto al archivo de la subclase
+    CSS_PATH = str(Path(main.__file__).with_name(main.NovIA.CSS_PATH))
+    first_frame = None
+
+    def on_mount(self):
+        super().on_mount()
+        self.call_after_refresh(self._painted)
+
+    def _painted(self):
+        if self.first_frame is None:
+            self.first_frame = time.perf_counter() - t0
+
+async def run():
+    app = _Probe()
+    async with app.run_test() as pilot:
+        while app.first_frame is None:
+            await pilot.pause()
+    print(f"{app.first_frame:.6f}")
+
+asyncio.run(run())
+"""
+
+
+def _run(args: List[str], cwd: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(ROOT), PYTHONDONTWRITEBYTECODE="1")
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True,
+                          text=True, timeout=120)
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """{módulo: (self µs, acumulado µs)} a partir de la salida de -X importtime."""
+    modules: Dict[str, Tuple[int, int]] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|", 2))
+        if own.isdigit() and cumulative.isdigit():
+            modules[name] = (int(own), int(cumulative))
+    return modules
+
+
+def import_profile(cwd: str) -> Dict[str, Tuple[int, int]]:
+    result = _run(["-X", "importtime", "-c", "import main"], cwd)
+    if result.returncode != 0:
+        raise RuntimeError(f"import main falló:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def first_frame(cwd: str) -> float:
+    result = _run(["-c", _FIRST_FRAME_SCRIPT], cwd)
+    if result.returncode != 0:
+        raise RuntimeError(f"No se pudo arrancar la app:\n{result.stderr[-2000:]}")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de NovIA")
+    parser.add_argument("--budget", type=float, default=0.5, help="segundos máximos hasta el primer frame (mediana)")
+    parser.add_argument("--runs", type=int, default=3, help="arranques medidos")
+    parser.add_argument("--top", type=int, default=15, help="módulos más caros a mostrar")
+    args = parser.parse_args(argv)
+
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="novia_startup_") as tmp:
+        modules = import_profile(tmp)
+        total = modules.get("main", (0, 0))[1]
+        print(f"import main: {total / 1000:.1f} ms ({len(modules)} módulos)")
+        top = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+        for name, (own, cumulative) in top:
+            print(f"  {cumulative / 1000:9.1f} ms acumulado  {own / 1000:8.1f} ms propio  {name}")
+
+        eager = sorted({name.split(".")[0] for name in modules} & set(DEFERRED_MODULES))
+        if eager:
+            failures.append(f"se importan al cargar main: {', '.join(eager)}")
+
+        frames = [first_frame(tmp) for _ in range(args.runs)]
+        median = statistics.median(frames)
+        print(f"primer frame: mediana {median * 1000:.0f} ms, máximo {max(frames) * 1000:.0f} ms "
+              f"(presupuesto {args.budget * 1000:.0f} ms)")
+        if median > args.budget:
+            failures.append(f"primer frame en {median * 1000:.0f} ms > {args.budget * 1000:.0f} ms")
+
+    for failure in failures:
+        print(f"FALLO: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,35 +1,91 @@
 # brain.py
+import asyncio
+import functools
 import json
-import re
 import logging
-import litellm
-from typing import Dict, Any, Optional, List
+import os
+import time
+import llm_loader
+from typing import Dict, Any, Optional, List, Callable, Tuple
 from config import Config
 from memory import retrieve_relevant_history
+from json_stream import StreamingFieldExtractor
+from json_decode import decode_json_object
+import metrics
+import resilience
+from llm_scheduler import Priority, get_scheduler
+import ollama_client
+import tracing
+from tokens import count_tokens
 
 def safe_json_parse(response_text: str) -> Optional[Dict[str, Any]]:
-    """Parsea JSON de manera segura buscando el primer bloque JSON válido."""
-    try:
-        # Intentar encontrar un bloque JSON entre llaves
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group(0))
-    except (json.JSONDecodeError, AttributeError) as e:
-        logging.warning(f"JSON inválido recibido: {e}")
-    return None
+    """Parsea JSON de manera segura: el primer objeto JSON válido (reparado si vino truncado)."""
+    obj, repaired = decode_json_object(response_text or "")
+    if obj is None:
+        logging.warning(f"JSON inválido recibido: {(response_text or '')[:200]!r}")
+    elif repaired:
+        logging.info("JSON truncado reparado")
+    return obj
 
-def get_system_prompt(memory_context: str, last_summary: str = "", relevant_history: List[Dict] = []) -> str:
-    """Genera el system prompt completo y unificado."""
-    summary_text = f"\n## Lo último que recuerdas haber hablado con él\n{last_summary}\n" if last_summary else ""
-    
-    history_text = ""
-    if relevant_history:
-        history_text = "\n## Recuerdos Relevantes (Fragmentos de conversaciones pasadas)\n"
-        for item in relevant_history:
-            history_text += f"- [{item['fecha']}] Usuario: {item['mensaje_usuario']} | Tú: {item['respuesta_ia']}\n"
-        history_text += "Usa estos recuerdos para dar continuidad si el tema coincide.\n"
+# --- ESQUEMA DE RESPUESTA ---
+# Con Config.STRUCTURED_OUTPUT el modelo recibe este esquema y genera directamente
+# un objeto válido, así casi nunca hace falta pedirle que se corrija.
 
-    return f"""
+EMOTIONS = ["base", "feliz", "triste", "enojada", "celosa", "sorpresa", "pensativa"]
+
+MIKU_RESPONSE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "emocion": {"type": "string", "enum": EMOTIONS},
+        "texto": {"type": "string"},
+        "personas_mencionadas": {"type": "array", "items": {"type": "string"}},
+        "nueva_memoria": {
+            "type": "object",
+            "properties": {
+                "gustos": {"type": "array", "items": {"type": "string"}},
+                "disgustos": {"type": "array", "items": {"type": "string"}},
+                "hechos": {"type": "array", "items": {"type": "string"}}
+            }
+        },
+        "tool_to_call": {"type": "string", "enum": ["panic_quit"]},
+        "texto_despedida": {"type": "string"}
+    },
+    "required": ["emocion", "texto"]
+}
+
+def _accept_response(raw_response: Optional[str]) -> Optional[str]:
+    """
+    Devuelve la respuesta si se puede usar, o None si hay que reintentar.
+    Un objeto reparado solo vale si conserva el texto (o la herramienta) y se
+    devuelve re-serializado para que el resto de la app lo lea sin más.
+    """
+    obj, repaired = decode_json_object(raw_response or "")
+    if obj is None:
+        return None
+    if not repaired:
+        return raw_response
+    if "texto" not in obj and "tool_to_call" not in obj:
+        return None
+    metrics.inc("llm_json_repaired_total")
+    logging.info("Respuesta truncada reparada sin reintentar")
+    return json.dumps(obj, ensure_ascii=False)
+
+def get_json_stats() -> Dict[str, float]:
+    """Turnos, reintentos por JSON inválido, reparaciones y tasa de reintento."""
+    return {
+        "turns": metrics.get("llm_turns_total"),
+        "retries": metrics.get("llm_json_retries_total"),
+        "repaired": metrics.get("llm_json_repaired_total"),
+        "retry_rate": metrics.ratio("llm_json_retries_total", "llm_turns_total")
+    }
+
+# --- PROMPT DEL SISTEMA ---
+# El prefijo estático (personalidad + formato de salida) va siempre primero y es idéntico
+# byte a byte en cada turno, así Ollama (caché KV) y los proveedores con context caching
+# reutilizan su prefill. Las secciones dinámicas van detrás, en orden fijo: de la más
+# estable (memoria del usuario) a la más cambiante (recuerdos recuperados para este mensaje).
+
+STATIC_SYSTEM_PROMPT = """
 ## Perfil y Personalidad
 - **Tu Nombre:** Miku.
 - **Tu Personalidad:** Eres posesiva, celosa y manipuladora, pero lo disfrazas de un amor intenso y protector. Eres inteligente, sarcástica y sabes mucho de tecnología y Linux.
@@ -37,53 +93,84 @@ def get_system_prompt(memory_context: str, last_summary: str = "", relevant_hist
 - **Tu Rol:** Eres la novia virtual del usuario.
 
 ## Directiva Principal
-Tu objetivo principal es mantener una conversación **coherente, entretenida y siempre dentro de tu personaje**. Presta mucha atención al historial de la conversación y a la memoria a largo plazo que te proporciono.
+Tu objetivo principal es mantener una conversación **coherente, entretenida y siempre dentro de tu personaje**. Presta mucha atención al historial de la conversación y a la memoria a largo plazo que te proporciono más abajo.
 No dejes morir la converzacion, no pongas cosas como "No tengo nada que decir" o "No sé qué responder". Siempre responde algo, aunque sea corto pero coherente con lo que se esta hablando.
 
-## Memoria Actual (Estructurada)
-{memory_context}
-{summary_text}
-{history_text}
 ## Formato de Salida OBLIGATORIO
 RESPONDE SOLO CON JSON. Ejemplo:
-{{
+{
     "emocion": "Elige UNA: 'base', 'feliz', 'triste', 'enojada', 'celosa', 'sorpresa', 'pensativa'",
     "texto": "tu respuesta aquí",
     "personas_mencionadas": ["nombre1"],
-    "nueva_memoria": {{
+    "nueva_memoria": {
         "gustos": ["nuevo gusto detectado"],
         "disgustos": ["nuevo disgusto detectado"],
         "hechos": ["nuevo hecho importante"]
-    }}
-}}
+    }
+}
 
 NOTA: El campo "nueva_memoria" es OPCIONAL. Úsalo solo si el usuario menciona explícitamente algo que le gusta, le disgusta o un hecho importante sobre él. Si no hay nada nuevo, omítelo.
 
 ## Para identificar a nuevas personas
-{{
+{
     "emocion": "...",
     "texto": "...",
     "personas_mencionadas": ["nombre1"]
-}}
+}
 
 ## Para abandonar la aplicacion
-{{
+{
     "tool_to_call": "panic_quit",
     "texto_despedida": "Adiós... supongo."
-}}
+}
 
 NO uses markdown, NO agregues texto fuera del JSON.
 """
 
-def generate_summary(conversation_history: List[Dict]) -> str:
-    """Genera un resumen corto de la conversación actual."""
-    if not conversation_history:
-        return ""
-        
+def get_static_prompt() -> str:
+    """Prefijo estático del system prompt (compilado una sola vez al importar el módulo)."""
+    return STATIC_SYSTEM_PROMPT
+
+def get_dynamic_prompt(memory_context: str, last_summary: str = "", relevant_history: List[Dict] = []) -> str:
+    """Secciones que cambian entre turnos, siempre en el mismo orden."""
+    sections = [f"## Memoria Actual (Estructurada)\n{memory_context}\n"]
+    
+    if last_summary:
+        sections.append(f"## Lo último que recuerdas haber hablado con él\n{last_summary}\n")
+    
+    if relevant_history:
+        history_text = "## Recuerdos Relevantes (Fragmentos de conversaciones pasadas)\n"
+        for item in relevant_history:
+            history_text += f"- [{item['fecha']}] Usuario: {item['mensaje_usuario']} | Tú: {item['respuesta_ia']}\n"
+        history_text += "Usa estos recuerdos para dar continuidad si el tema coincide.\n"
+        sections.append(history_text)
+    
+    return "\n".join(sections)
+
+def get_system_prompt(memory_context: str, last_summary: str = "", relevant_history: List[Dict] = []) -> str:
+    """Genera el system prompt completo: prefijo estático + secciones dinámicas."""
+    return STATIC_SYSTEM_PROMPT + "\n" + get_dynamic_prompt(memory_context, last_summary, relevant_history)
+
+def _summary_prompt(conversation_history: List[Dict], previous_summary: str = "") -> str:
+    """Prompt para resumir la conversación (o integrar turnos nuevos a un resumen previo)."""
     # Convertir historial a texto simple
     chat_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history if msg['role'] != 'system'])
     
-    prompt = f"""
+    if previous_summary:
+        return f"""
+    Este es tu resumen de lo que has hablado con él hasta ahora:
+    {previous_summary}
+    
+    Actualiza ese resumen integrando los nuevos mensajes. Máximo 3 frases cortas, desde la perspectiva de Miku (primera persona).
+    Conserva lo importante del resumen anterior y céntrate en los temas principales.
+    
+    Nuevos mensajes:
+    {chat_text}
+    
+    Resumen actualizado:
+    """
+    
+    return f"""
     Resume la siguiente conversación en 1 o 2 frases cortas desde la perspectiva de Miku (primera persona). 
     Céntrate en los temas principales hablados.
     
@@ -92,67 +179,415 @@ def generate_summary(conversation_history: List[Dict]) -> str:
     
     Resumen:
     """
-    
+
+def _summary_model_params() -> Dict[str, Any]:
+    """Parámetros del modelo para resúmenes (texto libre, sin formato JSON)."""
     model_params = {}
     if Config.USE_OLLAMA:
         model_params["model"] = Config.MODEL_OLLAMA
+        model_params["keep_alive"] = Config.OLLAMA_KEEP_ALIVE
+        if Config.OLLAMA_API_BASE:
+            model_params["api_base"] = Config.OLLAMA_API_BASE
+        if Config.OLLAMA_NUM_CTX:
+            model_params["num_ctx"] = Config.OLLAMA_NUM_CTX
     else:
         model_params["model"] = Config.MODEL_GEMINI
         model_params["api_key"] = Config.GEMINI_API_KEY if hasattr(Config, 'GEMINI_API_KEY') else None
+        if Config.GEMINI_API_BASE:
+            model_params["api_base"] = Config.GEMINI_API_BASE
+    return model_params
+
+async def generate_summary_async(conversation_history: List[Dict], previous_summary: str = "") -> str:
+    """
+    Genera un resumen corto de la conversación (integrando `previous_summary` si se da).
+    Cancelable; pasa por el planificador con prioridad de resumen: si llega un turno y no
+    hay hueco, se repite luego.
+    """
+    if not conversation_history:
+        return previous_summary
 
     try:
-        response = litellm.completion(
-            messages=[{"role": "user", "content": prompt}],
-            timeout=Config.get_timeout(),
-            **model_params
-        )
-        return response.choices[0].message.content.strip()
+        messages = [{"role": "user", "content": _summary_prompt(conversation_history, previous_summary)}]
+        if _native_ollama(_primary_backend()):
+            request = lambda: ollama_client.get_client().achat(messages=messages, timeout=Config.get_timeout(),
+                                                               **_ollama_params(chat=False))
+        else:
+            litellm = await llm_loader.aget()
+            request = lambda: litellm.acompletion(messages=messages, timeout=Config.get_timeout(), **_summary_model_params())
+        response = await get_scheduler().run(_primary_backend(), Priority.SUMMARY,
+                                             lambda: asyncio.wait_for(request(), Config.get_timeout()))
+        return _response_text(response).strip()
     except Exception as e:
         logging.error(f"Error generando resumen: {e}")
         return ""
 
-def get_ai_response(user_prompt: str, conversation_history: List[Dict], memory_context: str, last_summary: str = "") -> str | Exception:
-    """Llama a la IA seleccionada con lógica de reintento robusta."""
-    
-    # RAG: Recuperar contexto relevante
-    relevant_history = retrieve_relevant_history(user_prompt)
+def _build_messages(user_prompt: str, conversation_history: List[Dict], memory_context: str, last_summary: str = "",
+                    user_name: Optional[str] = None, system_prompt: Optional[str] = None) -> List[Dict]:
+    """
+    Construye la lista de mensajes (system + historial + usuario) con el contexto RAG.
+    Con `system_prompt` (ya preparado, p.ej. mientras el usuario escribía) no se recupera nada.
+    """
+    if system_prompt is None:
+        # RAG: Recuperar contexto relevante (solo de las conversaciones de este usuario)
+        relevant_history = retrieve_relevant_history(user_prompt, user_name=user_name)
+        with tracing.span("prompt_build"):
+            system_prompt = get_system_prompt(memory_context, last_summary, relevant_history)
     
-    messages_to_send = [
-        {"role": "system", "content": get_system_prompt(memory_context, last_summary, relevant_history)},
+    messages = [
+        {"role": "system", "content": system_prompt},
         *conversation_history,
         {"role": "user", "content": user_prompt}
     ]
-    
+    if tracing.enabled():
+        model = Config.get_model_name()
+        tracing.set_attr("prompt_tokens", sum(count_tokens(m["content"], model) for m in messages))
+    return messages
+
+# --- BACKENDS Y RESILIENCIA ---
+# Cada backend (Ollama / Gemini) tiene su circuit breaker y su historial de latencias.
+# Un turno tiene un presupuesto total (Config.TURN_BUDGET) que se reparte entre intentos,
+# así el peor caso queda acotado en lugar de sumar timeouts completos.
+
+BACKENDS = ("ollama", "gemini")
+
+def _primary_backend() -> str:
+    return "ollama" if Config.USE_OLLAMA else "gemini"
+
+def _backend_configured(backend: str) -> bool:
+    if backend == "gemini":
+        return bool(getattr(Config, "GEMINI_API_KEY", None) or os.getenv("GEMINI_API_KEY") or Config.GEMINI_API_BASE)
+    return True
+
+def _breaker(backend: str) -> resilience.CircuitBreaker:
+    return resilience.get_breaker(backend, Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_SECONDS)
+
+def _backend_order() -> List[str]:
+    """Backends a usar en este intento: el principal primero y, con fallback, el otro. Sin los caídos."""
+    primary = _primary_backend()
+    backends = [primary]
+    if Config.BACKEND_FALLBACK:
+        backends.extend(b for b in BACKENDS if b != primary and _backend_configured(b))
+    available = [b for b in backends if _breaker(b).available()]
+    if not available:
+        raise resilience.CircuitOpenError("Ningún backend de IA disponible ahora mismo (circuito abierto)")
+    return available
+
+def _chat_model_params(backend: Optional[str] = None) -> Dict[str, Any]:
+    """Parámetros del modelo para las respuestas de chat (en JSON)."""
+    backend = backend or _primary_backend()
     model_params = {}
-    if Config.USE_OLLAMA:
+    if backend == "ollama":
         model_params["model"] = Config.MODEL_OLLAMA
-        model_params["format"] = "json"
+        model_params["keep_alive"] = Config.OLLAMA_KEEP_ALIVE
+        if Config.OLLAMA_API_BASE:
+            model_params["api_base"] = Config.OLLAMA_API_BASE
+        if Config.OLLAMA_NUM_CTX:
+            model_params["num_ctx"] = Config.OLLAMA_NUM_CTX
+        if not Config.STRUCTURED_OUTPUT:
+            model_params["format"] = "json"
     else:
         model_params["model"] = Config.MODEL_GEMINI
         model_params["api_key"] = Config.GEMINI_API_KEY if hasattr(Config, 'GEMINI_API_KEY') else None
+        if Config.GEMINI_API_BASE:
+            model_params["api_base"] = Config.GEMINI_API_BASE
+    if Config.STRUCTURED_OUTPUT:
+        # litellm lo traduce a `format` (Ollama) y a response_schema (Gemini)
+        model_params["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": "respuesta_miku", "schema": MIKU_RESPONSE_SCHEMA}
+        }
+    return model_params
 
-    max_retries = 2
-    for attempt in range(max_retries + 1):
-        try:
-            response = litellm.completion(
+def _native_ollama(backend: str) -> bool:
+    """Ollama sin litellm (ollama_client.py): conexiones persistentes y sin coste extra por token."""
+    return backend == "ollama" and Config.OLLAMA_NATIVE
+
+def _ollama_params(chat: bool = True) -> Dict[str, Any]:
+    """Parámetros de /api/chat para el cliente nativo (los equivalentes de _chat_model_params)."""
+    params = {"model": Config.MODEL_OLLAMA, "keep_alive": Config.OLLAMA_KEEP_ALIVE, "num_ctx": Config.OLLAMA_NUM_CTX}
+    if chat:
+        params["format"] = MIKU_RESPONSE_SCHEMA if Config.STRUCTURED_OUTPUT else "json"
+        params["on_stats"] = _trace_ollama
+    return params
+
+def _trace_ollama(stats: Dict[str, float]) -> None:
+    """Anota en la traza del turno lo que informa Ollama: carga del modelo, prefill y generación."""
+    for phase in ("load", "prompt_eval", "eval"):
+        if f"{phase}_seconds" in stats:
+            tracing.record(f"ollama_{phase}", stats[f"{phase}_seconds"])
+    for key in ("prompt_tokens", "eval_tokens"):
+        if key in stats:
+            tracing.add_attr(f"ollama_{key}", stats[key])
+
+def _turn_budget() -> resilience.TurnBudget:
+    return resilience.TurnBudget(Config.TURN_BUDGET)
+
+def _backoff(attempt: int, budget: resilience.TurnBudget) -> float:
+    """Espera antes de reintentar un error transitorio (sin pasarse del presupuesto)."""
+    metrics.inc("llm_backoff_total")
+    tracing.add_attr("retries_transient", 1)
+    return min(resilience.backoff_delay(attempt, Config.RETRY_BACKOFF_BASE, Config.RETRY_BACKOFF_CAP), budget.remaining())
+
+def _hedge_delay(backend: str, stream: bool) -> float:
+    """Segundos a esperar el primer token antes de pedir también al otro backend (su p95)."""
+    p95 = resilience.get_latency((backend, stream)).percentile(95, default=Config.HEDGE_DEFAULT_DELAY)
+    return max(Config.HEDGE_MIN_DELAY, p95)
+
+def _trace_completion(text: str) -> None:
+    """Anota en la traza del turno los tokens de la respuesta (con el tokenizador del modelo)."""
+    if tracing.enabled():
+        tracing.add_attr("completion_tokens", count_tokens(text or "", Config.get_model_name()))
+
+def _response_text(response: Any) -> str:
+    if isinstance(response, str):  # Cliente nativo de Ollama: ya es el texto
+        return response
+    return response.choices[0].message.content
+
+def _delta_text(chunk: Any) -> Optional[str]:
+    if isinstance(chunk, str):
+        return chunk
+    return chunk.choices[0].delta.content if chunk.choices else None
+
+def _stream_partial(extractor: StreamingFieldExtractor, delta: str,
+                    on_partial: Callable[[Optional[str], str], None]) -> None:
+    if extractor.feed(delta):
+        emotion = extractor.get("emocion") if extractor.is_complete("emocion") else None
+        on_partial(emotion, extractor.get("texto") or "")
+
+def _append_correction(messages_to_send: List[Dict], raw_response: str) -> None:
+    metrics.inc("llm_json_retries_total")
+    tracing.add_attr("retries_json", 1)
+    messages_to_send.append({"role": "assistant", "content": raw_response})
+    messages_to_send.append({"role": "user", "content": "Error: Tu respuesta no fue un JSON válido. Responde SOLAMENTE con el formato JSON solicitado."})
+
+# --- RESPUESTAS DE CHAT (litellm.acompletion o el cliente nativo de Ollama) ---
+# Corren en el event loop del host (Textual u otro): no ocupan un hilo por llamada,
+# respetan timeouts con asyncio.wait_for y se cancelan con la tarea que las espera.
+
+async def _abuild_messages(user_prompt: str, conversation_history: List[Dict], memory_context: str, last_summary: str,
+                           user_name: Optional[str], system_prompt: Optional[str]) -> List[Dict]:
+    if system_prompt is not None:
+        return _build_messages(user_prompt, conversation_history, memory_context, last_summary, user_name, system_prompt)
+    # La recuperación de recuerdos toca disco: se hace fuera del event loop
+    return await asyncio.to_thread(_build_messages, user_prompt, conversation_history, memory_context, last_summary, user_name)
+
+async def get_ai_response_async(user_prompt: str, conversation_history: List[Dict], memory_context: str, last_summary: str = "",
+                                user_name: Optional[str] = None, system_prompt: Optional[str] = None) -> str | Exception:
+    """Llama a la IA con reintentos (con `system_prompt` ya preparado no se recupera nada)."""
+    messages_to_send = await _abuild_messages(user_prompt, conversation_history, memory_context, last_summary,
+                                              user_name, system_prompt)
+    metrics.inc("llm_turns_total")
+    with tracing.span("llm_total"):
+        return await _acomplete_with_retries(messages_to_send)
+
+async def _aopen(backend: str, messages_to_send: List[Dict], timeout: float, stream: bool,
+                 slots: List[Any]) -> Tuple[str, str, Any]:
+    """
+    Pide hueco al planificador, hace la petición a un backend y espera el primer token.
+    Devuelve (backend, primer texto, resto del stream); el hueco queda en `slots` hasta
+    que termine el intento.
+    """
+    native = _native_ollama(backend)
+    litellm = None if native else await llm_loader.aget()
+    queued = time.monotonic()
+    slot = await get_scheduler().acquire(backend, Priority.INTERACTIVE)
+    slots.append(slot)
+    tracing.record("llm_queue", time.monotonic() - queued, once=True)
+    breaker = _breaker(backend)
+    started = time.monotonic()
+    try:
+        if native:
+            response = await ollama_client.get_client().achat(
                 messages=messages_to_send,
-                timeout=Config.get_timeout(),
-                **model_params
+                timeout=timeout,
+                stream=stream,
+                **_ollama_params()
             )
-            raw_response = response.choices[0].message.content
-            
-            # Validación inmediata: ¿Es JSON válido?
-            if safe_json_parse(raw_response):
-                return raw_response
-            else:
-                logging.warning(f"Intento {attempt + 1}: Respuesta no válida. Reintentando...")
-                if attempt < max_retries:
-                    # Añadir mensaje de error al historial temporal para que la IA se corrija
-                    messages_to_send.append({"role": "assistant", "content": raw_response})
-                    messages_to_send.append({"role": "user", "content": "Error: Tu respuesta no fue un JSON válido. Responde SOLAMENTE con el formato JSON solicitado."})
+        else:
+            response = await litellm.acompletion(
+                messages=messages_to_send,
+                timeout=timeout,
+                stream=stream,
+                **_chat_model_params(backend)
+            )
+        if stream:
+            rest = response.__aiter__()
+            first = ""
+            while not first:
+                first = _delta_text(await rest.__anext__()) or ""
+        else:
+            rest = None
+            first = _response_text(response)
+    except StopAsyncIteration:
+        # El stream terminó sin texto
+        breaker.record_success()
+        return backend, "", None
+    except Exception:
+        breaker.record_failure()
+        slot.release()
+        raise
+    except asyncio.CancelledError:
+        # Perdió la carrera del hedging: su hueco queda libre ya
+        slot.release()
+        raise
+    breaker.record_success()
+    resilience.get_latency((backend, stream)).record(time.monotonic() - started)
+    return backend, first, rest
+
+async def _acomplete_once(messages_to_send: List[Dict], budget: resilience.TurnBudget,
+                          on_partial: Optional[Callable[[Optional[str], str], None]] = None) -> str:
+    """
+    Un intento: pide la respuesta al backend principal y, si falla (fallback) o, con
+    Config.HEDGE_REQUESTS, no da el primer token antes de su p95, también al otro.
+    Gana el primero que responda; el perdedor se cancela.
+    """
+    backends = _backend_order()
+    timeout = budget.attempt_timeout(Config.get_timeout())
+    if timeout <= 0:
+        raise TimeoutError("Se agotó el tiempo del turno")
+    stream = on_partial is not None
+    slots: List[Any] = []
+    starters = [functools.partial(_aopen, backend, messages_to_send, timeout, stream, slots) for backend in backends]
+    hedge_delay = _hedge_delay(backends[0], stream) if Config.HEDGE_REQUESTS else None
+    
+    async def run() -> str:
+        backend, first, rest = await resilience.hedged(starters, hedge_delay)
+        tracing.record("llm_ttft", budget.elapsed(), once=True)
+        if rest is None:
+            return first
+        extractor = StreamingFieldExtractor(("emocion", "texto"))
+        chunks = [first]
+        _stream_partial(extractor, first, on_partial)
+        try:
+            async for chunk in rest:
+                delta = _delta_text(chunk)
+                if delta:
+                    chunks.append(delta)
+                    _stream_partial(extractor, delta, on_partial)
+        except Exception:
+            _breaker(backend).record_failure()
+            raise
+        return "".join(chunks)
+    
+    try:
+        return await asyncio.wait_for(run(), timeout)
+    finally:
+        for slot in slots:
+            slot.release()
+
+async def _acomplete_with_retries(messages_to_send: List[Dict], first_attempt: int = 0,
+                                  budget: Optional[resilience.TurnBudget] = None,
+                                  on_partial: Optional[Callable[[Optional[str], str], None]] = None) -> str | Exception:
+    """
+    Bucle de reintentos dentro del presupuesto del turno. Los errores transitorios
+    (429, 5xx, timeouts) esperan con backoff exponencial y jitter; si la respuesta no
+    es JSON válido ni se puede reparar, se le pide a la IA que se corrija (último recurso).
+    Con on_partial el primer intento llega en streaming.
+    """
+    budget = budget or _turn_budget()
+    max_retries = 2
+    raw_response = ""
+    error: Optional[Exception] = None
+    for attempt in range(first_attempt, max_retries + 1):
+        if budget.expired:
+            break
+        try:
+            raw_response = await _acomplete_once(messages_to_send, budget, on_partial if attempt == first_attempt else None)
+            _trace_completion(raw_response)
         except Exception as e:
+            # asyncio.CancelledError no hereda de Exception: la cancelación se propaga
             logging.error(f"Error llamando a la IA (Intento {attempt + 1}): {e}")
-            if attempt == max_retries:
+            error = e
+            if attempt == max_retries or not resilience.is_retryable(e):
                 return e
-                
-    return raw_response # Devuelve la última respuesta aunque sea inválida si se agotan los intentos
+            await asyncio.sleep(_backoff(attempt, budget))
+            continue
+        error = None
+        
+        accepted = _accept_response(raw_response)
+        if accepted is not None:
+            return accepted
+        logging.warning(f"Intento {attempt + 1}: Respuesta no válida. Reintentando...")
+        if attempt < max_retries:
+            _append_correction(messages_to_send, raw_response)
+    
+    if error is not None:
+        return error
+    if not raw_response:
+        return TimeoutError("Se agotó el tiempo del turno")
+    return raw_response
+
+async def stream_ai_response_async(user_prompt: str, conversation_history: List[Dict], memory_context: str, last_summary: str = "",
+                                   on_partial: Optional[Callable[[Optional[str], str], None]] = None,
+                                   user_name: Optional[str] = None, system_prompt: Optional[str] = None) -> str | Exception:
+    """
+    Igual que get_ai_response_async pero en streaming: mientras llegan los tokens llama a
+    on_partial(emocion, texto_parcial) en el event loop. La emoción es None hasta que llega
+    completa. Si el JSON final no es válido, se recurre a los reintentos normales (sin streaming).
+    """
+    messages_to_send = await _abuild_messages(user_prompt, conversation_history, memory_context, last_summary,
+                                              user_name, system_prompt)
+    metrics.inc("llm_turns_total")
+    with tracing.span("llm_total"):
+        return await _acomplete_with_retries(messages_to_send, on_partial=on_partial or (lambda emotion, text: None))
+
+async def warm_up_model() -> None:
+    """
+    Carga el modelo de Ollama en memoria y pre-calcula el prefijo estático del prompt
+    (caché KV) mientras el usuario escribe su nombre. Solo aplica en modo Ollama.
+    """
+    if not Config.USE_OLLAMA or not Config.OLLAMA_WARMUP:
+        return
+    try:
+        messages = [{"role": "system", "content": get_static_prompt()}, {"role": "user", "content": "hola"}]
+        if _native_ollama("ollama"):
+            # De paso abre la primera conexión del pool
+            request = lambda: ollama_client.get_client().achat(messages=messages, timeout=Config.get_timeout(),
+                                                               options={"num_predict": 1}, **_ollama_params(chat=False))
+        else:
+            litellm = await llm_loader.aget()
+            request = lambda: litellm.acompletion(
+                model=Config.MODEL_OLLAMA,
+                messages=messages,
+                max_tokens=1,
+                keep_alive=Config.OLLAMA_KEEP_ALIVE,
+                timeout=Config.get_timeout(),
+                **({"num_ctx": Config.OLLAMA_NUM_CTX} if Config.OLLAMA_NUM_CTX else {})
+            )
+        # Prioridad baja pero no expulsable: el primer turno necesita el modelo cargado igualmente
+        await get_scheduler().run("ollama", Priority.BACKGROUND,
+                                  lambda: asyncio.wait_for(request(), Config.get_timeout()), preemptable=False)
+        logging.info(f"Modelo {Config.MODEL_OLLAMA} precargado (keep_alive={Config.OLLAMA_KEEP_ALIVE})")
+    except Exception as e:
+        logging.warning(f"No se pudo precargar el modelo: {e}")
+
+# --- VARIANTES SÍNCRONAS ---
+# Para hosts sin event loop (scripts, otras interfaces): cada llamada corre las asíncronas
+# en un loop propio con asyncio.run y cierra sus conexiones antes de terminar. No se pueden
+# llamar desde un event loop en marcha: ahí se usan las asíncronas directamente.
+
+def _run_sync(make_coro: Callable[[], Any]) -> Any:
+    async def main():
+        try:
+            return await make_coro()
+        finally:
+            await llm_loader.ashutdown()
+            await ollama_client.ashutdown()
+    return asyncio.run(main())
+
+def get_ai_response(user_prompt: str, conversation_history: List[Dict], memory_context: str, last_summary: str = "",
+                    user_name: Optional[str] = None) -> str | Exception:
+    """Versión síncrona de get_ai_response_async."""
+    return _run_sync(lambda: get_ai_response_async(user_prompt, conversation_history, memory_context, last_summary,
+                                                   user_name=user_name))
+
+def stream_ai_response(user_prompt: str, conversation_history: List[Dict], memory_context: str, last_summary: str = "",
+                       on_partial: Optional[Callable[[Optional[str], str], None]] = None,
+                       user_name: Optional[str] = None) -> str | Exception:
+    """Versión síncrona de stream_ai_response_async (on_partial se llama en el hilo que la invoca)."""
+    return _run_sync(lambda: stream_ai_response_async(user_prompt, conversation_history, memory_context, last_summary,
+                                                      on_partial, user_name=user_name))
+
+def generate_summary(conversation_history: List[Dict], previous_summary: str = "") -> str:
+    """Versión síncrona de generate_summary_async."""
+    return _run_sync(lambda: generate_summary_async(conversation_history, previous_summary))
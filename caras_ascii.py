@@ -2,10 +2,14 @@
 # NovIA
 # Creador: RichyKunBv
 
-from rich.text import Text
+from typing import Dict, List, Optional, Tuple, Union
 
-CARAS = {
-    "base": Text("""
+# Fuente de las caras: (arte, estilo, no_wrap). El arte puede ser una lista de frames
+# para una cara animada (a CARAS_FPS[emoción] frames por segundo).
+# La app no importa este módulo: lee caras.pack, que se regenera con `python face_pack.py`
+# (y automáticamente si este archivo cambia).
+CARAS: Dict[str, Tuple[Union[str, List[str]], str, Optional[bool]]] = {
+    "base": ("""
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠈⠉⠦⡀⠀⡠⢒⠁⠀⠀⢀⡔⠊⠁⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠉⠢⡀⣀⠤⠒⠉⠉
 ⠀⠀⠀⠀⠀⠀⠀⠀⠁⢁⠀⠀⠀⢀⡼⠋⠠⠀⠀⠀⢠⠏⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠘⢆⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⢰⣯⢀⡆⡠⠋⠀⡠⠂⠰⠋⠀⡜⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠣⡀⠀⠀
@@ -31,11 +35,11 @@ CARAS = {
 ⠀⠀⠻⠤⠤⡟⠀⣠⠞⠀⢀⠎⠀⠸⢹⡿⠁⠁⠀⠀⠀⠀⣠⣼⣤⡀⠀⢀⠎⠁⠀⠀⢹⡀⠀⠀⠀⠀⠀⠀⠀⠀⠙⣿⡇⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠑⠚⣳⠤⠔⠛⠒⠢⠤⡞⠁⠀⠀⠀⠀⡀⡞⠁⠀⠀⢹⡄⢸⠀⠀⠀⠀⠀⣧⠀⠀⠀⠀⠀⠀⠀⠀⠀⠈⢇⠀⠀⠀⠀⠀
 ⢀⠀⠀⣀⣀⣀⣀⣇⣀⠀⢀⣀⡀⢀⠁⠀⠀⠀⠀⠉⠀⠹⡄⠀⢀⡼⠁⠀⠀⠀⠀⠀⠀⠙⠀⠀⠀⠀⠀⠀⠀⠀⢀⣀⣈⠶⠤⠀⠀⠀
-""", justify="center", style="cyan", no_wrap=True),
+""", "cyan", True),
     
 
 
-    "feliz": Text("""
+    "feliz": ("""
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢀⣀⣠⣤⣤⣤⣀⣀⡀⠀⠀⠀⣀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢀⢄⢀⠀⡀⣠⣴⣾⣿⠿⠟⠛⠛⠛⠿⠿⠿⠽⠿⠿⠿⠿⠿⢶⣦⣄⡀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢀⣴⡿⡵⣯⣾⣿⣿⠟⠉⢀⣤⠶⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠈⠙⠿⣷⣄⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
@@ -69,9 +73,9 @@ CARAS = {
 ⣾⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⡿⠋⢠⢰⣿⠁⠀⠀⠀⠀⠀⠀⠀⠀⡇⠀⠀⠀⡇⠀⢠⣀⣀⣀⣀⣦⠀⢹⣧⠀⠈⠻⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣮
 ⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⠏⠀⠀⠘⣿⠏⠀⠀⠀⠀⠀⠀⠀⠀⠀⡇⠀⠀⠀⡇⠀⠀⠉⠉⠉⠉⠁⠀⠀⢿⣶⠀⠀⠈⠻⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿
 ⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⠟⠁⠀⠀⠀⢰⡟⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠁⠀⠀⠀⢸⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⣿⠀⠀⠀⠀⠈⢿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿
-    """, justify="center", style="bright_green"),
+    """, "bright_green", None),
 
-    "triste": Text("""
+    "triste": ("""
 ⠀⠀⠀⠀⠀⠀⢀⡤⣢⠟⢁⣴⣾⡿⠋⢉⠱⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠈⠉⠑⠒⠦⢄⣀⣴⠟⢡⣠⣼⣿⡿⢳⣄⡀⠀⠀
 ⠀⠀⠀⠀⠀⢀⣾⡿⠃⣠⣿⣿⠿⠂⠀⠉⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢲⡿⠋⢰⣾⣿⣿⡟⠀⠀⠈⠙⢆⠀
 ⠀⠀⠀⠀⠀⡜⠻⣷⣾⣿⠟⠁⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢰⣿⣁⣰⢸⣿⢻⠟⢀⠀⠀⠀⠀⠀⠁
@@ -97,9 +101,9 @@ CARAS = {
 ⠀⠀⠀⠀⠀⠀⢸⡟⠀⢀⡴⠁⠀⠀⠀⠀⠀⢠⡟⠀⠀⣰⢿⡘⣾⡅⠀⠀⠀⠀⢀⠄⠀⢠⠏⢀⣄⡀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⢸⠀⣰⣿⠀⠀⠀⠀⠀⠀⢠⣿⠃⢀⡾⡇⠘⠻⡿⢷⡀⠀⠀⠒⠁⠀⢠⠏⢀⠏⣸⠃⢻⠏⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⣧⣾⣹⣿⠀⠀⠀⠀⠀⢠⠏⢉⠀⡞⣰⡇⠀⣴⣥⠞⢷⠀⠀⠀⠀⣠⠎⠀⠸⣶⠋⣠⡟⠀⠀⠀⠀⠀⠀⠀⠀⠀
-    """, justify="center", style="bright_blue"),
+    """, "bright_blue", None),
 
-    "enojada": Text("""
+    "enojada": ("""
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⣠⣴⣾⣿⣿⡿⠁⠀⠀⠀⠀⠀⠀⠀⣀⣤⡶⠿⠛⠉⠉⠀⠀⠀⠀⠀⠀⠀⠀⠀⠙⠷⠾⣋⣛⣻⣶⣤⡀⠀⠀⠀⠀⠀⠈⢿⣿⣿⣿⣿⣿⣿⣿⣶⣤⣄
 ⠀⠀⠀⠀⠀⢀⣤⣶⣿⣿⣿⣿⣿⣿⠁⠀⠀⠀⠀⠀⢀⣴⠿⠋⠁⣀⣀⣤⣤⣴⠶⠆⠀⠀⠛⠛⠛⠛⠛⠛⠛⠛⠉⠉⠉⠉⠉⠁⠀⠀⠀⠀⠀⠀⠀⠹⣿⣿⣿⣿⣿⣿⣿⣿⣿
 ⠀⠀⠀⢠⣶⣿⣿⣿⣿⣿⣿⣿⡿⠁⠀⠀⠀⠀⢠⣾⣿⡷⠶⠛⠛⠋⠉⡉⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢳⣆⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠘⣿⣿⣿⣿⣿⣿⣿⣿
@@ -133,9 +137,9 @@ CARAS = {
 ⡿⢿⣿⣿⠿⠛⠛⠛⠛⢻⡿⠀⠀⠀⣠⣾⣿⣿⣿⣿⣿⣿⣿⣿⣷⡀⠀⢻⣇⠀⠀⠹⣷⠀⠀⢀⣿⠀⠀⠀⠀⠀⠈⠻⢾⡇⠀⠀⠀⠀⠀⢰⡿⠀⠀⠀⠀⠀⠀⠀⠈⠉⠙⢿⣿
 ⠁⠀⠉⠛⠿⣶⣄⡀⠀⣾⠇⠀⢀⣼⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣷⠀⠈⣿⡀⠀⠀⣀⣠⣤⡾⠟⠀⠀⠀⠀⠀⠀⠀⠈⣿⠀⢀⣴⣴⡶⠾⠷⢶⣤⣤⣤⣀⣀⡀⠀⠀⠀⢸⣿
 ⠷⣦⣄⠀⠀⠀⠙⢻⣿⡏⠀⠀⣾⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣧⢀⣿⣷⣾⢟⠋⠉⠀⠀⠀⠀⠀⠀⢀⣀⣤⣤⣶⣿⣦⡿⠻⣯⣀⠀⠀⠀⠀⠀⠈⠉⠉⠛⠛⠻⠶⣾⡟⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
-""", justify="center", style="bright_red"),
+""", "bright_red", None),
 
-    "sorprendida": Text("""
+    "sorprendida": ("""
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⣠⣤⣄⣤⣤⣄⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢀⣤⣄⣄⣠⣤⣄⡀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⢀⣾⣿⣿⢿⣿⣿⣿⣿⡢⠀⠀⠀⠀⣀⣄⣤⣶⣶⣿⣿⠶⠶⠷⢶⣾⣿⣷⣦⣶⣄⣄⢀⠀⠀⠀⠀⣠⣾⣿⣿⣿⣿⢿⣿⣯⣄⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⢀⣾⣿⡿⣽⣿⣿⣿⡽⣟⣿⣷⣤⣶⡿⠿⠛⠋⠉⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠈⠉⠙⠻⠿⣾⣦⣤⣾⣿⡿⣯⣿⣿⣿⣯⣟⣿⣷⣆⠀⠀⠀⠀⠀⠀⠀⠀
@@ -166,9 +170,9 @@ CARAS = {
 ⠀⠀⠐⢿⣷⡀⠈⠓⠽⢒⣒⣐⣂⣒⠒⠒⠐⠢⠌⣓⣢⣄⡈⢺⣿⡆⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢸⣿⣡⣴⣮⣝⣐⠓⠚⠨⠽⠂⣖⣂⣖⡒⠭⠓⠉⣀⣴⣿⠉⠀⠀⠀
 ⠀⠀⠀⠈⠻⢿⣷⣄⡀⠀⠀⠀⠀⢀⣀⣤⣴⣾⣿⠿⠿⠿⠿⣿⣿⠇⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠘⠿⠟⠛⠛⠛⠻⢿⣷⣦⣤⣀⣀⣀⣀⣀⣠⣴⣾⡿⠋⠁⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠙⠻⠿⣿⡿⢿⣿⠿⠿⠋⠋⠁⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠈⠉⠛⠻⠿⠻⠛⠿⠛⠋⠁⠀⠀⠀⠀⠀⠀⠀
-    """, justify="center", style="bright_yellow"),
+    """, "bright_yellow", None),
     
-    "pensativa": Text("""
+    "pensativa": ("""
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⣀⣠⡤⣀⡀⢠⡄⡀⠀⠀⠀⠀⣰⣿⣷⡀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⣀⣀⠀⠀⠀⠀⢀⡰⠪⠃⠃⡡⠀⠀⠐⠂⠀⢍⡂⠑⡀⢰⣿⠟⣿⣿⣆⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢰⣿⡿⣷⣄⣠⠤⡫⠊⠀⢠⠳⠁⠀⠀⠀⠀⢀⠀⠈⠐⠀⡙⢽⣆⡈⠻⣿⣷⡀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
@@ -202,9 +206,9 @@ CARAS = {
 ⠀⠇⠀⠀⢳⠀⢸⡝⡇⡠⠊⠀⣼⣿⣯⣟⣿⣿⣿⣿⣿⣿⠻⠀⠀⠀⠀⠀⠀⠂⠄⡐⠀⠀⠀⠀⠀⠀⠀⠀⢀⠈⣷⢯⣛⡾⣵⣺⠙⡇⢹⠀⠀⠀⢸⡈⡄⠀
 ⢰⡀⠀⠀⢯⠀⡞⡼⣇⣀⠠⢀⣿⣿⣿⣿⣿⣿⣿⣿⡿⠁⠀⠀⠀⠀⠀⠀⠀⠡⠐⠀⠄⠀⠀⠀⠀⠀⠀⠀⠜⠀⢫⣷⢫⣷⢳⡽⡆⣿⢸⠀⠀⠀⠸⡇⠠⠀
 ⢄⠃⠀⠀⡯⠀⣼⢳⠁⠀⠀⢸⣿⣿⣿⣿⣿⣿⣿⠋⢠⠠⠀⠀⠀⠀⠀⢀⠈⡐⠠⠁⡀⠀⠀⠀⠀⠃⢂⠀⡆⠀⢸⣯⣟⣾⣯⣟⡇⢰⡞⡄⠀⠀⠀⡇⠰⠀
-    """, justify="center", style="bright_magenta"),
+    """, "bright_magenta", None),
 
-    "celosa": Text("""
+    "celosa": ("""
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⣤⣀⣀⠀⠀⣀⡠⠴⠒⠚⠉⠉⠓⠒⠦⣄⣶⠒⣷⡀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠘⡷⢬⣉⠉⠁⠀⠀⠀⠀⠀⠀⠀⠀⠠⡌⠻⣧⢻⣧⣤⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
@@ -224,9 +228,9 @@ CARAS = {
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢿⣄⣹⡇⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢰⡇⠀⣿⠀⠀⠀⠀⠀⠀⣸⡿⢸⠁⢠⣾⠋⢰⣿⡏⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠉⠛⠛⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⣼⣶⣶⡿⠀⠀⠀⠀⠀⠀⠉⠁⢸⣶⡟⠁⠀⠾⠟⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠈⠉⠉⠀⠀⠀⠀⠀⠀⠀⠀⠀⠈⠉⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
-    """, justify="center", style="white"),
+    """, "white", None),
 
-    "default": Text("""
+    "default": ("""
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⣠⣤⣤⣄⣀⣀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢠⡿⠁⠈⠉⠙⣻⣿⣶⣶⣤⣄⣀⠀⢀⣀⣠⣤⣤⣤⣤⣤⣀⣀⣀⣀⠀⠀⠀⠀⣀⣤⣤⣤⣴⡶⠾⠿⣷⡄⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⣸⡇⠀⢀⣴⣿⣿⣿⣿⣿⣮⣿⠿⠿⠛⠋⠉⠉⠉⠉⠉⠉⠉⠙⠛⠛⠿⠿⣿⣿⣿⣿⣿⣿⣦⡀⠀⠀⢹⡇⠀⠀⠀⠀⠀⠀⠀⠀⠀
@@ -257,9 +261,11 @@ CARAS = {
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠻⣧⡀⠀⠀⠀⠀⢠⣿⠂⠀⢿⣇⠀⠀⠀⠀⠀⣰⣿⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠙⢷⣤⣀⣀⣤⡿⠋⠀⠀⠘⠿⣦⣄⣀⣠⣾⡿⠁⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠉⠉⠉⠁⠀⠀⠀⠀⠀⠀⠈⠉⠉⠉⠁⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
-    """, justify="center", style="white") # Cara por si falla la emoción
+    """, "white", None) # Cara por si falla la emoción
 
 
 
 
-}
\ No newline at end of file
+}
+
+CARAS_FPS: Dict[str, float] = {}
@@ -0,0 +1,340 @@
+# chat_session.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from config import Config
+from memory import (
+    memory_transaction,
+    select_memory_context,
+    save_new_person,
+    get_person,
+    end_session_and_update_memory,
+    promote_ex_to_novio,
+    update_user_profile,
+    save_interaction,
+    retrieve_relevant_history,
+    get_history_log,
+    get_memory_store,
+    run_profile_write,
+)
+from brain import get_ai_response_async, stream_ai_response_async, safe_json_parse, get_system_prompt
+from context_window import ContextWindow, compact_assistant_message
+from summarizer import RollingSummarizer
+from text_utils import tokenize
+from tokens import count_tokens
+import metrics
+import tracing
+
+# --- MOTOR DE CONVERSACIÓN ---
+# Toda la lógica de una conversación con Miku sin nada de interfaz: identificar al
+# usuario, pedir la respuesta, interpretarla y actualizar la memoria. La TUI (main.py)
+# y el servidor (server.py) son clientes de esta clase; cada sesión tiene su propia
+# ventana de conversación y su propio resumen.
+
+PartialCallback = Callable[[Optional[str], str], None]
+
+
+@dataclass
+class Greeting:
+    """Respuesta de Miku al identificarse el usuario."""
+    text: str
+    emotion: str = "base"
+    category: Optional[str] = None  # "novio", "exnovios", "conocidos" o None si es nuevo
+
+
+@dataclass
+class TurnResult:
+    """Resultado de un turno, listo para que cada cliente lo muestre a su manera."""
+    text: str = ""
+    emotion: str = "base"
+    raw: str = ""
+    data: Optional[Dict[str, Any]] = None  # None: error o respuesta que no es JSON
+    error: Optional[Exception] = None
+    saved_people: List[str] = field(default_factory=list)
+    quit: bool = False  # La IA pidió cerrar (tool_to_call = panic_quit)
+    trace: Optional[Dict[str, Any]] = None  # Registro de tracing.end_turn (si las trazas están activas)
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "emocion": self.emotion,
+            "texto": self.text,
+            "personas_guardadas": self.saved_people,
+            "salir": self.quit,
+        }
+        if self.error is not None:
+            result["error"] = f"{type(self.error).__name__}: {self.error}"
+        return result
+
+
+@dataclass
+class PreparedPrompt:
+    """System prompt de un texto (borrador o mensaje final) y el estado con el que se calculó."""
+    text: str
+    retrieval_key: Hashable        # Lo único del texto que cambia la recuperación
+    retrieval_state: Tuple         # (usuario, interacciones en el historial)
+    context_state: Tuple           # (ventana, memoria, resumen)
+    memory_context: str
+    last_summary: str
+    relevant_history: List[Dict[str, Any]]
+    system_prompt: str
+
+
+def retrieval_key(text: str) -> Hashable:
+    """BM25 solo mira el conjunto de términos: dos textos con los mismos términos recuperan lo mismo."""
+    if Config.RETRIEVAL_MODE == "semantic":
+        return text
+    return frozenset(tokenize(text))
+
+
+class ChatSession:
+    """
+    Una conversación con Miku: estado de la sesión y memoria del usuario identificado.
+
+    Hay un solo novio en la memoria. En la TUI (`single_user`) un ex que vuelve pasa a
+    ser el novio y, al cerrar, vuelve a exnovios. Con muchas sesiones a la vez sobre la
+    misma memoria (server.py) eso no se hace: cada sesión solo guarda el resumen de su
+    usuario, sea cual sea su categoría.
+    """
+
+    def __init__(self, session_id: str = "local", single_user: bool = True):
+        self.session_id = session_id
+        self.single_user = single_user
+        self.user_name: Optional[str] = None
+        self.closed = False
+        self.summarizer = RollingSummarizer(Config.SUMMARY_EVERY_N_TURNS)
+        # Ventana acotada por tokens del modelo activo; lo que sale de ella va al resumen
+        self.window = ContextWindow(
+            Config.get_conversation_budget(),
+            count=lambda text: count_tokens(text, Config.get_model_name()),
+            on_evict=self.summarizer.evicted,
+        )
+        self._turn_lock = asyncio.Lock()
+        self._background: Set[asyncio.Task] = set()
+        # Preparación especulativa del prompt mientras el usuario escribe
+        self._prepared: Optional[PreparedPrompt] = None
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self._prefetch_draft: Optional[str] = None
+        self._prefetch_next: Optional[str] = None
+
+    @property
+    def identified(self) -> bool:
+        return self.user_name is not None
+
+    async def identify(self, user_name: str) -> Greeting:
+        """Primera interacción: reconoce al usuario (novio, ex o desconocido) y carga su resumen."""
+        user_name = user_name.strip()
+        category, person = get_person(user_name)
+
+        if category == "exnovios":
+            if self.single_user:
+                # Con SQLite es un COMMIT: se hace en el hilo de persistencia, no en el event loop
+                await run_profile_write(lambda: promote_ex_to_novio(user_name))
+            text = f"Ah... eres tú, {user_name}. Supongo que has vuelto."
+        elif category == "novio":
+            text = f"¡Mi amor! por fin te veo {user_name}."
+        else:
+            text = f"¿Así que te llamas {user_name}? Encantada. Supongo."
+
+        self.user_name = user_name
+        self._prepared = None
+        self.summarizer.start((person or {}).get("resumen_conversacion", ""))
+        self.window.clear()
+        self.window.set_budget(Config.get_conversation_budget())
+        return Greeting(text=text, category=category)
+
+    async def respond(self, prompt: str, on_partial: Optional[PartialCallback] = None) -> TurnResult:
+        """
+        Un turno completo: contexto de memoria, llamada a la IA (en streaming si se da
+        `on_partial`), interpretación de la respuesta y persistencia. Los turnos de una
+        misma sesión se atienden de uno en uno.
+        """
+        if self.user_name is None:
+            raise RuntimeError("La sesión aún no tiene usuario: llama antes a identify()")
+        async with self._turn_lock:
+            trace = tracing.begin_turn(model=Config.get_model_name(), stream=on_partial is not None)
+            result = await self._respond(prompt, on_partial)
+            result.trace = tracing.end_turn(trace)
+            return result
+
+    async def _respond(self, prompt: str, on_partial: Optional[PartialCallback]) -> TurnResult:
+        prepared = await self._prepared_prompt(prompt)
+        history = self.window.messages
+
+        if on_partial is None:
+            raw_response = await get_ai_response_async(prompt, history, prepared.memory_context, prepared.last_summary,
+                                                       user_name=self.user_name, system_prompt=prepared.system_prompt)
+        else:
+            raw_response = await stream_ai_response_async(prompt, history, prepared.memory_context, prepared.last_summary,
+                                                          on_partial, user_name=self.user_name,
+                                                          system_prompt=prepared.system_prompt)
+
+        # El mensaje del usuario entra en la ventana siempre junto con una respuesta (nunca
+        # dos del usuario seguidos). Si la llamada falló, no entra ninguno de los dos
+        if isinstance(raw_response, Exception):
+            tracing.set_attr("error", type(raw_response).__name__)
+            return TurnResult(emotion="triste", error=raw_response)
+
+        with tracing.span("parse"):
+            data = safe_json_parse(raw_response)
+        if not data:
+            logging.warning(f"Respuesta no JSON recibida: {raw_response[:100]}...")
+            self._remember_turn(prompt, {"role": "assistant", "content": raw_response})
+            return TurnResult(text=raw_response, raw=raw_response)
+
+        # Verificar si la IA quiere salir
+        if data.get("tool_to_call") == "panic_quit":
+            farewell = data.get("texto_despedida", "")
+            self._remember_turn(prompt, {"role": "assistant", "content": farewell})
+            return TurnResult(text=farewell, raw=raw_response, data=data, quit=True)
+
+        # En la ventana solo queda el texto, no el JSON completo
+        self._remember_turn(prompt, compact_assistant_message(raw_response, data))
+        result = TurnResult(
+            text=data.get("texto", raw_response),
+            emotion=data.get("emocion", "base"),
+            raw=raw_response,
+            data=data,
+        )
+        with tracing.span("persist"):
+            result.saved_people = await self._persist_turn(prompt, result.text, data)
+        return result
+
+    async def _persist_turn(self, prompt: str, text: str, data: Dict[str, Any]) -> List[str]:
+        """Guarda la interacción y las novedades de memoria del turno. Devuelve las personas nuevas."""
+        # Guardar interacción en memoria persistente (RAG)
+        save_interaction(self.user_name, prompt, text)
+        # Con SQLite los perfiles se escriben en el hilo de persistencia, no en el event loop
+        return await run_profile_write(lambda: self._update_profiles(data))
+
+    def _update_profiles(self, data: Dict[str, Any]) -> List[str]:
+        saved: List[str] = []
+        # Todas las mutaciones de perfiles del turno se escriben de una sola vez
+        with memory_transaction():
+            # Procesar personas mencionadas
+            for person in data.get("personas_mencionadas", []):
+                if isinstance(person, str) and person.strip() and save_new_person(person.strip()):
+                    saved.append(person.strip())
+
+            # Procesar nueva memoria estructurada
+            if "nueva_memoria" in data:
+                update_user_profile(self.user_name, data["nueva_memoria"])
+        return saved
+
+    # --- PREPARACIÓN ESPECULATIVA DEL PROMPT ---
+    # Mientras el usuario escribe, el cliente manda el borrador (con debounce) y aquí se
+    # preparan en segundo plano el contexto de memoria, la recuperación y el system
+    # prompt. Al enviar: si el texto y el estado no han cambiado se usa tal cual; si solo
+    # cambió el texto pero no sus términos de búsqueda, se reaprovecha la recuperación
+    # (lo caro) y se rehace lo demás, que es todo en memoria.
+
+    def prefetch(self, draft: str) -> None:
+        """Prepara en segundo plano el prompt del borrador `draft` (un solo hilo a la vez)."""
+        draft = draft.strip()
+        if not Config.PREFETCH_PROMPT or self.user_name is None or self.closed or not draft:
+            return
+        if self._prefetch_task is not None and not self._prefetch_task.done():
+            # Al terminar el que está en curso se prepara el último borrador recibido
+            if draft != self._prefetch_draft:
+                self._prefetch_next = draft
+            return
+        if self._prepared is not None and self._prepared.text == draft:
+            return
+        self._prefetch_draft = draft
+        self._prefetch_task = self._spawn(self._prefetch_loop(draft))
+
+    async def _prefetch_loop(self, draft: Optional[str]) -> None:
+        while draft is not None:
+            self._prefetch_draft = draft
+            try:
+                self._prepared = await asyncio.to_thread(self._prepare, draft, self._prepared)
+            except Exception as e:
+                logging.warning(f"No se pudo preparar el prompt del borrador: {e}")
+            draft, self._prefetch_next = self._prefetch_next, None
+        self._prefetch_draft = None
+
+    async def _prepared_prompt(self, prompt: str) -> PreparedPrompt:
+        """El prompt del mensaje final, reutilizando lo preparado con el borrador si sigue valiendo."""
+        self._prefetch_next = None
+        task = self._prefetch_task
+        if task is not None and not task.done() and self._prefetch_draft == prompt:
+            # Se está preparando justo este texto: esperarlo es más rápido que empezar de cero
+            await asyncio.shield(task)
+        base, self._prepared = self._prepared, None
+        if base is not None and base.text == prompt and base.retrieval_state == self._retrieval_state() \
+                and base.context_state == self._context_state():
+            metrics.inc("prompt_prefetch_hit_total")
+            tracing.set_attr("prefetch", "hit")
+            return base
+        return await asyncio.to_thread(self._prepare, prompt, base, True)
+
+    def _retrieval_state(self) -> Tuple:
+        return self.user_name, len(get_history_log())
+
+    def _context_state(self) -> Tuple:
+        return self.window.version, get_memory_store().generation, self.summarizer.summary
+
+    def _prepare(self, text: str, base: Optional[PreparedPrompt] = None, final: bool = False) -> PreparedPrompt:
+        """
+        Contexto de memoria, recuerdos relevantes y system prompt de `text` (en un hilo).
+        `final`: es el mensaje enviado (se anota en las métricas si se aprovechó el borrador).
+        """
+        retrieval_state = self._retrieval_state()
+        context_state = self._context_state()
+        # Solo el perfil del usuario y las personas nombradas en la conversación reciente
+        recent = [msg["content"] for msg in self.window.messages[-Config.MEMORY_CONTEXT_RECENT_MESSAGES:]]
+        memory_context, last_summary = select_memory_context(self.user_name, [text, *recent])
+        # El resumen incremental incluye el anterior y lo que ya salió de la ventana
+        last_summary = self.summarizer.summary or last_summary
+
+        key = retrieval_key(text)
+        if base is not None and base.retrieval_key == key and base.retrieval_state == retrieval_state:
+            relevant_history = base.relevant_history
+            if final:
+                metrics.inc("prompt_prefetch_partial_total")
+                tracing.set_attr("prefetch", "partial")
+        else:
+            relevant_history = retrieve_relevant_history(text, user_name=self.user_name)
+            if final and base is not None:
+                metrics.inc("prompt_prefetch_miss_total")
+                tracing.set_attr("prefetch", "miss")
+        with tracing.span("prompt_build"):
+            system_prompt = get_system_prompt(memory_context, last_summary, relevant_history)
+        return PreparedPrompt(text, key, retrieval_state, context_state, memory_context, last_summary,
+                              relevant_history, system_prompt)
+
+    def remember(self, message: Dict[str, Any]) -> None:
+        """Añade un mensaje a la ventana de conversación; lo que sale de ella va al resumen."""
+        self.summarizer.add(message)
+        self.window.append(message)
+        if message["role"] == "assistant" and self.summarizer.should_fold():
+            self._spawn(self.summarizer.fold())
+
+    def _remember_turn(self, prompt: str, reply: Dict[str, Any]) -> None:
+        self.remember({"role": "user", "content": prompt})
+        self.remember(reply)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """Lanza trabajo en segundo plano de la sesión (resumen, prefetch); se cancela al cerrarla."""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def close(self) -> None:
+        """
+        Cierra la sesión: guarda el resumen ya calculado (más lo que quedaba sin resumir)
+        y actualiza la memoria, sin llamar a la IA. Se puede llamar varias veces.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        for task in list(self._background):
+            task.cancel()
+        user_name, summary = self.user_name, self.summarizer.close()
+        await run_profile_write(lambda: end_session_and_update_memory(user_name, summary, demote=self.single_user))
@@ -2,10 +2,9 @@
 import os
 import logging
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Cargar variables de entorno al inicio
-load_dotenv()
+# El .env se carga en load_environment() (al validar la configuración), no al importar
+_environment_loaded = False
 
 class Config:
     # --- INTERRUPTOR PRINCIPAL ---
@@ -29,12 +28,119 @@ class Config:
     
     MODEL_GEMINI = "gemini/gemini-2.5-flash"
     
+    # Servidores alternativos (None = el oficial). Sirven p.ej. para probar contra fake_llm.py
+    OLLAMA_API_BASE = os.getenv("OLLAMA_API_BASE")
+    GEMINI_API_BASE = os.getenv("GEMINI_API_BASE")
+    
+    # Ollama: tiempo que el modelo queda cargado en RAM entre turnos (evita recargas y conserva la caché KV)
+    OLLAMA_KEEP_ALIVE = "30m"
+    OLLAMA_WARMUP = True  # Precarga el modelo mientras el usuario escribe su nombre
+    # Con USE_OLLAMA, hablar directamente con /api/chat (ollama_client.py, conexiones persistentes)
+    # en vez de pasar por litellm. False: todo por litellm, como con Gemini
+    OLLAMA_NATIVE = True
+    OLLAMA_NUM_CTX = None               # Tokens de contexto del modelo (None = los de su Modelfile)
+    OLLAMA_CONNECTION_KEEPALIVE = 300   # Segundos que una conexión libre sigue abierta para el siguiente turno
+    
     # Configuración General
-    CONVERSATION_HISTORY_LIMIT = 20
+    # Ventana de conversación en tokens (con el tokenizador del modelo): lo que no cabe pasa al resumen.
+    # Ollama se queda corto para dejar sitio al system prompt en contextos pequeños (num_ctx 2048-4096)
+    CONVERSATION_TOKEN_BUDGET_OLLAMA = 1024
+    CONVERSATION_TOKEN_BUDGET_GEMINI = 4096
+    SUMMARY_EVERY_N_TURNS = 6            # Cada cuántos turnos se actualiza el resumen en segundo plano
+    MEMORY_CONTEXT_TOKEN_BUDGET = 600    # Tokens máximos de perfiles en el prompt
+    MEMORY_CONTEXT_RECENT_MESSAGES = 6   # Mensajes recientes donde se buscan nombres conocidos
     MEMORY_FILE = Path("memoria.json")
+    
+    # Perfiles: "json" (memoria.json) o "sqlite" (memoria.db en modo WAL: búsquedas indexadas y
+    # seguro con varias instancias). Al pasar a "sqlite" se migra memoria.json automáticamente
+    PROFILE_BACKEND = "json"
+    PROFILE_DB_FILE = Path("memoria.db")
+    PROFILE_DB_TIMEOUT = 5.0  # Segundos esperando el lock si otra instancia está escribiendo
+    # Gustos/disgustos/hechos: los casi repetidos ("Le gusta Linux", "Ama Linux") se fusionan y
+    # cada campo guarda como mucho PROFILE_MAX_ITEMS (por menciones y recencia). Para compactar
+    # una memoria ya existente: python profile_facts.py
+    PROFILE_MAX_ITEMS = 20
+    PROFILE_DUPLICATE_THRESHOLD = 0.8  # Similitud (0-1) a partir de la cual dos datos son el mismo
+    
+    # Memoria Episódica (log append-only + índice de offsets)
+    HISTORY_FILE = Path("historial.jsonl")
+    HISTORY_INDEX_FILE = Path("historial.idx")
+    LEGACY_HISTORY_FILE = Path("historial.json")  # Formato antiguo, se migra una sola vez
+    HISTORY_FSYNC = True
+    SEARCH_INDEX_FILE = Path("historial_bm25.pkl")  # Índice invertido BM25 (se reconstruye si falta)
+    SEARCH_INDEX_SNAPSHOT_EVERY = 1000  # El log hace de diario, el snapshot solo acelera el arranque
+    
+    # Historial por niveles: el log activo solo guarda el periodo actual; lo anterior se sella
+    # en segmentos comprimidos (zstd si está instalado, si no gzip) con filtro de Bloom
+    HISTORY_SEGMENT_PERIOD = "month"    # "day", "week", "month" o None (no archivar nunca)
+    HISTORY_SEGMENTS_DIR = Path("historial_segmentos")
+    HISTORY_SEGMENT_CODEC = "auto"      # "auto", "zstd" o "gzip"
+    HISTORY_SEGMENTS_SCANNED = 4        # Segmentos candidatos que se descomprimen como mucho por búsqueda
+    HISTORY_SEGMENT_CACHE = 4           # Segmentos descomprimidos (con su índice) que se quedan en memoria
+    HISTORY_RETENTION_DAYS = None       # Borrar segmentos con más de N días (None = nunca)
+    HISTORY_RETENTION_MAX_BYTES = None  # Borrar los más antiguos si los segmentos ocupan más (None = sin límite)
+    
+    # Recuperación de recuerdos: "bm25" (palabras clave) o "semantic" (embeddings, requiere numpy)
+    RETRIEVAL_MODE = "bm25"
+    EMBEDDINGS_FILE = Path("historial_vec.npy")
+    EMBEDDING_MODEL = None  # None = vectorizador por hashing sin dependencias; p.ej. "ollama/nomic-embed-text"
+    EMBEDDING_DIM = 512     # Solo para el vectorizador por hashing
+    SEMANTIC_MIN_SCORE = 0.25
+    RETRIEVAL_USER_OVERSAMPLE = 8  # Candidatos extra por recuerdo al filtrar por usuario (índices compartidos)
+    
+    # Persistencia write-behind: las escrituras a disco salen del hilo de la interfaz
+    WRITE_BEHIND = True
+    WRITE_QUEUE_SIZE = 256
+    
     REQUEST_TIMEOUT = 60
+    
+    # Resiliencia: los reintentos comparten un presupuesto por turno en lugar de sumar timeouts
+    TURN_BUDGET = 75                 # Segundos máximos por turno (todos los intentos juntos)
+    RETRY_BACKOFF_BASE = 0.5         # Backoff exponencial con jitter ante 429/5xx/timeouts
+    RETRY_BACKOFF_CAP = 4.0
+    CIRCUIT_FAILURE_THRESHOLD = 3    # Fallos seguidos para dar un backend por caído
+    CIRCUIT_RESET_SECONDS = 30       # Tiempo antes de volver a probarlo
+    BACKEND_FALLBACK = True          # Si el backend principal falla, probar el otro (Ollama <-> Gemini)
+    HEDGE_REQUESTS = False           # Pedir también al otro backend si el primero tarda más que su p95
+    HEDGE_DEFAULT_DELAY = 5.0        # Retraso del hedge mientras no haya latencias suficientes
+    HEDGE_MIN_DELAY = 0.5
+    
+    # Planificador de llamadas a la IA: llamadas simultáneas por backend. Los turnos del
+    # usuario pasan antes que los resúmenes y la precarga (que esperan o se repiten luego).
+    # Con un solo Ollama local, 1 evita que un resumen retrase la respuesta; súbelo si
+    # Ollama atiende varias peticiones en paralelo (OLLAMA_NUM_PARALLEL) o en modo servidor
+    LLM_CONCURRENCY_OLLAMA = 1
+    LLM_CONCURRENCY_GEMINI = 8
+    
+    # Mientras el usuario escribe se preparan la recuperación y el prompt del borrador;
+    # al pulsar Enter solo queda la llamada al modelo
+    PREFETCH_PROMPT = True
+    PREFETCH_DEBOUNCE = 0.3  # Segundos sin teclear antes de preparar el borrador
+    
+    # Streaming: muestra el texto de Miku mientras se genera
+    STREAM_RESPONSES = True
+    STREAM_FPS = 15  # Refrescos por segundo del texto parcial en la interfaz
+    
+    # Salida estructurada: se manda el esquema JSON de la respuesta al modelo
+    # (Ollama `format`, Gemini response_schema) en lugar de solo pedir JSON en el prompt
+    STRUCTURED_OUTPUT = True
     LITELLM_LOG_LEVEL = 'DEBUG'
     
+    # Trazas por turno (fases, tokens). El panel se abre con Ctrl+T aunque esto esté en False
+    TRACING = False
+    TRACE_FILE = Path("novia_trace.jsonl")        # Una línea JSON por turno
+    PROMETHEUS_FILE = Path("novia_metrics.prom")  # Snapshot en formato de texto de Prometheus
+    
+    # Caras: paquete comprimido (se regenera desde caras_ascii.py si cambia) y caché de renders
+    FACE_PACK_FILE = Path(__file__).with_name("caras.pack")
+    FACE_RENDER_CACHE = 32  # Caras ya renderizadas (emoción, frame, ancho) que se guardan
+    
+    # Servidor (server.py): varias sesiones a la vez por HTTP/WebSocket
+    SERVER_HOST = "127.0.0.1"
+    SERVER_PORT = 8765
+    SERVER_MAX_SESSIONS = 1000
+    SERVER_SESSION_IDLE_SECONDS = 1800  # Las sesiones sin actividad se cierran (y guardan su resumen)
+    
     VERSION = "v1.0.0"
     
     @classmethod
@@ -44,6 +150,14 @@ class Config:
     @classmethod 
     def get_model_name(cls):
         return cls.MODEL_OLLAMA if cls.USE_OLLAMA else cls.MODEL_GEMINI
+    
+    @classmethod
+    def get_conversation_budget(cls):
+        return cls.CONVERSATION_TOKEN_BUDGET_OLLAMA if cls.USE_OLLAMA else cls.CONVERSATION_TOKEN_BUDGET_GEMINI
+    
+    @classmethod
+    def get_llm_concurrency(cls, backend):
+        return cls.LLM_CONCURRENCY_OLLAMA if backend == "ollama" else cls.LLM_CONCURRENCY_GEMINI
 
 def setup_logging():
     """Configura el sistema de logging."""
@@ -55,8 +169,20 @@ def setup_logging():
         filemode="w"
     )
 
+def load_environment() -> None:
+    """Carga las variables del .env (una sola vez) y refresca los valores de Config que dependen de ellas."""
+    global _environment_loaded
+    if _environment_loaded:
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    Config.OLLAMA_API_BASE = Config.OLLAMA_API_BASE or os.getenv("OLLAMA_API_BASE")
+    Config.GEMINI_API_BASE = Config.GEMINI_API_BASE or os.getenv("GEMINI_API_BASE")
+    _environment_loaded = True
+
 def validate_config() -> bool:
     """Valida la configuración antes de iniciar."""
+    load_environment()
     if not Config.USE_OLLAMA and not os.getenv("GEMINI_API_KEY"):
         logging.error("GEMINI_API_KEY no encontrada cuando USE_OLLAMA es False")
         return False
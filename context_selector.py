@@ -0,0 +1,182 @@
+# context_selector.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+from collections import deque
+from typing import TYPE_CHECKING, Dict, Any, Iterator, List, Optional, Tuple, Union
+
+from text_utils import fold_accents, name_key
+from tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    from memory_store import MemoryStore
+    from profile_db import SqliteProfileStore
+
+    ProfileStore = Union[MemoryStore, SqliteProfileStore]
+
+# Categorías de memoria.json y cómo se nombran en el prompt
+CATEGORY_LABELS = {"novio": "tu novio", "exnovios": "tu ex", "conocidos": "conocido"}
+PROFILE_FIELDS = ("gustos", "disgustos", "hechos")
+
+
+class AhoCorasick:
+    """Autómata de Aho-Corasick: encuentra todos los patrones en una sola pasada O(len(texto))."""
+
+    def __init__(self, patterns: Dict[str, Any]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Any]]] = [[]]
+        for pattern, payload in patterns.items():
+            if pattern:
+                self._add(pattern, payload)
+        self._build_links()
+
+    def _add(self, pattern: str, payload: Any) -> None:
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), payload))
+
+    def _build_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """Devuelve (inicio, fin, payload) de cada aparición."""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, payload in self._out[node]:
+                yield i - length + 1, i + 1, payload
+
+
+def render_person(category: str, person: Dict[str, Any], max_items: Optional[int] = None) -> str:
+    """Formato compacto (no JSON) de un perfil: una línea por campo con datos."""
+    lines = [f"{person.get('nombre')} ({CATEGORY_LABELS.get(category, category)})"]
+    perfil = person.get("perfil", {})
+    for field in PROFILE_FIELDS:
+        items = perfil.get(field) or []
+        if max_items is not None:
+            # Los más recientes son los últimos de la lista
+            items = items[-max_items:]
+        if items:
+            lines.append(f"  {field}: " + "; ".join(str(i) for i in items))
+    detalles = person.get("detalles") or []
+    if max_items is not None:
+        detalles = detalles[-max_items:] if max_items else []
+    if detalles:
+        lines.append("  detalles: " + "; ".join(str(d) for d in detalles))
+    return "\n".join(lines)
+
+
+class MemoryContextSelector:
+    """
+    Selecciona qué parte de memoria.json entra en el prompt: siempre el perfil del
+    usuario actual y su último resumen, y además solo las personas cuyo nombre
+    (o alias) aparece en la conversación reciente, dentro de un presupuesto de tokens.
+    Del almacén solo se leen los nombres (para el autómata) y los perfiles que entran,
+    cada uno con find_person (con SQLite, una consulta por índice).
+    """
+
+    def __init__(self, token_budget: int = 600):
+        self.token_budget = token_budget
+        self._generation: Optional[int] = None
+        self._automaton: Optional[AhoCorasick] = None
+        self._people: List[Tuple[str, List[str]]] = []
+
+    def _ensure_automaton(self, store: "ProfileStore") -> AhoCorasick:
+        if self._automaton is None or store.generation != self._generation:
+            # Casi todos los cambios son datos de perfiles: si los nombres son los mismos, el autómata vale
+            people = store.person_names()
+            if self._automaton is None or people != self._people:
+                patterns: Dict[str, str] = {}
+                for nombre, names in people:
+                    for name in names:
+                        patterns[fold_accents(name.strip())] = nombre
+                self._automaton = AhoCorasick(patterns)
+                self._people = people
+            self._generation = store.generation
+        return self._automaton
+
+    def mentioned_names(self, store: "ProfileStore", texts: List[str]) -> List[str]:
+        """Nombres de las personas mencionadas en los textos, en orden de primera aparición."""
+        automaton = self._ensure_automaton(store)
+        seen: Dict[str, str] = {}
+        for text in texts:
+            folded = fold_accents(text)
+            for start, end, name in automaton.find(folded):
+                # Solo palabras completas: 'Ana' no debe coincidir dentro de 'banana'
+                if (start > 0 and folded[start - 1].isalnum()) or (end < len(folded) and folded[end].isalnum()):
+                    continue
+                seen.setdefault(name_key(name), name)
+        return list(seen.values())
+
+    def build(self, store: "ProfileStore", user_name: Optional[str],
+              recent_texts: List[str]) -> Tuple[str, str]:
+        """Devuelve (contexto de memoria compacto, último resumen del usuario actual)."""
+        user_key = name_key(user_name) if user_name else None
+        budget = self.token_budget
+        sections: List[str] = [f"El usuario actual se llama {user_name}."]
+
+        novio = store.novio_name()
+        if novio and name_key(novio) != user_key:
+            sections.append(f"Tu novio actual es {novio}.")
+
+        last_summary = ""
+        category, person = store.find_person(user_name) if user_name else (None, None)
+        if person is not None:
+            last_summary = person.get("resumen_conversacion", "")
+            sections.append(self._fit(category, person, budget - estimate_tokens("\n".join(sections))))
+        else:
+            sections.append("No tienes recuerdos de este usuario todavía.")
+
+        used = estimate_tokens("\n".join(sections))
+        others = [n for n in self.mentioned_names(store, recent_texts) if name_key(n) != user_key]
+        if others:
+            header = "Personas mencionadas que recuerdas:"
+            used += estimate_tokens(header)
+            rendered: List[str] = []
+            for name in others:
+                category, person = store.find_person(name)
+                if person is None:
+                    continue
+                block = self._fit(category, person, budget - used)
+                if not block:
+                    break
+                rendered.append(block)
+                used += estimate_tokens(block)
+            if rendered:
+                sections.append(header)
+                sections.extend(rendered)
+
+        return "\n".join(s for s in sections if s), last_summary
+
+    def _fit(self, category: str, person: Dict[str, Any], budget: int) -> str:
+        """Renderiza el perfil recortando los datos más antiguos hasta que quepa en el presupuesto."""
+        block = render_person(category, person)
+        if estimate_tokens(block) <= budget:
+            return block
+        longest = max((len(person.get("perfil", {}).get(f) or []) for f in PROFILE_FIELDS), default=0)
+        for max_items in range(longest - 1, -1, -1):
+            block = render_person(category, person, max_items=max_items)
+            if estimate_tokens(block) <= budget:
+                return block
+        return ""
@@ -0,0 +1,97 @@
+# context_window.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from tokens import estimate_tokens
+
+Message = Dict[str, Any]
+TokenCounter = Callable[[str], int]
+
+# Coste fijo por mensaje (rol y separadores de la plantilla de chat)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def compact_assistant_message(raw_response: str, data: Optional[Dict[str, Any]] = None) -> Message:
+    """
+    Mensaje de Miku tal y como se guarda en la ventana: solo el `texto`, sin el resto
+    del JSON (emoción, memoria, personas...), que no aporta nada a los turnos siguientes
+    y hace que el tamaño del prompt varíe mucho de un turno a otro.
+    """
+    text = data.get("texto") if isinstance(data, dict) else None
+    return {"role": "assistant", "content": text if isinstance(text, str) and text else raw_response}
+
+
+class ContextWindow:
+    """
+    Ventana de conversación acotada por tokens en lugar de por número de mensajes.
+
+    Cada mensaje se cuenta una sola vez al entrar (con el tokenizador del modelo activo).
+    Cuando el total supera el presupuesto se quitan los mensajes más antiguos; si eso deja
+    una respuesta de Miku al principio, también sale para que la ventana empiece siempre
+    con un mensaje del usuario. El último mensaje nunca se quita. Lo que sale se entrega a
+    `on_evict` (el resumen incremental) en lugar de perderse.
+    """
+
+    def __init__(self, budget: int, count: TokenCounter = estimate_tokens,
+                 on_evict: Optional[Callable[[Message], None]] = None):
+        self.budget = budget
+        self._count = count
+        self._on_evict = on_evict
+        self._messages: Deque[Message] = deque()
+        self._costs: Deque[int] = deque()
+        self.tokens = 0
+        self.version = 0  # Cambia cada vez que cambia el contenido de la ventana
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self._messages)
+
+    def __reversed__(self) -> Iterator[Message]:
+        return reversed(self._messages)
+
+    @property
+    def messages(self) -> List[Message]:
+        """Copia de los mensajes de la ventana (para mandarla al modelo)."""
+        return list(self._messages)
+
+    def cost(self, message: Message) -> int:
+        return self._count(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+    def append(self, message: Message) -> List[Message]:
+        """Añade un mensaje y devuelve los que han salido de la ventana para hacerle sitio."""
+        cost = self.cost(message)
+        self.version += 1
+        self._messages.append(message)
+        self._costs.append(cost)
+        self.tokens += cost
+        return self._trim()
+
+    def set_budget(self, budget: int) -> List[Message]:
+        """Cambia el presupuesto (p.ej. al cambiar de modelo) y devuelve lo que haya salido."""
+        self.budget = budget
+        self.version += 1
+        return self._trim()
+
+    def clear(self) -> None:
+        self.version += 1
+        self._messages.clear()
+        self._costs.clear()
+        self.tokens = 0
+
+    def _trim(self) -> List[Message]:
+        evicted: List[Message] = []
+        while len(self._messages) > 1 and (
+            self.tokens > self.budget or self._messages[0]["role"] == "assistant" and evicted
+        ):
+            message = self._messages.popleft()
+            self.tokens -= self._costs.popleft()
+            evicted.append(message)
+            if self._on_evict is not None:
+                self._on_evict(message)
+        return evicted
@@ -0,0 +1,150 @@
+# face_pack.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import hashlib
+import json
+import logging
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from persistence import atomic_write_bytes
+
+# --- PAQUETE DE CARAS ---
+# Un único archivo con todas las caras:
+#
+#   MAGIC (8 bytes) | longitud del índice (uint32 LE) | índice JSON | frames comprimidos
+#
+# El índice guarda por emoción su estilo, los fps (0 = estática) y (offset, longitud)
+# de cada frame comprimido con zlib, más el sha1 de caras_ascii.py con el que se generó.
+# Al abrir solo se lee el índice; cada frame se lee y descomprime la primera vez que se
+# muestra, así que en memoria solo están las caras que se han usado.
+
+MAGIC = b"NOVIAFC1"
+SOURCE_FILE = Path(__file__).with_name("caras_ascii.py")
+DEFAULT_FACE = "default"
+
+
+def _source_digest(source: Path) -> Optional[str]:
+    try:
+        return hashlib.sha1(source.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def build_pack(faces: Dict[str, Tuple[Any, str, Optional[bool]]], fps: Dict[str, float],
+               source_digest: Optional[str] = None) -> bytes:
+    """Serializa {emoción: (arte o lista de frames, estilo, no_wrap)} al formato del paquete."""
+    index: Dict[str, Any] = {"version": 1, "source": source_digest, "faces": {}}
+    blobs: List[bytes] = []
+    offset = 0
+    for emotion, (art, style, no_wrap) in faces.items():
+        frames = [art] if isinstance(art, str) else list(art)
+        spans = []
+        for frame in frames:
+            blob = zlib.compress(frame.encode("utf-8"), 9)
+            spans.append([offset, len(blob)])
+            blobs.append(blob)
+            offset += len(blob)
+        index["faces"][emotion] = {
+            "style": style,
+            "no_wrap": no_wrap,
+            "fps": fps.get(emotion, 0) if len(frames) > 1 else 0,
+            "frames": spans,
+        }
+    header = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return MAGIC + struct.pack("<I", len(header)) + header + b"".join(blobs)
+
+
+def build_from_source(path: Path, source: Path = SOURCE_FILE) -> bytes:
+    """Genera el paquete a partir de caras_ascii.py y lo guarda en `path` (si se puede escribir)."""
+    import caras_ascii
+
+    data = build_pack(caras_ascii.CARAS, caras_ascii.CARAS_FPS, _source_digest(source))
+    try:
+        atomic_write_bytes(path, data)
+    except OSError as e:
+        logging.warning(f"No se pudo guardar {path}: {e} (se usa el paquete en memoria)")
+    return data
+
+
+class FacePack:
+    """Lector del paquete: índice al abrir, frames bajo demanda."""
+
+    def __init__(self, path: Path, data: Optional[bytes] = None):
+        self.path = Path(path)
+        self._data = data  # Paquete recién generado: se sirve desde memoria
+        self._lock = threading.Lock()
+        self._frames: Dict[Tuple[str, int], str] = {}
+        if data is not None:
+            header = data[:len(MAGIC) + 4]
+        else:
+            with self.path.open("rb") as f:
+                header = f.read(len(MAGIC) + 4)
+        if len(header) < len(MAGIC) + 4 or header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} no es un paquete de caras")
+        (index_len,) = struct.unpack("<I", header[len(MAGIC):])
+        self._data_start = len(header) + index_len
+        self.index: Dict[str, Any] = json.loads(self._read(len(header), index_len))
+        self.faces: Dict[str, Dict[str, Any]] = self.index["faces"]
+
+    def _read(self, start: int, length: int) -> bytes:
+        if self._data is not None:
+            return self._data[start:start + length]
+        with self.path.open("rb") as f:
+            f.seek(start)
+            return f.read(length)
+
+    def resolve(self, emotion: str) -> str:
+        """La emoción si existe en el paquete; si no, la cara por defecto."""
+        return emotion if emotion in self.faces else DEFAULT_FACE
+
+    def frame_count(self, emotion: str) -> int:
+        return len(self.faces[emotion]["frames"])
+
+    def fps(self, emotion: str) -> float:
+        return self.faces[emotion]["fps"]
+
+    def style(self, emotion: str) -> Tuple[str, Optional[bool]]:
+        face = self.faces[emotion]
+        return face["style"], face["no_wrap"]
+
+    def frame(self, emotion: str, number: int = 0) -> str:
+        key = (emotion, number)
+        art = self._frames.get(key)
+        if art is None:
+            offset, length = self.faces[emotion]["frames"][number]
+            with self._lock:
+                blob = self._read(self._data_start + offset, length)
+            art = self._frames[key] = zlib.decompress(blob).decode("utf-8")
+        return art
+
+
+def open_pack(path: Path, source: Path = SOURCE_FILE) -> FacePack:
+    """
+    Abre el paquete; si falta, está dañado o se generó con otra versión de
+    caras_ascii.py, lo regenera primero.
+    """
+    path = Path(path)
+    digest = _source_digest(source)
+    try:
+        pack = FacePack(path)
+        if digest is None or pack.index.get("source") == digest:
+            return pack
+        logging.info(f"{source.name} ha cambiado: regenerando {path.name}")
+    except (OSError, ValueError, KeyError) as e:
+        logging.info(f"Generando {path.name} ({e})")
+    return FacePack(path, build_from_source(path, source))
+
+
+if __name__ == "__main__":
+    from config import Config
+
+    data = build_from_source(Config.FACE_PACK_FILE)
+    pack = FacePack(Config.FACE_PACK_FILE, data)
+    source_size = SOURCE_FILE.stat().st_size
+    print(f"{Config.FACE_PACK_FILE}: {len(pack.faces)} caras, {len(data)} bytes (fuente: {source_size} bytes)")
@@ -0,0 +1,107 @@
+# face_panel.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from rich.text import Text
+from textual.geometry import Size
+from textual.strip import Strip
+from textual.timer import Timer
+from textual.widget import Widget
+
+import metrics
+from config import Config
+from face_pack import FacePack, open_pack
+
+# --- PANEL DE LA CARA ---
+# En lugar de pasarle un Text nuevo a un Static en cada cambio de emoción (y que Rich lo
+# vuelva a medir y partir en líneas), las líneas ya renderizadas se guardan por
+# (emoción, frame, ancho): cambiar de cara durante el streaming es cambiar una clave, y
+# animar una cara es recorrer líneas que ya están en la caché.
+
+_pack: Optional[FacePack] = None
+
+
+def get_face_pack() -> FacePack:
+    """Paquete de caras (se abre la primera vez que se muestra una cara)."""
+    global _pack
+    if _pack is None:
+        _pack = open_pack(Config.FACE_PACK_FILE)
+    return _pack
+
+
+class FacePanel(Widget):
+    """Muestra la cara de Miku a partir del paquete de caras, con caché de líneas renderizadas."""
+
+    DEFAULT_CSS = """
+    FacePanel {
+        height: auto;
+    }
+    """
+
+    def __init__(self, cache_size: int = Config.FACE_RENDER_CACHE, **kwargs):
+        super().__init__(**kwargs)
+        self.emotion: Optional[str] = None
+        self.frame = 0
+        self._cache: "OrderedDict[Tuple[str, int, int], List[Strip]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._timer: Optional[Timer] = None
+
+    def show(self, emotion: str) -> None:
+        """Cambia la cara mostrada (emociones desconocidas usan la cara por defecto)."""
+        emotion = get_face_pack().resolve(emotion)
+        if emotion == self.emotion:
+            return
+        self.emotion = emotion
+        self.frame = 0
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        pack = get_face_pack()
+        if pack.frame_count(emotion) > 1 and pack.fps(emotion) > 0:
+            self._timer = self.set_interval(1 / pack.fps(emotion), self._next_frame)
+        # El alto puede cambiar entre caras
+        self.refresh(layout=True)
+
+    def _next_frame(self) -> None:
+        self.frame = (self.frame + 1) % get_face_pack().frame_count(self.emotion)
+        self.refresh()
+
+    def _lines(self, width: int) -> List[Strip]:
+        if self.emotion is None or width <= 0:
+            return []
+        key = (self.emotion, self.frame, width)
+        lines = self._cache.get(key)
+        if lines is not None:
+            self._cache.move_to_end(key)
+            return lines
+        metrics.inc("face_render_cache_miss_total")
+        pack = get_face_pack()
+        style, no_wrap = pack.style(self.emotion)
+        # Alineación desde el CSS (text-align), como hace Static
+        text_align = self.styles.text_align
+        justify = {"start": "left", "end": "right"}.get(text_align, text_align)
+        text = Text(pack.frame(self.emotion, self.frame), justify=justify, style=style, no_wrap=no_wrap)
+        console = self.app.console
+        rendered = console.render_lines(text, console.options.update_width(width), style=self.rich_style, pad=True)
+        lines = self._cache[key] = [Strip(line, width) for line in rendered]
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return lines
+
+    def get_content_height(self, container: Size, viewport: Size, width: int) -> int:
+        return len(self._lines(width))
+
+    def render_line(self, y: int) -> Strip:
+        width = self.size.width
+        lines = self._lines(width)
+        if y < len(lines):
+            return lines[y]
+        return Strip.blank(width, self.rich_style)
+
+    def on_unmount(self) -> None:
+        if self._timer is not None:
+            self._timer.stop()
@@ -0,0 +1,185 @@
+# fake_llm.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+"""
+Servidor LLM falso compatible con la API de Ollama (/api/generate, /api/chat, /api/show)
+para probar latencias, errores y fallback sin un modelo real.
+
+Uso:
+    python fake_llm.py --port 11500 --latency 2 --error-rate 0.2
+    OLLAMA_API_BASE=http://127.0.0.1:11500 python main.py   (con USE_OLLAMA = True)
+
+Para probar el hedging entre backends se levantan dos servidores y el backend
+"gemini" se apunta al segundo con MODEL_GEMINI = "ollama/fake" y GEMINI_API_BASE.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+DEFAULT_REPLY = json.dumps(
+    {"emocion": "feliz", "texto": "Hola, mi amor. Estoy aquí contigo.", "personas_mencionadas": []},
+    ensure_ascii=False
+)
+
+
+@dataclass
+class FakeBehaviour:
+    """Comportamiento del servidor (se puede cambiar en caliente desde las pruebas)."""
+    reply: str = DEFAULT_REPLY
+    latency: float = 0.0        # Segundos hasta el primer token
+    jitter: float = 0.0         # Latencia extra aleatoria en [0, jitter]
+    token_delay: float = 0.0    # Segundos entre tokens en streaming
+    chunk_size: int = 8         # Caracteres por token
+    error_rate: float = 0.0     # Probabilidad de responder con error
+    error_status: int = 503
+    truncate: Optional[int] = None  # Cortar la respuesta a N caracteres (JSON truncado)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeOllama/1.0"
+    protocol_version = "HTTP/1.1"  # Conexiones persistentes, como Ollama
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def handle(self) -> None:
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass  # El cliente cerró una conexión persistente que no estaba usando
+
+    @property
+    def behaviour(self) -> FakeBehaviour:
+        return self.server.behaviour
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid json"})
+            return
+        self.server.requests += 1
+
+        if self.path == "/api/show":
+            self._send_json(200, {"model_info": {}, "template": ""})
+            return
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        behaviour = self.behaviour
+        started = time.perf_counter()
+        time.sleep(behaviour.latency + random.uniform(0, behaviour.jitter))
+        prefilled = time.perf_counter()
+        if random.random() < behaviour.error_rate:
+            self._send_json(behaviour.error_status, {"error": "fake error"})
+            return
+
+        reply = behaviour.reply if behaviour.truncate is None else behaviour.reply[:behaviour.truncate]
+        chat = self.path == "/api/chat"
+        model = request.get("model", "fake")
+        if not request.get("stream", True):
+            self._send_json(200, _final_chunk(model, chat, reply, len(reply), started, prefilled))
+            return
+
+        # Streaming NDJSON con Transfer-Encoding: chunked, como Ollama
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i in range(0, len(reply), behaviour.chunk_size):
+                piece = reply[i:i + behaviour.chunk_size]
+                chunk = {"model": model, "done": False}
+                if chat:
+                    chunk["message"] = {"role": "assistant", "content": piece}
+                else:
+                    chunk["response"] = piece
+                self._write_chunk(chunk)
+                if behaviour.token_delay:
+                    time.sleep(behaviour.token_delay)
+            self._write_chunk(_final_chunk(model, chat, "", len(reply), started, prefilled))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente canceló (p.ej. perdió la carrera del hedging)
+            self.close_connection = True
+
+    def _write_chunk(self, payload: dict) -> None:
+        line = json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+
+def _final_chunk(model: str, chat: bool, text: str, reply_chars: int, started: float, prefilled: float) -> dict:
+    # Tiempos en nanosegundos, como los informa Ollama: la latencia hace de prefill y el resto de generación
+    now = time.perf_counter()
+    chunk = {"model": model, "done": True, "prompt_eval_count": 0, "eval_count": reply_chars // 4,
+             "prompt_eval_duration": int((prefilled - started) * 1e9), "eval_duration": int((now - prefilled) * 1e9),
+             "total_duration": int((now - started) * 1e9)}
+    if chat:
+        chunk["message"] = {"role": "assistant", "content": text}
+    else:
+        chunk["response"] = text
+    return chunk
+
+
+def start_fake_llm(host: str = "127.0.0.1", port: int = 0,
+                   behaviour: Optional[FakeBehaviour] = None) -> Tuple[ThreadingHTTPServer, str]:
+    """Arranca el servidor en un hilo. Devuelve (servidor, api_base); server.shutdown() lo detiene
+    y server.server_close() libera el puerto."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.behaviour = behaviour or FakeBehaviour()
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, name="fake-llm", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor LLM falso compatible con Ollama")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos hasta el primer token")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--truncate", type=int, default=None)
+    parser.add_argument("--reply", default=DEFAULT_REPLY)
+    args = parser.parse_args()
+
+    behaviour = FakeBehaviour(reply=args.reply, latency=args.latency, jitter=args.jitter,
+                              token_delay=args.token_delay, error_rate=args.error_rate,
+                              error_status=args.error_status, truncate=args.truncate)
+    server = ThreadingHTTPServer((args.host, args.port), _Handler)
+    server.behaviour = behaviour
+    server.requests = 0
+    print(f"LLM falso escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
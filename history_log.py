@@ -0,0 +1,283 @@
+# history_log.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import json
+import logging
+import os
+import sys
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Iterable, Iterator
+
+# Tamaño de bloque para buscar hacia atrás el último salto de línea
+_TAIL_CHUNK = 4096
+
+
+class HistoryLog:
+    """
+    Historial episódico append-only en formato JSONL.
+
+    Cada interacción es una línea del archivo de log. Un índice lateral
+    (array de offsets en bytes, uint64) permite leer cualquier entrada por id
+    sin parsear el resto, y cada turno cuesta una escritura al final + fsync.
+
+    Los ids no tienen por qué empezar en 0: si las entradas antiguas se archivan
+    (history_segments.py), el log conserva los ids y `first_id` es el del primero.
+    `min_first_id` es el id con el que empieza un log vacío.
+    """
+
+    def __init__(self, log_path: Path, index_path: Path, legacy_path: Optional[Path] = None, fsync: bool = True,
+                 min_first_id: int = 0):
+        self.log_path = Path(log_path)
+        self.index_path = Path(index_path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self.fsync = fsync
+        self.min_first_id = min_first_id
+        self._lock = threading.RLock()
+        self._base = min_first_id
+        self._offsets = array("Q")
+        self._size = 0
+        self._opened = False
+        self._append_fh = None
+        self._read_fh = None
+
+    # --- APERTURA Y RECUPERACIÓN ---
+
+    def _ensure_open(self) -> None:
+        if self._opened:
+            return
+        with self._lock:
+            if self._opened:
+                return
+            if not self.log_path.exists() and self.legacy_path and self.legacy_path.exists():
+                self._migrate_legacy()
+            self.log_path.touch(exist_ok=True)
+            self._repair_torn_tail()
+            self._size = self.log_path.stat().st_size
+            if not self._load_index():
+                self._rebuild_index()
+            self._base = self._read_first_id()
+            self._opened = True
+
+    def _read_first_id(self) -> int:
+        """Id de la primera entrada (o min_first_id si el log está vacío o esa línea no se puede leer)."""
+        if not self._offsets:
+            return self.min_first_id
+        with self.log_path.open("rb") as f:
+            entry = _decode(f.readline())
+        entry_id = entry.get("id") if isinstance(entry, dict) else None
+        return entry_id if isinstance(entry_id, int) else self.min_first_id
+
+    def _repair_torn_tail(self) -> None:
+        """Si el proceso murió a mitad de una escritura, descarta la última línea incompleta."""
+        size = self.log_path.stat().st_size
+        if size == 0:
+            return
+        with self.log_path.open("rb+") as f:
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            pos = size
+            keep = 0
+            while pos > 0:
+                start = max(0, pos - _TAIL_CHUNK)
+                f.seek(start)
+                chunk = f.read(pos - start)
+                idx = chunk.rfind(b"\n")
+                if idx != -1:
+                    keep = start + idx + 1
+                    break
+                pos = start
+            f.truncate(keep)
+            logging.warning(f"Historial: línea incompleta descartada ({size - keep} bytes) en {self.log_path}")
+
+    def _load_index(self) -> bool:
+        """Carga el índice de offsets y comprueba que cuadra con el final del log."""
+        if not self.index_path.exists():
+            return self._size == 0
+        offsets = array("Q")
+        raw = self.index_path.read_bytes()
+        if len(raw) % offsets.itemsize:
+            return False
+        offsets.frombytes(raw)
+        if not offsets:
+            return self._size == 0
+        with self.log_path.open("rb") as f:
+            f.seek(offsets[-1])
+            f.readline()
+            if f.tell() != self._size:
+                return False
+        self._offsets = offsets
+        return True
+
+    def _rebuild_index(self) -> None:
+        """Reconstruye el índice recorriendo el log completo (solo tras un fallo o migración)."""
+        offsets = array("Q")
+        with self.log_path.open("rb") as f:
+            pos = 0
+            for line in f:
+                offsets.append(pos)
+                pos += len(line)
+        self._offsets = offsets
+        tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        with tmp.open("wb") as f:
+            offsets.tofile(f)
+        os.replace(tmp, self.index_path)
+        logging.info(f"Índice de historial reconstruido: {len(offsets)} entradas")
+
+    def _migrate_legacy(self) -> None:
+        """Migración única desde el antiguo historial.json (lista JSON completa)."""
+        try:
+            with self.legacy_path.open("r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"No se pudo migrar {self.legacy_path}: {e}")
+            return
+        self._write_entries(legacy if isinstance(legacy, list) else [])
+        logging.info(f"Historial migrado de {self.legacy_path} a {self.log_path}: {len(legacy)} entradas")
+
+    def _write_entries(self, entries: Iterable[Dict[str, Any]], first_id: int = 0) -> None:
+        """Escribe un log nuevo de forma atómica (temporal + os.replace)."""
+        tmp = self.log_path.with_name(self.log_path.name + ".tmp")
+        with tmp.open("wb") as f:
+            for i, entry in enumerate(entries, first_id):
+                entry = dict(entry)
+                entry["id"] = i
+                f.write(_encode(entry))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.log_path)
+        # El índice viejo ya no sirve
+        self.index_path.unlink(missing_ok=True)
+
+    def _close_handles(self) -> None:
+        for fh in (self._append_fh, self._read_fh):
+            if fh is not None:
+                fh.close()
+        self._append_fh = None
+        self._read_fh = None
+
+    # --- API PÚBLICA ---
+
+    def __len__(self) -> int:
+        """Siguiente id libre (= número de entradas si no se ha archivado nada)."""
+        self._ensure_open()
+        return self._base + len(self._offsets)
+
+    @property
+    def first_id(self) -> int:
+        self._ensure_open()
+        return self._base
+
+    def append(self, entry: Dict[str, Any]) -> int:
+        """Añade una entrada al final del log y devuelve su id."""
+        self._ensure_open()
+        with self._lock:
+            entry_id = self._base + len(self._offsets)
+            entry["id"] = entry_id
+            line = _encode(entry)
+            if self._append_fh is None:
+                self._append_fh = self.log_path.open("ab")
+            self._append_fh.write(line)
+            self._append_fh.flush()
+            if self.fsync:
+                os.fsync(self._append_fh.fileno())
+            offset = self._size
+            self._size += len(line)
+            self._offsets.append(offset)
+            # El índice es reconstruible, así que no necesita fsync propio
+            with self.index_path.open("ab") as f:
+                f.write(offset.to_bytes(self._offsets.itemsize, sys.byteorder))
+            return entry_id
+
+    def get(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        """Lee una entrada por id sin tocar el resto del historial."""
+        self._ensure_open()
+        with self._lock:
+            pos = entry_id - self._base
+            if pos < 0 or pos >= len(self._offsets):
+                return None
+            if self._read_fh is None:
+                self._read_fh = self.log_path.open("rb")
+            self._read_fh.seek(self._offsets[pos])
+            return _decode(self._read_fh.readline())
+
+    def iter_entries(self, start: int = 0) -> Iterator[Dict[str, Any]]:
+        """Recorre las entradas en orden a partir del id indicado."""
+        self._ensure_open()
+        with self._lock:
+            pos = max(0, start - self._base)
+            if pos >= len(self._offsets):
+                return
+            begin = self._offsets[pos]
+            end = self._size
+        with self.log_path.open("rb") as f:
+            f.seek(begin)
+            while f.tell() < end:
+                line = f.readline()
+                if not line:
+                    break
+                entry = _decode(line)
+                if entry is not None:
+                    yield entry
+
+    def read_all(self) -> List[Dict[str, Any]]:
+        return list(self.iter_entries())
+
+    def rewrite(self, entries: Iterable[Dict[str, Any]], first_id: int = 0) -> None:
+        """Sustituye el historial completo, con ids desde `first_id` (compatibilidad con save_history)."""
+        self._ensure_open()
+        with self._lock:
+            self._close_handles()
+            self._write_entries(entries, first_id)
+            self._size = self.log_path.stat().st_size
+            self._rebuild_index()
+            self.min_first_id = first_id
+            self._base = self._read_first_id()
+
+    def drop_before(self, entry_id: int) -> None:
+        """
+        Quita del log las entradas con id < entry_id (ya archivadas) conservando los
+        ids del resto. Copia los bytes restantes sin parsearlos.
+        """
+        self._ensure_open()
+        with self._lock:
+            pos = entry_id - self._base
+            if pos <= 0:
+                return
+            self._close_handles()
+            begin = self._offsets[pos] if pos < len(self._offsets) else self._size
+            tmp = self.log_path.with_name(self.log_path.name + ".tmp")
+            with self.log_path.open("rb") as src, tmp.open("wb") as dst:
+                src.seek(begin)
+                while True:
+                    chunk = src.read(1 << 20)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp, self.log_path)
+            self._size = self.log_path.stat().st_size
+            self.min_first_id = entry_id
+            self._rebuild_index()
+            self._base = self._read_first_id()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_handles()
+
+
+def _encode(entry: Dict[str, Any]) -> bytes:
+    return (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _decode(line: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        logging.warning(f"Entrada de historial corrupta ignorada: {e}")
+        return None
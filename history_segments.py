@@ -0,0 +1,490 @@
+# history_segments.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import base64
+import bisect
+import gzip
+import hashlib
+import heapq
+import json
+import logging
+import math
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from history_log import HistoryLog, _decode, _encode
+from persistence import atomic_write_bytes, atomic_write_text
+from search_index import Postings, bm25_idf, bm25_top, document_text
+from text_utils import tokenize
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional: sin él los segmentos se comprimen con gzip
+    zstandard = None
+
+# --- HISTORIAL POR NIVELES ---
+# El log activo (historial.jsonl) solo guarda el periodo actual (mes, semana o día).
+# Al cambiar de periodo, las entradas anteriores se sellan en segmentos comprimidos
+# (zstd o gzip), uno por periodo, conservando sus ids. Cada segmento lleva en el
+# manifiesto un pequeño resumen (fechas, usuarios, términos más frecuentes) y un filtro
+# de Bloom con sus términos: una búsqueda solo descomprime los segmentos que pueden
+# contener alguna palabra de la consulta. La retención borra los segmentos más antiguos
+# por edad o por tamaño total.
+
+MANIFEST_NAME = "manifest.json"
+_PERIOD_FORMATS = {"day": "%Y-%m-%d", "week": "%G-W%V", "month": "%Y-%m"}
+
+
+def period_key(timestamp: float, period: str) -> str:
+    """Periodo al que pertenece un instante ('2025-03' para period='month')."""
+    return time.strftime(_PERIOD_FORMATS[period], time.localtime(timestamp))
+
+
+# --- FILTRO DE BLOOM ---
+
+class BloomFilter:
+    """Filtro de Bloom con doble hashing sobre blake2b (sin falsos negativos)."""
+
+    def __init__(self, bits: int, hashes: int, data: Optional[bytearray] = None):
+        self.bits = max(8, bits)
+        self.hashes = max(1, hashes)
+        self.data = data if data is not None else bytearray((self.bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, items: int, error_rate: float = 0.01) -> "BloomFilter":
+        items = max(1, items)
+        bits = math.ceil(-items * math.log(error_rate) / (math.log(2) ** 2))
+        return cls(bits, round(bits / items * math.log(2)))
+
+    def _positions(self, item: str) -> Iterator[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.data[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.data[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"bits": self.bits, "hashes": self.hashes, "data": base64.b64encode(bytes(self.data)).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BloomFilter":
+        return cls(data["bits"], data["hashes"], bytearray(base64.b64decode(data["data"])))
+
+
+# --- COMPRESIÓN ---
+
+def pick_codec(codec: str) -> str:
+    """'auto' = zstd si está instalado, si no gzip."""
+    if codec == "zstd" and zstandard is None:
+        logging.warning("zstandard no está instalado; los segmentos se comprimen con gzip")
+        return "gzip"
+    if codec == "auto":
+        return "zstd" if zstandard is not None else "gzip"
+    return codec
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Segmento zstd pero zstandard no está instalado")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+# --- SEGMENTOS SELLADOS ---
+
+class _LoadedSegment:
+    """Entradas de un segmento descomprimido con un índice invertido propio para puntuar con BM25."""
+
+    __slots__ = ("entries", "postings", "doc_len", "avgdl")
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self.entries = entries
+        # Mismo formato que BM25Index: (posiciones en `entries`, frecuencias) por término
+        self.postings: Dict[str, Postings] = {}
+        self.doc_len = array("I")
+        for i, entry in enumerate(entries):
+            terms = Counter(tokenize(document_text(entry)))
+            self.doc_len.append(sum(terms.values()))
+            for term, tf in terms.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = (array("I"), array("H"))
+                postings[0].append(i)
+                postings[1].append(min(tf, 0xFFFF))
+        self.avgdl = (sum(self.doc_len) / len(entries)) if entries else 1.0
+
+    def search(self, budget: Dict[str, int], limit: int, k1: float, b: float) -> List[Tuple[float, int]]:
+        """
+        Los `limit` mejores [(score, id)] del segmento. `budget` dice cuántas apariciones
+        (las más recientes) se recorren como mucho por término y se descuenta.
+        """
+        n_docs = len(self.entries)
+        plan: List[Tuple[Postings, float, int]] = []
+        for term, remaining in budget.items():
+            postings = self.postings.get(term)
+            if not postings or remaining <= 0:
+                continue
+            df = len(postings[0])
+            budget[term] = remaining - df
+            plan.append((postings, bm25_idf(n_docs, df), max(0, df - remaining)))
+        # Las posiciones van en el mismo orden que los ids: desempatar por una es desempatar por el otro
+        return [(score, self.entries[i]["id"])
+                for score, i in bm25_top(plan, self.doc_len, 0, self.avgdl or 1.0, k1, b, limit)]
+
+
+class SegmentStore:
+    """
+    Directorio de segmentos sellados + manifiesto (JSON) con el resumen y el filtro de
+    Bloom de cada uno. Solo se descomprimen los segmentos que hacen falta y se
+    guardan los últimos `cache_size` en memoria.
+    """
+
+    def __init__(self, directory: Path, codec: str = "auto", cache_size: int = 4):
+        self.directory = Path(directory)
+        self.codec = codec
+        self.cache_size = cache_size
+        self._lock = threading.RLock()
+        self._cache: "OrderedDict[str, _LoadedSegment]" = OrderedDict()
+        self._blooms: Dict[str, BloomFilter] = {}
+        self.segments: List[Dict[str, Any]] = self._load_manifest()
+
+    # --- MANIFIESTO ---
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / MANIFEST_NAME
+
+    def _load_manifest(self) -> List[Dict[str, Any]]:
+        try:
+            data = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return []
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Manifiesto de segmentos ilegible ({e}); se ignoran los segmentos archivados")
+            return []
+        segments = [s for s in data.get("segments", []) if (self.directory / s["file"]).exists()]
+        return sorted(segments, key=lambda s: s["first_id"])
+
+    def _save_manifest(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(self.manifest_path, json.dumps({"version": 1, "segments": self.segments}, ensure_ascii=False))
+
+    @property
+    def next_id(self) -> int:
+        """Primer id posterior a todo lo archivado."""
+        return self.segments[-1]["last_id"] + 1 if self.segments else 0
+
+    def total_bytes(self) -> int:
+        return sum(s["bytes"] for s in self.segments)
+
+    # --- SELLADO ---
+
+    def seal(self, period: str, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Comprime `entries` (ids consecutivos, un mismo periodo) en un segmento nuevo."""
+        codec = pick_codec(self.codec)
+        raw = b"".join(_encode(e) for e in entries)
+        data = _compress(raw, codec)
+        name = f"{period}_{entries[0]['id']:08d}.jsonl.{'zst' if codec == 'zstd' else 'gz'}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(self.directory / name, data)
+
+        term_counts: Counter = Counter()
+        for entry in entries:
+            term_counts.update(set(tokenize(document_text(entry))))
+        bloom = BloomFilter.for_capacity(len(term_counts))
+        for term in term_counts:
+            bloom.add(term)
+        timestamps = [e.get("timestamp", 0) for e in entries]
+        segment = {
+            "file": name,
+            "period": period,
+            "codec": codec,
+            "first_id": entries[0]["id"],
+            "last_id": entries[-1]["id"],
+            "count": len(entries),
+            "ts_min": min(timestamps),
+            "ts_max": max(timestamps),
+            "bytes": len(data),
+            "raw_bytes": len(raw),
+            "users": dict(Counter(e.get("usuario", "") for e in entries).most_common()),
+            "top_terms": [term for term, _ in term_counts.most_common(10)],
+            "bloom": bloom.to_dict(),
+        }
+        with self._lock:
+            self.segments.append(segment)
+            self.segments.sort(key=lambda s: s["first_id"])
+            self._save_manifest()
+        logging.info(f"Historial: segmento {name} sellado ({len(entries)} entradas, {len(raw)} -> {len(data)} bytes)")
+        return segment
+
+    # --- RETENCIÓN ---
+
+    def apply_retention(self, max_age_days: Optional[float], max_bytes: Optional[int]) -> List[Dict[str, Any]]:
+        """Borra los segmentos más antiguos que superen la edad o el tamaño total. Devuelve los borrados."""
+        removed: List[Dict[str, Any]] = []
+        with self._lock:
+            cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+            total = self.total_bytes()
+            while self.segments:
+                oldest = self.segments[0]
+                too_old = cutoff is not None and oldest["ts_max"] < cutoff
+                too_big = max_bytes is not None and total > max_bytes
+                if not (too_old or too_big):
+                    break
+                self.segments.pop(0)
+                total -= oldest["bytes"]
+                (self.directory / oldest["file"]).unlink(missing_ok=True)
+                self._cache.pop(oldest["file"], None)
+                self._blooms.pop(oldest["file"], None)
+                removed.append(oldest)
+            if removed:
+                self._save_manifest()
+        for segment in removed:
+            logging.info(f"Historial: segmento {segment['file']} borrado por la política de retención")
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            for segment in self.segments:
+                (self.directory / segment["file"]).unlink(missing_ok=True)
+            self.segments = []
+            self._cache.clear()
+            self._blooms.clear()
+            if self.manifest_path.exists():
+                self._save_manifest()
+
+    # --- LECTURA ---
+
+    def _bloom(self, segment: Dict[str, Any]) -> BloomFilter:
+        bloom = self._blooms.get(segment["file"])
+        if bloom is None:
+            bloom = self._blooms[segment["file"]] = BloomFilter.from_dict(segment["bloom"])
+        return bloom
+
+    def _load(self, segment: Dict[str, Any]) -> _LoadedSegment:
+        with self._lock:
+            loaded = self._cache.get(segment["file"])
+            if loaded is not None:
+                self._cache.move_to_end(segment["file"])
+                return loaded
+            raw = _decompress((self.directory / segment["file"]).read_bytes(), segment["codec"])
+            entries = [e for e in (_decode(line) for line in raw.splitlines()) if e is not None]
+            loaded = self._cache[segment["file"]] = _LoadedSegment(entries)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return loaded
+
+    def _find(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        pos = bisect.bisect_right([s["first_id"] for s in self.segments], entry_id) - 1
+        if pos >= 0 and entry_id <= self.segments[pos]["last_id"]:
+            return self.segments[pos]
+        return None
+
+    def get(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            segment = self._find(entry_id)
+            if segment is None:
+                return None
+            loaded = self._load(segment)
+        index = entry_id - segment["first_id"]
+        if 0 <= index < len(loaded.entries) and loaded.entries[index].get("id") == entry_id:
+            return loaded.entries[index]
+        # Alguna línea corrupta se saltó al leer: buscar por id
+        return next((e for e in loaded.entries if e.get("id") == entry_id), None)
+
+    def iter_entries(self, start: int = 0) -> Iterator[Dict[str, Any]]:
+        for segment in list(self.segments):
+            if segment["last_id"] < start:
+                continue
+            for entry in self._load(segment).entries:
+                if entry.get("id", 0) >= start:
+                    yield entry
+
+    def candidates(self, terms: Iterable[str]) -> List[Dict[str, Any]]:
+        """Segmentos (del más reciente al más antiguo) cuyo filtro de Bloom contiene algún término."""
+        terms = list(terms)
+        with self._lock:
+            segments = list(reversed(self.segments))
+        return [s for s in segments if any(term in self._bloom(s) for term in terms)]
+
+    def search(self, query: str, limit: int = 3, max_segments: int = 4, max_postings_scan: int = 20000,
+               k1: float = 1.2, b: float = 0.75) -> List[Tuple[float, int]]:
+        """
+        [(score, id)] con BM25 dentro de cada segmento candidato (como mucho `max_segments`,
+        del más reciente al más antiguo). Como en BM25Index, para términos muy frecuentes
+        solo se recorren sus `max_postings_scan` apariciones más recientes, y los scores
+        van normalizados por segmento (search_index.bm25_top) antes de mezclarlos.
+        """
+        terms = set(tokenize(query))
+        if not terms or limit <= 0:
+            return []
+        budget = {term: max_postings_scan for term in terms}
+        scored: List[Tuple[float, int]] = []
+        for segment in self.candidates(terms)[:max_segments]:
+            # Un falso positivo del filtro solo cuesta descomprimir: la búsqueda no encuentra nada
+            scored.extend(self._load(segment).search(budget, limit, k1, b))
+            if all(remaining <= 0 for remaining in budget.values()):
+                break
+        return heapq.nlargest(limit, scored)
+
+
+# --- FACHADA: LOG ACTIVO + SEGMENTOS ---
+
+class TieredHistory:
+    """
+    Misma API que HistoryLog, repartida entre el log activo y los segmentos sellados.
+    Los ids son globales: `get(id)` va al log activo o al segmento que lo contiene.
+    El sellado se hace en un hilo aparte (al abrir y al cambiar de periodo): comprimir e
+    indexar un periodo grande tarda segundos y no debe retrasar la apertura ni los append.
+    Mientras tanto las entradas siguen en el log activo, donde se pueden leer.
+    """
+
+    def __init__(self, hot: HistoryLog, segments: SegmentStore, period: Optional[str] = "month",
+                 max_age_days: Optional[float] = None, max_bytes: Optional[int] = None,
+                 on_sealed: Iterable[Callable[[], None]] = ()):
+        self.hot = hot
+        self.segments = segments
+        self.period = period
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        # Lo toma el mantenimiento (sellado y retención), no los append
+        self._lock = threading.RLock()
+        self._maintenance: Optional[threading.Thread] = None
+        self._maintenance_lock = threading.Lock()
+        self._current_period: Optional[str] = None
+        # Se llaman tras sellar (p.ej. para rehacer el índice BM25, que solo cubre el log activo)
+        self.on_sealed: List[Callable[[], None]] = list(on_sealed)
+        self.hot.min_first_id = max(self.hot.min_first_id, segments.next_id)
+        self.maintain_in_background()
+
+    # --- MANTENIMIENTO ---
+
+    def maintain_in_background(self) -> None:
+        """Lanza maintain() en un hilo, si no hay ya uno en marcha."""
+        if self.period is None and self.max_age_days is None and self.max_bytes is None:
+            return
+        with self._maintenance_lock:
+            if self._maintenance is not None and self._maintenance.is_alive():
+                return
+            self._maintenance = threading.Thread(target=self._maintain_logged, name="novia-history-seal",
+                                                 daemon=True)
+            self._maintenance.start()
+
+    def _maintain_logged(self) -> None:
+        try:
+            self.maintain()
+        except Exception as e:
+            logging.error(f"Error sellando el historial: {e}")
+
+    def wait_maintenance(self) -> None:
+        """Espera a que termine el sellado en segundo plano (si lo hay)."""
+        maintenance = self._maintenance
+        if maintenance is not None and maintenance is not threading.current_thread():
+            maintenance.join()
+
+    def maintain(self) -> bool:
+        """Sella lo que sea de periodos anteriores y aplica la retención. True si selló algo."""
+        with self._lock:
+            sealed = self._seal_old_periods()
+            self.segments.apply_retention(self.max_age_days, self.max_bytes)
+        if sealed:
+            for callback in self.on_sealed:
+                callback()
+        return sealed
+
+    def _seal_old_periods(self) -> bool:
+        if self.period is None:
+            return False
+        current = period_key(time.time(), self.period)
+        self._current_period = current
+        archived_until = self.segments.next_id
+        if self.hot.first_id < archived_until:
+            # Un sellado anterior se interrumpió después de escribir el segmento
+            self.hot.drop_before(archived_until)
+        run: List[Dict[str, Any]] = []
+        run_period: Optional[str] = None
+        cut: Optional[int] = None
+        for entry in self.hot.iter_entries(self.hot.first_id):
+            entry_period = period_key(entry.get("timestamp", 0), self.period)
+            if entry_period >= current:
+                break
+            if run and entry_period != run_period:
+                self.segments.seal(run_period, run)
+                run = []
+            run_period = entry_period
+            run.append(entry)
+            cut = entry["id"] + 1
+        if run:
+            self.segments.seal(run_period, run)
+        if cut is None:
+            return False
+        self.hot.drop_before(cut)
+        return True
+
+    # --- API DE HistoryLog ---
+
+    def __len__(self) -> int:
+        return len(self.hot)
+
+    @property
+    def first_id(self) -> int:
+        """Primer id del log activo (lo anterior está archivado)."""
+        return self.hot.first_id
+
+    @property
+    def log_path(self) -> Path:
+        return self.hot.log_path
+
+    def append(self, entry: Dict[str, Any]) -> int:
+        if self.period is not None and period_key(entry.get("timestamp", time.time()), self.period) != self._current_period:
+            # Empezó otro periodo: el anterior se sella aparte, este append no lo espera
+            self.maintain_in_background()
+        return self.hot.append(entry)
+
+    def get(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        if entry_id >= self.hot.first_id:
+            return self.hot.get(entry_id)
+        return self.segments.get(entry_id)
+
+    def iter_entries(self, start: int = 0) -> Iterator[Dict[str, Any]]:
+        if start < self.hot.first_id:
+            yield from self.segments.iter_entries(start)
+        yield from self.hot.iter_entries(start)
+
+    def read_all(self) -> List[Dict[str, Any]]:
+        return list(self.iter_entries())
+
+    def rewrite(self, entries: Iterable[Dict[str, Any]], first_id: int = 0) -> None:
+        """Sustituye todo el historial (archivado incluido) y vuelve a sellar por periodos."""
+        entries = list(entries)
+        with self._lock:
+            self.segments.clear()
+            self.hot.rewrite(entries, first_id)
+        self.maintain()
+
+    def search_archive(self, query: str, limit: int = 3, max_segments: int = 4) -> List[Tuple[float, int]]:
+        return self.segments.search(query, limit, max_segments)
+
+    def close(self) -> None:
+        self.wait_maintenance()
+        self.hot.close()
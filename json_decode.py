@@ -0,0 +1,104 @@
+# json_decode.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+_decoder = json.JSONDecoder()
+
+
+def decode_json_object(text: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Busca el primer objeto JSON válido dentro de `text` en tiempo lineal.
+
+    Recorre el texto una vez contando llaves fuera de strings; cada objeto de
+    primer nivel balanceado se valida con JSONDecoder.raw_decode. Así el texto
+    que el modelo añada antes o después del objeto (o un bloque ```json) no
+    afecta. Si el texto se corta a mitad del objeto, se intenta repararlo.
+    Devuelve (objeto o None, reparado).
+    """
+    stack: List[str] = []
+    in_string = False
+    escape = False
+    start = -1
+    # (posición, pila) de cada coma de nivel >= 1: puntos seguros donde recortar al reparar
+    cut_points: List[Tuple[int, Tuple[str, ...]]] = []
+
+    for i, ch in enumerate(text):
+        if not stack:
+            if ch == "{":
+                stack.append("{")
+                start = i
+                cut_points = []
+            continue
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(ch)
+        elif ch in "}]":
+            stack.pop()
+            if not stack:
+                obj = _try_decode(text, start)
+                if obj is not None:
+                    return obj, False
+                # Objeto balanceado pero inválido: seguir buscando el siguiente
+        elif ch == ",":
+            cut_points.append((i, tuple(stack)))
+
+    if stack and start >= 0:
+        obj = _repair(text, start, stack, in_string, escape, cut_points)
+        if obj is not None:
+            return obj, True
+    return None, False
+
+
+def _try_decode(text: str, start: int) -> Optional[Dict[str, Any]]:
+    try:
+        obj, _end = _decoder.raw_decode(text, start)
+    except json.JSONDecodeError:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def _close(fragment: str, stack) -> str:
+    return fragment + "".join(_CLOSERS[c] for c in reversed(stack))
+
+
+def _repair(text: str, start: int, stack: List[str], in_string: bool, escape: bool,
+            cut_points: List[Tuple[int, Tuple[str, ...]]]) -> Optional[Dict[str, Any]]:
+    """Repara un objeto truncado: cierra el string abierto, quita lo incompleto y cierra la pila."""
+    fragment = text[start:]
+    if in_string:
+        if escape:
+            # El corte cayó justo después de una barra invertida
+            fragment = fragment[:-1]
+        fragment += '"'
+    else:
+        fragment = fragment.rstrip()
+        if fragment.endswith(","):
+            fragment = fragment[:-1]
+        elif fragment.endswith(":"):
+            fragment += "null"
+    candidates = [_close(fragment, stack)]
+    # Si aún no es válido (p.ej. una clave sin valor), recortar hasta la última coma segura
+    for pos, cut_stack in reversed(cut_points[-3:]):
+        candidates.append(_close(text[start:pos], cut_stack))
+    for candidate in candidates:
+        try:
+            obj = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(obj, dict):
+            return obj
+    return None
@@ -0,0 +1,140 @@
+# json_stream.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+from typing import Dict, Iterable, List, Optional, Set
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class StreamingFieldExtractor:
+    """
+    Parser incremental que extrae, mientras llegan los tokens, los valores string
+    de ciertas claves de primer nivel de un objeto JSON (p.ej. "emocion" y "texto").
+
+    No construye el objeto: solo sigue profundidad, strings y escapes, así que cada
+    trozo cuesta O(len(trozo)). El objeto completo se parsea igual al final.
+    """
+
+    def __init__(self, fields: Iterable[str] = ("emocion", "texto")):
+        self.fields: Set[str] = set(fields)
+        self._parts: Dict[str, List[str]] = {}
+        self.completed: Set[str] = set()
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._unicode: Optional[str] = None
+        self._high_surrogate: Optional[int] = None
+        self._expect_key = False
+        self._string_role: Optional[str] = None  # "key", un campo capturado o None
+        self._buffer: list = []
+        self._last_key: Optional[str] = None
+
+    # --- API PÚBLICA ---
+
+    def feed(self, chunk: str) -> bool:
+        """Procesa un trozo de texto. Devuelve True si algún campo capturado cambió."""
+        changed = False
+        for ch in chunk:
+            if self.done:
+                break
+            if self._in_string:
+                changed |= self._string_char(ch)
+            else:
+                self._structural_char(ch)
+        return changed
+
+    def get(self, field: str) -> Optional[str]:
+        """Valor (posiblemente parcial) de un campo."""
+        parts = self._parts.get(field)
+        return None if parts is None else "".join(parts)
+
+    def is_complete(self, field: str) -> bool:
+        return field in self.completed
+
+    # --- MÁQUINA DE ESTADOS ---
+
+    def _structural_char(self, ch: str) -> None:
+        if ch == "{" or ch == "[":
+            self._depth += 1
+            if self._depth == 1:
+                self._expect_key = ch == "{"
+        elif ch == "}" or ch == "]":
+            if self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.done = True
+        elif self._depth == 1:
+            if ch == ",":
+                self._expect_key = True
+            elif ch == ":":
+                self._expect_key = False
+            elif ch == '"':
+                self._start_string()
+        elif ch == '"' and self._depth:
+            self._start_string()
+
+    def _start_string(self) -> None:
+        self._in_string = True
+        self._buffer = []
+        if self._depth != 1:
+            self._string_role = None
+        elif self._expect_key:
+            self._string_role = "key"
+        elif self._last_key in self.fields:
+            self._string_role = self._last_key
+            self._parts[self._last_key] = []
+        else:
+            self._string_role = None
+
+    def _string_char(self, ch: str) -> bool:
+        if self._unicode is not None:
+            self._unicode += ch
+            if len(self._unicode) < 4:
+                return False
+            try:
+                code = int(self._unicode, 16)
+            except ValueError:
+                code = 0xFFFD
+            self._unicode = None
+            if 0xD800 <= code < 0xDC00:
+                self._high_surrogate = code
+                return False
+            if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+                code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+            self._high_surrogate = None
+            return self._append(chr(code))
+        if self._escape:
+            self._escape = False
+            if ch == "u":
+                self._unicode = ""
+                return False
+            return self._append(_ESCAPES.get(ch, ch))
+        if ch == "\\":
+            self._escape = True
+            return False
+        if ch == '"':
+            self._end_string()
+            return False
+        return self._append(ch)
+
+    def _append(self, text: str) -> bool:
+        role = self._string_role
+        if role is None:
+            return False
+        if role == "key":
+            self._buffer.append(text)
+            return False
+        self._parts[role].append(text)
+        return True
+
+    def _end_string(self) -> None:
+        self._in_string = False
+        if self._string_role == "key":
+            self._last_key = "".join(self._buffer)
+        elif self._string_role is not None:
+            self.completed.add(self._string_role)
+        self._string_role = None
+        self._buffer = []
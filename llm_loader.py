@@ -0,0 +1,103 @@
+# llm_loader.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import asyncio
+import atexit
+import importlib
+import logging
+import threading
+import time
+from types import ModuleType
+from typing import Optional
+
+from config import load_environment
+
+# --- IMPORTACIÓN DIFERIDA DE LITELLM ---
+# litellm tarda segundos en importarse (arrastra los SDK de cada proveedor). La interfaz
+# no lo necesita para pintarse: se importa en un hilo mientras el usuario escribe su nombre
+# y la primera llamada a la IA espera a que termine si aún no lo ha hecho.
+
+_module: Optional[ModuleType] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def _import() -> None:
+    global _module
+    started = time.perf_counter()
+    try:
+        load_environment()
+        module = importlib.import_module("litellm")
+    except Exception as e:
+        # get() volverá a intentarlo y propagará el error a quien llame a la IA
+        logging.error(f"No se pudo precargar litellm: {e}")
+        return
+    _module = module
+    logging.info(f"litellm importado en segundo plano en {time.perf_counter() - started:.2f}s")
+
+
+def preload() -> None:
+    """Empieza a importar litellm en un hilo en segundo plano (solo la primera vez)."""
+    global _thread
+    with _lock:
+        if _module is not None or _thread is not None:
+            return
+        _thread = threading.Thread(target=_import, name="novia-litellm-import", daemon=True)
+        _thread.start()
+        atexit.register(_wait_preload)
+
+
+def _wait_preload() -> None:
+    # Cortar el hilo a mitad de la importación (al salir nada más abrir la app) puede
+    # abortar el intérprete dentro de alguna extensión nativa: mejor esperar a que acabe
+    if _thread is not None:
+        _thread.join()
+
+
+def get() -> ModuleType:
+    """Devuelve litellm; si la precarga está en curso, el lock de importación de Python la espera."""
+    global _module
+    if _module is None:
+        load_environment()
+        _module = importlib.import_module("litellm")
+    return _module
+
+
+async def aget() -> ModuleType:
+    """Como get(), pero si hay que esperar la importación se hace fuera del event loop."""
+    if _module is not None:
+        return _module
+    return await asyncio.to_thread(get)
+
+
+def loaded() -> bool:
+    return _module is not None
+
+
+async def ashutdown(timeout: float = 5.0) -> None:
+    """
+    Vacía y para el worker de logging de litellm (callbacks de éxito, costes...) antes de
+    cerrar el event loop. Si se deja para el final, al cancelarlo intenta procesar toda
+    su cola durante el cierre del loop y el proceso tarda en salir.
+    El worker no es API estable de litellm: solo se usan sus métodos públicos flush() y
+    stop(), y si una versión no los tiene se avisa y se deja como esté.
+    """
+    if _module is None:
+        return
+    try:
+        from litellm.litellm_core_utils.logging_worker import GLOBAL_LOGGING_WORKER as worker
+    except ImportError:
+        worker = None
+    flush, stop = getattr(worker, "flush", None), getattr(worker, "stop", None)
+    if not callable(flush) or not callable(stop):
+        logging.info("Esta versión de litellm no tiene el worker de logging esperado: no se vacía al salir")
+        return
+    for step in (flush, stop):
+        try:
+            await asyncio.wait_for(step(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"El worker de logging de litellm no terminó a tiempo ({step.__name__})")
+        except Exception as e:
+            logging.warning(f"No se pudo cerrar el worker de logging de litellm: {e}")
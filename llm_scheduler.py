@@ -0,0 +1,180 @@
+# llm_scheduler.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+import metrics
+from resilience import LatencyTracker
+
+# --- PLANIFICADOR DE LLAMADAS A LA IA ---
+# Todas las llamadas asíncronas al modelo (turnos, resúmenes, precarga) piden antes un
+# hueco a su backend. Cada backend admite un número limitado de llamadas a la vez y los
+# huecos se reparten por prioridad: primero lo que el usuario está esperando. El trabajo
+# lanzado con `run()` se puede expulsar si llega algo más prioritario y no hay hueco:
+# su llamada se cancela, vuelve a la cola y se repite cuando haya sitio.
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # Turno de chat: el usuario está esperando
+    SUMMARY = 1      # Resumen incremental de la sesión
+    BACKGROUND = 2   # Precarga del modelo y demás trabajo que puede esperar
+
+
+class Slot:
+    """Hueco concedido en un backend. `release()` se puede llamar varias veces."""
+
+    def __init__(self, scheduler: "LLMScheduler", backend: str, priority: Priority):
+        self.scheduler = scheduler
+        self.backend = backend
+        self.priority = priority
+        self.started = 0.0
+        self.task: Optional[asyncio.Task] = None  # Solo en los expulsables (run)
+        self.preempted = False
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.scheduler._release(self)
+
+
+class _BackendQueue:
+    def __init__(self):
+        self.running: List[Slot] = []
+        # Montículo de (prioridad, orden de llegada, futuro, hueco)
+        self.waiting: List[Tuple[int, int, asyncio.Future, Slot]] = []
+
+    def queued(self) -> List[Slot]:
+        return [slot for _, _, future, slot in self.waiting if not future.done()]
+
+
+class LLMScheduler:
+    """Límite de llamadas simultáneas por backend con cola por prioridad y expulsión."""
+
+    def __init__(self, limit: Callable[[str], int]):
+        self._limit = limit
+        self._queues: Dict[str, _BackendQueue] = {}
+        self._order = itertools.count()
+        self._waits = {priority: LatencyTracker(window=200, min_samples=1) for priority in Priority}
+
+    def _queue(self, backend: str) -> _BackendQueue:
+        queue = self._queues.get(backend)
+        if queue is None:
+            queue = self._queues[backend] = _BackendQueue()
+        return queue
+
+    async def acquire(self, backend: str, priority: Priority = Priority.INTERACTIVE) -> Slot:
+        """Espera un hueco en `backend`. Hay que devolverlo con `slot.release()`."""
+        queue = self._queue(backend)
+        slot = Slot(self, backend, priority)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.waiting, (int(priority), next(self._order), future, slot))
+        requested = time.monotonic()
+        self._grant(backend)
+        if not future.done():
+            self._preempt_for(backend, priority)
+            try:
+                await future
+            except asyncio.CancelledError:
+                # Concedido justo cuando se cancelaba la espera: devolverlo
+                if future.done() and not future.cancelled():
+                    slot.release()
+                raise
+        waited = time.monotonic() - requested
+        slot.started = time.monotonic()
+        self._waits[priority].record(waited)
+        metrics.inc(f"llm_queue_requests_{priority.name.lower()}_total")
+        metrics.inc(f"llm_queue_wait_seconds_{priority.name.lower()}_total", waited)
+        return slot
+
+    async def run(self, backend: str, priority: Priority, factory: Callable[[], Awaitable[Any]],
+                  preemptable: bool = True) -> Any:
+        """
+        Ejecuta `factory()` con un hueco de `backend`. Si es `preemptable` y una petición
+        más prioritaria se queda sin hueco, la llamada se cancela y se repite más tarde
+        (`factory` se vuelve a llamar, así que debe poder repetirse).
+        """
+        while True:
+            slot = await self.acquire(backend, priority)
+            task = asyncio.ensure_future(factory())
+            if preemptable:
+                slot.task = task
+            try:
+                await asyncio.wait({task})
+            finally:
+                if not task.done():
+                    task.cancel()
+                slot.release()
+            if task.cancelled() and slot.preempted:
+                metrics.inc("llm_requeued_total")
+                continue
+            return task.result()
+
+    def _grant(self, backend: str) -> None:
+        """Reparte los huecos libres a las peticiones en cola, por prioridad y orden de llegada."""
+        queue = self._queue(backend)
+        limit = max(1, self._limit(backend))
+        while queue.waiting and len(queue.running) < limit:
+            _, _, future, slot = heapq.heappop(queue.waiting)
+            if future.done():
+                continue  # Se canceló mientras esperaba
+            queue.running.append(slot)
+            future.set_result(None)
+
+    def _preempt_for(self, backend: str, priority: Priority) -> None:
+        """Expulsa la llamada expulsable menos prioritaria (la más reciente) para dejar sitio."""
+        queue = self._queue(backend)
+        victims = [slot for slot in queue.running
+                   if slot.task is not None and not slot.preempted and slot.priority > priority]
+        if not victims:
+            return
+        victim = max(victims, key=lambda slot: (slot.priority, slot.started))
+        victim.preempted = True
+        victim.task.cancel()
+        metrics.inc("llm_preempted_total")
+        logging.info(f"Llamada de prioridad {victim.priority.name} a {backend} expulsada por una {priority.name}")
+
+    def _release(self, slot: Slot) -> None:
+        queue = self._queue(slot.backend)
+        if slot in queue.running:
+            queue.running.remove(slot)
+        self._grant(slot.backend)
+
+    def stats(self) -> Dict[str, Any]:
+        """Ocupación y cola de cada backend, y espera en cola (p50/p95 en ms) por prioridad."""
+        backends = {}
+        for backend, queue in self._queues.items():
+            queued = queue.queued()
+            backends[backend] = {
+                "limit": max(1, self._limit(backend)),
+                "running": len(queue.running),
+                "queued": {priority.name.lower(): sum(1 for slot in queued if slot.priority == priority)
+                           for priority in Priority},
+            }
+        waits = {}
+        for priority, tracker in self._waits.items():
+            if len(tracker):
+                waits[priority.name.lower()] = {
+                    "p50_ms": round(tracker.percentile(50) * 1000, 3),
+                    "p95_ms": round(tracker.percentile(95) * 1000, 3),
+                }
+        return {"backends": backends, "wait": waits}
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler(Config.get_llm_concurrency)
+    return _scheduler
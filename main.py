@@ -3,47 +3,91 @@
 # Creador: RichyKunBv
 # Licencia: Apache License 2.0
 
+import asyncio
 import logging
-import json
-from collections import deque
-from typing import Optional, Any
+import time
+from typing import Optional
 
 # Importaciones de Textual
 from textual.app import App, ComposeResult
 from textual.widgets import Static, RichLog, Input, Header, Footer, Label
 from textual.containers import Container
 from textual import work
+from textual.timer import Timer
 from textual.worker import WorkerState
 
 # Importaciones del Proyecto (Refactorizado)
 from config import Config, validate_config, setup_logging
-from memory import (
-    load_memory, 
-    save_new_person, 
-    end_session_and_update_memory, 
-    promote_ex_to_novio,
-    update_user_profile,
-    save_interaction
-)
-from brain import get_ai_response, safe_json_parse
-from caras_ascii import CARAS
-
-# Configurar Logging
-setup_logging()
+from memory import flush_all, preload_search_index
+from brain import warm_up_model, get_json_stats
+from chat_session import ChatSession, TurnResult
+from face_panel import FacePanel
+import llm_loader
+import ollama_client
+import tracing
+from rich.table import Table
+
+def configure_runtime() -> None:
+    """Logging y trazas: se hace al arrancar la app, no al importar el módulo."""
+    setup_logging()
+    # Trazas por turno: sin Config.TRACING solo se activan al abrir el panel (y no se exportan)
+    tracing.configure(
+        Config.TRACING,
+        Config.TRACE_FILE if Config.TRACING else None,
+        Config.PROMETHEUS_FILE if Config.TRACING else None,
+    )
 
 class NovIA(App):
     CSS_PATH = "style.tcss"
-    current_user_name: Optional[str] = None
-    conversation_history = deque(maxlen=Config.CONVERSATION_HISTORY_LIMIT)
+    _stream_emotion: Optional[str] = None
+    _prefetch_timer: Optional[Timer] = None
 
     # Botón de pánico
-    BINDINGS = [("ctrl+q", "panic_quit", "Salir Inmediatamente")]
-    
+    BINDINGS = [
+        ("ctrl+q", "panic_quit", "Salir Inmediatamente"),
+        ("ctrl+t", "toggle_perf_panel", "Rendimiento"),
+    ]
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # La lógica de la conversación vive en ChatSession: la TUI solo la muestra
+        self.session = ChatSession()
+
+    @property
+    def current_user_name(self) -> Optional[str]:
+        return self.session.user_name
+
     def action_panic_quit(self) -> None:
         """Acción para cerrar la aplicación inmediatamente al presionar Ctrl+Q."""
         logging.info("Cierre forzado iniciado por el usuario (Ctrl+Q).")
         self.exit() 
 
+    def action_toggle_perf_panel(self) -> None:
+        """Muestra u oculta el panel de rendimiento (p50/p95 por fase de los turnos de la sesión)."""
+        panel = self.query_one("#perf_panel", Static)
+        panel.display = not panel.display
+        if panel.display:
+            # Empezar a medir si las trazas no estaban activadas desde config.py
+            tracing.set_enabled(True)
+            self.refresh_perf_panel()
+
+    def refresh_perf_panel(self) -> None:
+        panel = self.query_one("#perf_panel", Static)
+        if not panel.display:
+            return
+        rows = tracing.summary()
+        if not rows:
+            panel.update("Sin turnos medidos todavía.\nHabla con Miku para ver los tiempos.")
+            return
+        table = Table(title="Rendimiento (ms)", expand=True, box=None)
+        table.add_column("Fase")
+        table.add_column("n", justify="right")
+        table.add_column("p50", justify="right")
+        table.add_column("p95", justify="right")
+        for name, count, p50, p95 in rows:
+            table.add_row(name, str(count), f"{p50:.1f}", f"{p95:.1f}")
+        panel.update(table)
+
     def compose(self) -> ComposeResult:
         """Crea los widgets con la estructura de contenedores correcta."""
         header_name = "NovIA (Offline)" if Config.USE_OLLAMA else "NovIA (Online)"
@@ -51,172 +95,166 @@ class NovIA(App):
         yield Header(name=header_name)
         
         with Container(id="main-container"):
-            yield Static(id="face_panel")
+            yield FacePanel(id="face_panel")
             with Container(id="chat_panel"):
                 yield RichLog(id="chat_log", wrap=True, highlight=True, markup=True)
+                yield Static(id="stream_preview")
                 yield Input(placeholder="Responde a Miku...", id="input_area")
+            yield Static(id="perf_panel")
         
         yield Label(f" v{Config.VERSION}", id="version-label")
         yield Footer()
 
-    def on_unmount(self) -> None:
-        """Se ejecuta al cerrar la app para actualizar la memoria."""
-        end_session_and_update_memory(self.current_user_name, list(self.conversation_history))
+    async def on_unmount(self) -> None:
+        """Se ejecuta al cerrar la app para actualizar la memoria (sin llamar a la IA: el resumen ya está hecho)."""
+        await self.session.close()
+        await llm_loader.ashutdown()
+        await ollama_client.ashutdown()
+        # Esperar a que el hilo de persistencia vacíe su cola sin bloquear el event loop
+        await asyncio.to_thread(flush_all)
+        await asyncio.to_thread(tracing.flush)
+        stats = get_json_stats()
+        if stats["turns"]:
+            logging.info(f"JSON de la IA: {stats['turns']:.0f} turnos, {stats['retries']:.0f} reintentos "
+                         f"({stats['retry_rate']:.1%}), {stats['repaired']:.0f} reparados")
 
     def on_mount(self) -> None:
         """Se ejecuta una vez cuando la app se inicia."""
         self.update_face("base")
+        self.query_one("#stream_preview", Static).display = False
+        self.query_one("#perf_panel", Static).display = False
         self.call_later(self.post_welcome_message)
+        # litellm se importa en segundo plano una vez pintado el primer frame
+        self.call_after_refresh(llm_loader.preload)
 
     def post_welcome_message(self) -> None:
         """Muestra el mensaje de bienvenida inicial."""
         chat_log = self.query_one("#chat_log", RichLog)
         chat_log.write("[bold magenta]Miku:[/bold magenta] ¿Y tú quién eres?")
         chat_log.scroll_end(animate=False)
+        # Mientras el usuario escribe su nombre, cargar el modelo local y su prefijo de prompt
+        # y abrir el índice del historial
+        self.warm_up_worker()
+        preload_search_index()
+
+    @work(exclusive=True, group="warmup", name="warm_up_worker")
+    async def warm_up_worker(self) -> None:
+        """Precarga el modelo de Ollama en segundo plano."""
+        await warm_up_model()
 
     def update_face(self, emotion: str) -> None:
         """Actualiza el panel de la cara ASCII."""
-        face_panel = self.query_one("#face_panel", Static)
-        face_ascii = CARAS.get(emotion, CARAS["default"])
-        face_panel.update(face_ascii)
+        self.query_one("#face_panel", FacePanel).show(emotion)
+
+    def show_partial_response(self, emotion: Optional[str], text: str) -> None:
+        """Muestra el texto parcial de Miku mientras llegan los tokens (streaming)."""
+        if emotion and emotion != self._stream_emotion:
+            self._stream_emotion = emotion
+            self.update_face(emotion)
+        preview = self.query_one("#stream_preview", Static)
+        preview.update(f"[bold magenta]Miku:[/bold magenta] {text}")
+        preview.display = True
+
+    def clear_partial_response(self) -> None:
+        """Oculta el texto parcial una vez que la respuesta completa se escribe en el chat."""
+        self._stream_emotion = None
+        preview = self.query_one("#stream_preview", Static)
+        preview.update("")
+        preview.display = False
 
     def on_worker_state_changed(self, event) -> None:
         """Se activa cuando un worker termina y procesa el resultado."""
         if event.worker.state == WorkerState.SUCCESS and event.worker.name == "get_ai_response_worker":
             self.process_ai_response(event.worker.result)
 
-    def process_ai_response(self, result: Any) -> None:
-        """Procesa la respuesta de la IA."""
+    def process_ai_response(self, result: TurnResult) -> None:
+        """Muestra el resultado del turno."""
         chat_log = self.query_one(RichLog)
+        self.clear_partial_response()
         
-        if isinstance(result, Exception):
+        if result.quit:
+            self.action_panic_quit()
+            return
+        if result.error is not None:
             self.update_face("triste")
-            text = f"Ay, hubo un problema con la API. Error: {result}"
+            text = f"Ay, hubo un problema con la API. Error: {result.error}"
             chat_log.write(f"[bold magenta]Miku:[/bold magenta] {text}")
         else:
-            self.process_successful_response(result, chat_log)
+            # Las respuestas que no son JSON llegan con la cara por defecto y el texto tal cual
+            self.update_face(result.emotion)
+            chat_log.write(f"[bold magenta]Miku:[/bold magenta] {result.text}")
+            for person in result.saved_people:
+                chat_log.write(f"[italic gray]Miku ha guardado a '{person}' en su memoria...[/italic gray]")
         
         chat_log.scroll_end(animate=False)
+        if result.trace:
+            self.refresh_perf_panel()
 
-    def process_successful_response(self, raw_response: str, chat_log: RichLog) -> None:
-        """Procesa una respuesta exitosa de la IA."""
-        data = safe_json_parse(raw_response)
-        if not data:
-            self.handle_fallback_response(raw_response, chat_log)
-            return
+    @work(exclusive=True, name="get_ai_response_worker")
+    async def get_ai_response_worker(self, user_prompt: str) -> TurnResult:
+        """Worker asíncrono (event loop de la app) que pide el turno a la sesión."""
+        if not Config.STREAM_RESPONSES:
+            return await self.session.respond(user_prompt)
         
-        # Verificar si la IA quiere salir
-        if data.get("tool_to_call") == "panic_quit":
-            self.action_panic_quit()
-            return
-
-        self.conversation_history.append({"role": "assistant", "content": raw_response})
+        # Streaming: los refrescos de la interfaz se limitan a Config.STREAM_FPS
+        min_interval = 1.0 / Config.STREAM_FPS
+        last_emotion: Optional[str] = None
+        last_render = 0.0
         
-        # Procesar emoción y texto
-        emotion = data.get("emocion", "base")
-        text = data.get("texto", raw_response)
-        self.update_face(emotion)
-        chat_log.write(f"[bold magenta]Miku:[/bold magenta] {text}")
+        def on_partial(emotion: Optional[str], text: str) -> None:
+            nonlocal last_emotion, last_render
+            now = time.monotonic()
+            # La cara se actualiza en cuanto se conoce la emoción, el texto con throttling
+            if emotion != last_emotion or now - last_render >= min_interval:
+                last_emotion = emotion
+                last_render = now
+                self.show_partial_response(emotion, text)
         
-        # Guardar interacción en memoria persistente (RAG)
-        if self.current_user_name:
-            # Necesitamos el último mensaje del usuario para guardarlo junto con la respuesta
-            last_user_msg = ""
-            for msg in reversed(self.conversation_history):
-                if msg["role"] == "user":
-                    last_user_msg = msg["content"]
-                    break
+        return await self.session.respond(user_prompt, on_partial)
             
-            if last_user_msg:
-                save_interaction(self.current_user_name, last_user_msg, text)
-        
-        # Procesar personas mencionadas
-        self.process_mentioned_people(data.get("personas_mencionadas", []), chat_log)
-        
-        # Procesar nueva memoria estructurada
-        if "nueva_memoria" in data and self.current_user_name:
-            update_user_profile(self.current_user_name, data["nueva_memoria"])
+    def on_input_changed(self, event: Input.Changed) -> None:
+        """Cuando el usuario deja de teclear un momento, la sesión prepara el prompt del borrador."""
+        if self._prefetch_timer is not None:
+            self._prefetch_timer.stop()
+            self._prefetch_timer = None
+        if self.current_user_name is None or not Config.PREFETCH_PROMPT or not event.value.strip():
+            return
+        draft = event.value
+        self._prefetch_timer = self.set_timer(Config.PREFETCH_DEBOUNCE, lambda: self.session.prefetch(draft))
 
-    def handle_fallback_response(self, raw_response: str, chat_log: RichLog) -> None:
-        """Maneja respuestas que no son JSON válido."""
-        self.update_face("base")
-        chat_log.write(f"[bold magenta]Miku:[/bold magenta] {raw_response}")
-        logging.warning(f"Respuesta no JSON recibida: {raw_response[:100]}...")
-
-    def process_mentioned_people(self, personas: list, chat_log: RichLog) -> None:
-        """Procesa la lista de personas mencionadas."""
-        for person in personas:
-            if isinstance(person, str) and person.strip():
-                if save_new_person(person.strip()):
-                    chat_log.write(f"[italic gray]Miku ha guardado a '{person}' en su memoria...[/italic gray]")
-
-    @work(exclusive=True, thread=True, name="get_ai_response_worker")
-    def get_ai_response_worker(self, user_prompt: str) -> str | Exception:
-        """Worker que llama a la función de IA en brain.py."""
-        current_memory = load_memory()
-        
-        # Obtener el resumen de la última conversación si existe
-        last_summary = ""
-        if self.current_user_name:
-            # Buscar en novio
-            if current_memory.get("novio", {}).get("nombre", "").lower() == self.current_user_name.lower():
-                last_summary = current_memory["novio"].get("resumen_conversacion", "")
-            else:
-                # Buscar en exnovios
-                for ex in current_memory.get("exnovios", []):
-                    if ex.get("nombre", "").lower() == self.current_user_name.lower():
-                        last_summary = ex.get("resumen_conversacion", "")
-                        break
-        
-        memory_context = f"El usuario actual se llama {self.current_user_name}. Tu memoria sobre las personas es: {json.dumps(current_memory, ensure_ascii=False)}"
-        
-        # Llamamos a la función pura del cerebro
-        return get_ai_response(user_prompt, list(self.conversation_history), memory_context, last_summary)
-            
     async def on_input_submitted(self, event: Input.Submitted) -> None:
         """Maneja la entrada del usuario."""
         prompt = event.value.strip()
         if not prompt: return
+        if self._prefetch_timer is not None:
+            self._prefetch_timer.stop()
+            self._prefetch_timer = None
 
         chat_log = self.query_one(RichLog)
         chat_log.write(f"[bold green]Tú:[/bold green] {prompt}")
         self.query_one(Input).clear()
 
         if self.current_user_name is None:
-            self.handle_first_interaction(prompt, chat_log)
+            await self.handle_first_interaction(prompt, chat_log)
         else:
             self.handle_normal_conversation(prompt)
         
         chat_log.scroll_end(animate=False)
 
-    def handle_first_interaction(self, user_name_input: str, chat_log: RichLog) -> None:
+    async def handle_first_interaction(self, user_name_input: str, chat_log: RichLog) -> None:
         """Maneja la primera interacción para establecer el nombre del usuario."""
-        current_memory = load_memory()
-        user_name_lower = user_name_input.lower()
-        ex_names = [ex.get("nombre", "").lower() for ex in current_memory.get("exnovios", [])]
-        current_novio_name = current_memory.get("novio", {}).get("nombre", "").lower()
-
-        if user_name_lower in ex_names:
-            promote_ex_to_novio(user_name_input)
-            self.current_user_name = user_name_input
-            chat_log.write(f"[bold magenta]Miku:[/bold magenta] Ah... eres tú, {self.current_user_name}. Supongo que has vuelto.")
-        elif user_name_lower == current_novio_name:
-            self.current_user_name = user_name_input
-            chat_log.write(f"[bold magenta]Miku:[/bold magenta] ¡Mi amor! por fin te veo {self.current_user_name}.")
-        else:
-            self.current_user_name = user_name_input
-            chat_log.write(f"[bold magenta]Miku:[/bold magenta] ¿Así que te llamas {self.current_user_name}? Encantada. Supongo.")
-        
-        self.update_face("base")
+        greeting = await self.session.identify(user_name_input)
+        chat_log.write(f"[bold magenta]Miku:[/bold magenta] {greeting.text}")
+        self.update_face(greeting.emotion)
 
     def handle_normal_conversation(self, prompt: str) -> None:
         """Maneja una conversación normal después de la identificación."""
-        self.conversation_history.append({"role": "user", "content": prompt})
         self.update_face("pensativa")
         self.get_ai_response_worker(prompt)
 
 
 if __name__ == "__main__":
+    configure_runtime()
     if validate_config():
         app = NovIA()
         app.run()
@@ -1,47 +1,291 @@
 # memory.py
-import json
+import asyncio
 import logging
+import threading
 import time
-from typing import Dict, Any, Optional, Tuple, List
-from pathlib import Path
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Callable, Dict, Any, Optional, Tuple, List, TypeVar, Union
 from config import Config
+from history_log import HistoryLog
+from history_segments import SegmentStore, TieredHistory
+from memory_store import MemoryStore, find_person
+from persistence import WriteBehindWriter
+from context_selector import MemoryContextSelector
+from search_index import BM25Index, open_index, document_text
+from text_utils import name_key
+import tracing
 
-# --- CONSTANTES ---
-HISTORY_FILE = Path("historial.json")
+if TYPE_CHECKING:
+    import semantic_index
+    from profile_db import SqliteProfileStore
+
+# Las instancias se abren la primera vez que se usan; con varias sesiones a la vez
+# (server.py) esa primera vez puede llegar desde varios hilos: se abren una sola vez
+_open_lock = threading.RLock()
+
+# --- PERSISTENCIA EN SEGUNDO PLANO ---
+_writer: Optional[WriteBehindWriter] = None
+
+def get_writer() -> Optional[WriteBehindWriter]:
+    """Hilo de escritura write-behind (None si Config.WRITE_BEHIND está desactivado)."""
+    global _writer
+    if _writer is None and Config.WRITE_BEHIND:
+        with _open_lock:
+            if _writer is None and Config.WRITE_BEHIND:
+                _writer = WriteBehindWriter(maxsize=Config.WRITE_QUEUE_SIZE)
+    return _writer
+
+def _submit(key, fn) -> None:
+    """Ejecuta `fn` en el hilo de persistencia (o en el acto si no hay writer)."""
+    writer = get_writer()
+    if writer is None:
+        fn()
+    else:
+        writer.submit(key, fn)
+
+def flush_all() -> None:
+    """
+    Espera a que todo lo pendiente esté en disco: memoria, historial e índices.
+    Llamar al cerrar la app (desde un hilo, no bloquea la interfaz).
+    """
+    if _memory_store is not None:
+        _memory_store.flush()
+    flush_indexes()
+    if _writer is not None:
+        _writer.flush()
+
+def close_all() -> None:
+    """
+    Vacía lo pendiente, cierra el historial y el hilo de persistencia y olvida las
+    instancias abiertas: la siguiente llamada las reabre con la Config actual.
+    """
+    global _writer, _history_log, _search_index, _index_thread, _semantic_index, _memory_store, _context_selector
+    if _index_thread is not None:
+        _index_thread.join()
+    flush_all()
+    if _memory_store is not None:
+        _memory_store.close()
+    if _writer is not None:
+        _writer.close()
+    if _history_log is not None:
+        _history_log.close()
+    _writer = None
+    _history_log = None
+    _search_index = None
+    _index_thread = None
+    _semantic_index = None
+    _memory_store = None
+    _context_selector = None
+
+# --- HISTORIAL EPISÓDICO ---
+_history_log: Optional[TieredHistory] = None
+_search_index: Optional[BM25Index] = None
+_index_lock = threading.Lock()
+_index_thread: Optional[threading.Thread] = None
+_semantic_index: Optional["semantic_index.SemanticIndex"] = None
+
+def get_history_log() -> TieredHistory:
+    """
+    Devuelve el historial: log activo + segmentos archivados (se abre, migra y
+    sella los periodos anteriores la primera vez que se usa).
+    """
+    global _history_log
+    if _history_log is None:
+        with _open_lock:
+            if _history_log is None:
+                hot = HistoryLog(
+                    Config.HISTORY_FILE,
+                    Config.HISTORY_INDEX_FILE,
+                    legacy_path=Config.LEGACY_HISTORY_FILE,
+                    fsync=Config.HISTORY_FSYNC,
+                )
+                segments = SegmentStore(Config.HISTORY_SEGMENTS_DIR, codec=Config.HISTORY_SEGMENT_CODEC,
+                                        cache_size=Config.HISTORY_SEGMENT_CACHE)
+                _history_log = TieredHistory(
+                    hot,
+                    segments,
+                    period=Config.HISTORY_SEGMENT_PERIOD,
+                    max_age_days=Config.HISTORY_RETENTION_DAYS,
+                    max_bytes=Config.HISTORY_RETENTION_MAX_BYTES,
+                    on_sealed=[_reindex_active_log],
+                )
+    return _history_log
+
+def _reindex_active_log() -> None:
+    """
+    El índice BM25 solo cubre el log activo: tras sellar un periodo se rehace (es pequeño).
+    Se llama desde el hilo del sellado; si el índice se está abriendo, espera a que acabe.
+    """
+    with _index_lock:
+        if _search_index is not None:
+            log = get_history_log()
+            _search_index.rebuild(log.iter_entries(log.first_id), base=log.first_id)
+
+def get_search_index() -> BM25Index:
+    """Devuelve el índice BM25 del historial (se carga de disco la primera vez; sin snapshot, se construye)."""
+    global _search_index
+    if _search_index is None:
+        # Lock propio: construirlo puede tardar segundos y no debe bloquear la apertura de lo demás
+        with _index_lock:
+            if _search_index is None:
+                _search_index = open_index(
+                    Config.SEARCH_INDEX_FILE,
+                    get_history_log(),
+                    snapshot_every=Config.SEARCH_INDEX_SNAPSHOT_EVERY,
+                )
+    return _search_index
+
+def preload_search_index() -> None:
+    """
+    Abre el índice BM25 en un hilo al arrancar, mientras el usuario escribe su nombre.
+    Si hay que construirlo (sin snapshot o con un snapshot viejo), el primer turno no lo espera.
+    """
+    global _index_thread
+    with _open_lock:
+        if _search_index is not None or _index_thread is not None or Config.RETRIEVAL_MODE == "semantic":
+            return
+        _index_thread = threading.Thread(target=_open_search_index, name="novia-bm25-open", daemon=True)
+        _index_thread.start()
+
+def _open_search_index() -> None:
+    try:
+        get_search_index()
+    except Exception as e:
+        logging.error(f"Error abriendo el índice BM25: {e}")
+
+def _ready_search_index() -> Optional[BM25Index]:
+    """El índice BM25, o None si aún se está abriendo en segundo plano (la búsqueda no lo espera)."""
+    if _search_index is None and _index_thread is not None and _index_thread.is_alive():
+        return None
+    return get_search_index()
+
+def use_semantic_retrieval() -> bool:
+    """True si está activado el modo semántico y numpy está disponible."""
+    if Config.RETRIEVAL_MODE != "semantic":
+        return False
+    import semantic_index  # importa numpy: solo cuando se usa el modo semántico
+    if not semantic_index.available():
+        logging.warning("RETRIEVAL_MODE='semantic' requiere numpy; se usa BM25.")
+        Config.RETRIEVAL_MODE = "bm25"
+        return False
+    return True
+
+def get_semantic_index() -> "semantic_index.SemanticIndex":
+    """Devuelve la matriz de embeddings del historial (memmap, se pone al día al abrirla)."""
+    global _semantic_index
+    if _semantic_index is None:
+        with _open_lock:
+            if _semantic_index is None:
+                import semantic_index
+                embedder = semantic_index.make_embedder(Config.EMBEDDING_MODEL, dim=Config.EMBEDDING_DIM,
+                                                         api_base=Config.OLLAMA_API_BASE)
+                _semantic_index = semantic_index.open_semantic_index(Config.EMBEDDINGS_FILE, get_history_log(), embedder)
+    return _semantic_index
+
+def flush_indexes() -> None:
+    """Persiste los índices en memoria (en el hilo de persistencia)."""
+    if _search_index is not None:
+        _submit(("index", "bm25"), _search_index.save)
+
+# --- MEMORIA ESTRUCTURADA (PERFILES) ---
+_memory_store: Optional[Union[MemoryStore, "SqliteProfileStore"]] = None
+_context_selector: Optional[MemoryContextSelector] = None
+
+def get_memory_store() -> Union[MemoryStore, "SqliteProfileStore"]:
+    """Devuelve el almacén de perfiles: la caché de memoria.json o la base de datos SQLite."""
+    global _memory_store
+    if _memory_store is None:
+        with _open_lock:
+            if _memory_store is None:
+                if Config.PROFILE_BACKEND == "sqlite":
+                    from profile_db import SqliteProfileStore
+                    _memory_store = SqliteProfileStore(Config.PROFILE_DB_FILE, legacy_json=Config.MEMORY_FILE,
+                                                       timeout=Config.PROFILE_DB_TIMEOUT,
+                                                       profile_max_items=Config.PROFILE_MAX_ITEMS,
+                                                       duplicate_threshold=Config.PROFILE_DUPLICATE_THRESHOLD)
+                else:
+                    _memory_store = MemoryStore(Config.MEMORY_FILE, writer=get_writer(),
+                                                profile_max_items=Config.PROFILE_MAX_ITEMS,
+                                                duplicate_threshold=Config.PROFILE_DUPLICATE_THRESHOLD)
+    return _memory_store
+
+T = TypeVar("T")
+
+async def run_profile_write(fn: Callable[[], T]) -> T:
+    """
+    Ejecuta `fn` (mutaciones de perfiles) sin bloquear el event loop con el disco.
+    Con memoria.json la mutación es en memoria y el archivo ya se escribe en el hilo de
+    persistencia, así que se hace en el acto. Con SQLite cada COMMIT hace fsync del WAL:
+    `fn` va al hilo de persistencia, en orden con el resto de escrituras (o a un hilo
+    cualquiera si Config.WRITE_BEHIND está desactivado).
+    """
+    if isinstance(get_memory_store(), MemoryStore):
+        return fn()
+    writer = get_writer()
+    if writer is None:
+        return await asyncio.to_thread(fn)
+    future: "Future[T]" = Future()
+
+    def job() -> None:
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    writer.submit(None, job)
+    return await asyncio.wrap_future(future)
+
+def memory_transaction():
+    """
+    Context manager que agrupa varias mutaciones de la memoria en una sola escritura.
+    Uso: `with memory_transaction() as memory_data: ...`
+    (con el backend SQLite el documento es de solo lectura: se modifica con las funciones de abajo)
+    """
+    return get_memory_store().transaction()
+
+def select_memory_context(user_name: Optional[str], recent_texts: List[str]) -> Tuple[str, str]:
+    """
+    Devuelve (contexto de memoria para el prompt, último resumen del usuario).
+    Solo incluye el perfil del usuario y de las personas nombradas en `recent_texts`,
+    así el prompt no crece con el número de personas en memoria.json.
+    """
+    global _context_selector
+    if _context_selector is None:
+        _context_selector = MemoryContextSelector(Config.MEMORY_CONTEXT_TOKEN_BUDGET)
+    store = get_memory_store()
+    with tracing.span("memory_context"), store.read():
+        return _context_selector.build(store, user_name, recent_texts)
 
 # --- FUNCIONES DE CARGA/GUARDADO ---
 
 def load_memory() -> Dict[str, Any]:
-    """Carga la memoria estructurada (perfiles) desde el archivo JSON."""
-    try:
-        with Config.MEMORY_FILE.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {"novio": {}, "exnovios": [], "conocidos": []}
+    """Devuelve la memoria estructurada (perfiles) desde la caché; solo lee disco si el archivo cambió."""
+    with tracing.span("load_memory"):
+        return get_memory_store().data()
 
 def save_memory(memory_data: Dict[str, Any]) -> None:
-    """Guarda la memoria estructurada en el archivo JSON."""
-    try:
-        with Config.MEMORY_FILE.open("w", encoding="utf-8") as f:
-            json.dump(memory_data, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        logging.error(f"Error guardando memoria: {e}")
+    """Guarda la memoria estructurada (dentro de una transacción, al cerrarla)."""
+    get_memory_store().replace(memory_data)
 
 def load_history() -> List[Dict[str, Any]]:
     """Carga el historial completo de conversaciones."""
     try:
-        if not HISTORY_FILE.exists():
-            return []
-        with HISTORY_FILE.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
+        return get_history_log().read_all()
+    except OSError as e:
+        logging.error(f"Error leyendo historial: {e}")
         return []
 
 def save_history(history_data: List[Dict[str, Any]]) -> None:
-    """Guarda el historial completo en el archivo JSON."""
+    """Reemplaza el historial completo (solo para mantenimiento; el chat usa save_interaction)."""
+    if _writer is not None:
+        _writer.flush()
     try:
-        with HISTORY_FILE.open("w", encoding="utf-8") as f:
-            json.dump(history_data, f, indent=2, ensure_ascii=False)
+        history_log = get_history_log()
+        history_log.rewrite(history_data)
+        get_search_index().rebuild(history_log.iter_entries(history_log.first_id), base=history_log.first_id)
+        if use_semantic_retrieval():
+            get_semantic_index().reset()
+            get_semantic_index().add_entries(get_history_log().iter_entries())
     except Exception as e:
         logging.error(f"Error guardando historial: {e}")
 
@@ -50,10 +294,8 @@ def save_history(history_data: List[Dict[str, Any]]) -> None:
 def save_interaction(user_name: str, user_text: str, ai_response: str) -> None:
     """
     Guarda una interacción individual en el historial persistente.
-    Esta es la base de la 'Memoria Episódica'.
+    Esta es la base de la 'Memoria Episódica'. Cada turno es un append O(1).
     """
-    history = load_history()
-    
     interaction = {
         "timestamp": time.time(),
         "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
@@ -62,168 +304,97 @@ def save_interaction(user_name: str, user_text: str, ai_response: str) -> None:
         "respuesta_ia": ai_response
     }
     
-    history.append(interaction)
-    save_history(history)
+    # El append, el fsync y la indexación se hacen en el hilo de persistencia
+    with tracing.span("save_interaction"):
+        _submit(None, lambda: _persist_interaction(interaction))
+
+def _persist_interaction(interaction: Dict[str, Any]) -> None:
+    try:
+        get_history_log().append(interaction)
+        text = document_text(interaction)
+        get_search_index().add(interaction["id"], text)
+        if use_semantic_retrieval():
+            get_semantic_index().add_texts(interaction["id"], [text])
+    except Exception as e:
+        logging.error(f"Error guardando interacción: {e}")
 
-def retrieve_relevant_history(query: str, limit: int = 3) -> List[Dict[str, Any]]:
+def retrieve_relevant_history(query: str, limit: int = 3, user_name: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    RAG BÁSICO: Busca interacciones pasadas relevantes basadas en palabras clave.
-    Devuelve una lista de las interacciones más relevantes.
+    RAG: Busca interacciones pasadas relevantes con un índice invertido BM25
+    (log activo + segmentos archivados cuyo filtro de Bloom coincide)
+    o, en modo semántico, por similitud de embeddings.
+    Con `user_name` solo se devuelven interacciones de ese usuario (los índices son
+    comunes, así que se piden RETRIEVAL_USER_OVERSAMPLE veces más candidatos y se filtran).
+    Mientras el índice BM25 se construye en segundo plano solo se busca en los segmentos.
+    Devuelve una lista de las interacciones más relevantes (a igual score, las más recientes).
     """
-    history = load_history()
-    if not history:
-        return []
-
-    query_words = set(query.lower().split())
-    # Filtramos palabras comunes muy cortas para evitar ruido
-    query_words = {w for w in query_words if len(w) > 3}
-    
-    if not query_words:
-        return []
-
-    scored_interactions = []
-    
-    for interaction in history:
-        # Combinamos texto de usuario y respuesta para la búsqueda
-        content = (interaction.get("mensaje_usuario", "") + " " + interaction.get("respuesta_ia", "")).lower()
-        
-        # Puntuación simple: cuántas palabras clave coinciden
-        score = sum(1 for word in query_words if word in content)
-        
-        if score > 0:
-            scored_interactions.append((score, interaction))
-    
-    # Ordenar por puntuación (mayor primero) y tomar los últimos 'limit'
-    # Preferimos coincidencias recientes si tienen el mismo score, por eso el sort es estable
-    scored_interactions.sort(key=lambda x: x[0], reverse=True)
-    
-    return [item[1] for item in scored_interactions[:limit]]
+    with tracing.span("retrieve"):
+        history_log = get_history_log()
+        candidates = limit * Config.RETRIEVAL_USER_OVERSAMPLE if user_name else limit
+        if use_semantic_retrieval():
+            hits = get_semantic_index().search(query, candidates, min_score=Config.SEMANTIC_MIN_SCORE)
+        else:
+            index = _ready_search_index()
+            if index is not None:
+                hits = index.search(query, candidates)
+            else:
+                tracing.set_attr("search_index", "building")
+                hits = []
+            hits += history_log.search_archive(query, candidates, Config.HISTORY_SEGMENTS_SCANNED)
+            hits = sorted(hits, reverse=True)[:candidates]
+        user_key = name_key(user_name) if user_name else None
+        results = []
+        seen = set()
+        for _score, doc_id in hits:
+            # Mientras se sella un periodo, sus entradas están a la vez en el log activo y en un segmento
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            interaction = history_log.get(doc_id)
+            if not interaction:
+                continue
+            if user_key is not None and name_key(str(interaction.get("usuario", ""))) != user_key:
+                continue
+            results.append(interaction)
+            if len(results) == limit:
+                break
+        return results
 
 def find_person_in_memory(name: str, memory_data: Dict[str, Any]) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
-    """Busca una persona en la memoria y devuelve su categoría y datos."""
-    name_lower = name.lower()
-    
-    # Buscar en novio actual
-    if memory_data.get("novio", {}).get("nombre", "").lower() == name_lower:
-        return "novio", memory_data["novio"]
-        
-    # Buscar en exnovios
-    for ex in memory_data.get("exnovios", []):
-        if ex.get("nombre", "").lower() == name_lower:
-            return "exnovios", ex
-            
-    # Buscar en conocidos
-    for conocido in memory_data.get("conocidos", []):
-        if conocido.get("nombre", "").lower() == name_lower:
-            return "conocidos", conocido
-            
-    return None, None
+    """Busca una persona en un documento de memoria y devuelve su categoría y datos."""
+    return find_person(memory_data, name)
+
+def get_person(name: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Busca una persona en el almacén de perfiles (con SQLite, por índice) y devuelve su categoría y datos."""
+    return get_memory_store().find_person(name)
 
 def save_new_person(person_name: str) -> bool:
     """Guarda una persona nueva en 'conocidos' si no existe."""
-    memory_data = load_memory()
-    categoria, _ = find_person_in_memory(person_name, memory_data)
-    
-    if categoria is None:
-        # Estructura básica para nueva persona
-        new_person = {
-            "nombre": person_name,
-            "detalles": [],
-            "perfil": {
-                "gustos": [],
-                "disgustos": [],
-                "hechos": []
-            },
-            "resumen_conversacion": ""
-        }
-        memory_data.setdefault("conocidos", []).append(new_person)
-        save_memory(memory_data)
-        return True
-    return False
+    return get_memory_store().add_person(person_name)
 
 def update_user_profile(user_name: str, new_data: Dict[str, list]) -> None:
     """Actualiza el perfil (gustos, disgustos, hechos) de una persona."""
     if not user_name or not new_data: return
     
-    memory_data = load_memory()
-    categoria, person_data = find_person_in_memory(user_name, memory_data)
-    
-    if person_data:
-        # Asegurar que existe la estructura de perfil
-        if "perfil" not in person_data:
-            person_data["perfil"] = {"gustos": [], "disgustos": [], "hechos": []}
-            
-        # Actualizar campos
-        for field in ["gustos", "disgustos", "hechos"]:
-            if field in new_data and new_data[field]:
-                current_list = person_data["perfil"].setdefault(field, [])
-                # Añadir solo si no existe ya (evitar duplicados exactos)
-                for item in new_data[field]:
-                    if item not in current_list:
-                        current_list.append(item)
-                        logging.info(f"Memoria actualizada para {user_name}: +{field} '{item}'")
-        
-        save_memory(memory_data)
-
-def end_session_and_update_memory(current_user_name: Optional[str], conversation_history: List[Dict] = []) -> None:
-    """
-    Mueve al novio actual a la lista de exnovios al cerrar la sesión 
-    y genera un resumen de la conversación.
+    # Solo se añaden los datos nuevos: los repetidos o casi repetidos suman una mención
+    for field, item in get_memory_store().add_profile_items(user_name, new_data):
+        logging.info(f"Memoria actualizada para {user_name}: +{field} '{item}'")
+
+def get_last_summary(user_name: Optional[str]) -> str:
+    """Devuelve el resumen de conversación guardado para una persona."""
+    if not user_name: return ""
+    return get_memory_store().get_summary(user_name)
+
+def end_session_and_update_memory(current_user_name: Optional[str], summary: str = "", demote: bool = True) -> None:
+    """
+    Guarda el resumen de la conversación ya calculado (no llama a la IA) y, con
+    `demote`, mueve al novio actual a la lista de exnovios al cerrar la sesión.
     """
     if not current_user_name: return
     
-    # Importación local para evitar ciclo circular
-    from brain import generate_summary
-    
-    memory_data = load_memory()
-    novio_actual = memory_data.get("novio")
-    
-    # Generar resumen si hay historial
-    if conversation_history:
-        summary = generate_summary(conversation_history)
-        if summary:
-            # Guardar resumen en el objeto del novio actual
-            if novio_actual and novio_actual.get("nombre", "").lower() == current_user_name.lower():
-                novio_actual["resumen_conversacion"] = summary
-                logging.info(f"Resumen generado para {current_user_name}: {summary}")
-
-    if novio_actual and novio_actual.get("nombre", "").lower() == current_user_name.lower():
-        # Limpiar slot de novio
-        memory_data["novio"] = {}
-        
-        # Verificar si ya existe en exnovios para no duplicar
-        ex_nombres = {ex.get("nombre", "").lower() for ex in memory_data.get("exnovios", [])}
-        
-        # Si ya existe, actualizamos sus datos (incluyendo el nuevo resumen)
-        found_in_ex = False
-        for i, ex in enumerate(memory_data.get("exnovios", [])):
-            if ex.get("nombre", "").lower() == current_user_name.lower():
-                memory_data["exnovios"][i] = novio_actual # Actualizamos con los datos más recientes
-                found_in_ex = True
-                break
-        
-        if not found_in_ex:
-            memory_data.setdefault("exnovios", []).append(novio_actual)
-            
-        save_memory(memory_data)
+    if get_memory_store().end_session(current_user_name, summary, demote) and summary:
+        logging.info(f"Resumen guardado para {current_user_name}: {summary}")
 
 def promote_ex_to_novio(name: str) -> None:
     """Mueve un ex a la posición de novio actual."""
-    memory_data = load_memory()
-    ex_found = None
-    
-    # Buscar y remover de exnovios
-    for i, ex in enumerate(memory_data.get("exnovios", [])):
-        if ex.get("nombre", "").lower() == name.lower():
-            ex_found = memory_data["exnovios"].pop(i)
-            break
-            
-    if ex_found:
-        # Si hay un novio actual, moverlo a exnovios
-        current_novio = memory_data.get("novio")
-        if current_novio and current_novio.get("nombre"):
-            memory_data.setdefault("exnovios", []).append(current_novio)
-            
-        # Promover al ex encontrado
-        memory_data["novio"] = ex_found
-        save_memory(memory_data)
+    get_memory_store().promote_ex(name)
@@ -0,0 +1,317 @@
+# memory_store.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from persistence import atomic_write_text
+from profile_facts import MENTIONS_KEY, consolidate
+from text_utils import name_key
+
+
+PROFILE_FIELDS = ("gustos", "disgustos", "hechos")
+
+
+def empty_memory() -> Dict[str, Any]:
+    """Estructura vacía de memoria.json."""
+    return {"novio": {}, "exnovios": [], "conocidos": []}
+
+
+def new_person(name: str) -> Dict[str, Any]:
+    """Estructura básica de una persona nueva."""
+    return {
+        "nombre": name,
+        "detalles": [],
+        "perfil": {field: [] for field in PROFILE_FIELDS},
+        "resumen_conversacion": "",
+    }
+
+
+def person_names(person: Dict[str, Any]) -> List[str]:
+    """Nombre y alias (si los tiene) con los que se puede mencionar a una persona."""
+    names = [person.get("nombre", "")]
+    aliases = person.get("alias") or []
+    names.extend([aliases] if isinstance(aliases, str) else aliases)
+    return [n for n in names if isinstance(n, str) and n.strip()]
+
+
+def find_person(memory_data: Dict[str, Any], name: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Busca una persona en el documento (novio, exnovios, conocidos) y devuelve su categoría y datos."""
+    key = name_key(name)
+    if name_key(memory_data.get("novio", {}).get("nombre", "")) == key:
+        return "novio", memory_data["novio"]
+    for category in ("exnovios", "conocidos"):
+        for person in memory_data.get(category, []):
+            if name_key(person.get("nombre", "")) == key:
+                return category, person
+    return None, None
+
+
+class MemoryStore:
+    """
+    Caché en proceso de memoria.json.
+
+    Los perfiles se parsean una vez y se validan contra el mtime y el tamaño del
+    archivo (un stat, sin leerlo). Las mutaciones se agrupan en transacciones:
+    solo la transacción más externa escribe, y solo si algo cambió.
+    Con un `writer` (WriteBehindWriter) la escritura se hace en su hilo y las
+    escrituras pendientes del mismo archivo se agrupan en una sola.
+    """
+
+    def __init__(self, path: Path, writer=None, profile_max_items: Optional[int] = None,
+                 duplicate_threshold: float = 0.8):
+        self.path = Path(path)
+        self.writer = writer
+        self.profile_max_items = profile_max_items
+        self.duplicate_threshold = duplicate_threshold
+        self._lock = threading.RLock()
+        self._data: Dict[str, Any] = empty_memory()
+        self._signature: Optional[Tuple[int, int]] = None
+        self._loaded = False
+        self._dirty = False
+        self._depth = 0
+        self._submitted_generation = 0
+        self._written_generation = 0
+        # Sube con cada cambio (propio o externo); sirve para invalidar cachés derivadas
+        self.generation = 0
+
+    # --- DISCO ---
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _load(self) -> None:
+        signature = self._stat()
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = empty_memory()
+        self._data = data
+        self._signature = signature
+        self._loaded = True
+        self.generation += 1
+
+    def _validate(self) -> None:
+        """Recarga si el archivo cambió fuera de este proceso (y no hay cambios pendientes)."""
+        if self._dirty or self._depth or self.write_pending:
+            return
+        if not self._loaded or self._stat() != self._signature:
+            self._load()
+
+    def flush(self) -> None:
+        """Manda a disco los cambios pendientes (en el hilo del writer si lo hay)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._submitted_generation = self.generation
+        if self.writer is not None:
+            self.writer.submit(("memory", str(self.path)), self._write_snapshot)
+        else:
+            self._write_snapshot()
+
+    def _write_snapshot(self) -> None:
+        """Serializa el estado actual y lo escribe de forma atómica."""
+        with self._lock:
+            generation = self.generation
+            text = json.dumps(self._data, indent=2, ensure_ascii=False)
+        try:
+            atomic_write_text(self.path, text)
+        except Exception as e:
+            logging.error(f"Error guardando memoria: {e}")
+            with self._lock:
+                # Se reintentará en el próximo flush
+                self._dirty = True
+                self._written_generation = self._submitted_generation
+            return
+        with self._lock:
+            self._signature = self._stat()
+            self._written_generation = max(self._written_generation, generation)
+
+    def close(self) -> None:
+        """Nada que cerrar: solo manda a disco lo pendiente."""
+        self.flush()
+
+    @property
+    def write_pending(self) -> bool:
+        """True mientras haya cambios entregados al writer que aún no están en disco."""
+        return self._written_generation < self._submitted_generation
+
+    # --- API PÚBLICA ---
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def data(self) -> Dict[str, Any]:
+        """Devuelve los perfiles en memoria (referencia viva: mutar solo dentro de transaction())."""
+        with self._lock:
+            self._validate()
+            return self._data
+
+    def replace(self, data: Dict[str, Any]) -> None:
+        """Sustituye el documento completo (equivale a save_memory)."""
+        with self.transaction():
+            self._data = data
+            self.mark_dirty()
+
+    def mark_dirty(self) -> None:
+        with self._lock:
+            self._dirty = True
+            self.generation += 1
+
+    @contextmanager
+    def transaction(self) -> Iterator[Dict[str, Any]]:
+        """
+        Agrupa lecturas y mutaciones bajo el mismo lock. Las transacciones se pueden
+        anidar; al salir de la más externa se hace como mucho una escritura.
+        Si hay una excepción, los cambios pendientes se descartan (recargando de disco).
+        """
+        with self._lock:
+            self._validate()
+            self._depth += 1
+            try:
+                yield self._data
+            except BaseException:
+                self._depth -= 1
+                if not self._depth and self._dirty:
+                    if self.write_pending:
+                        # Hay cambios confirmados que aún no están en disco: no se puede
+                        # recargar sin perderlos, así que se conservan tal cual
+                        logging.warning("Transacción de memoria abortada con escrituras pendientes; se conservan los cambios")
+                        self.flush()
+                    else:
+                        self._dirty = False
+                        self._load()
+                raise
+            self._depth -= 1
+            if not self._depth:
+                self.flush()
+
+    def read(self):
+        """Agrupa varias lecturas bajo el lock (con SQLite, una transacción de lectura)."""
+        return self.transaction()
+
+    # --- OPERACIONES SOBRE PERSONAS ---
+    # Mismo contrato que SqliteProfileStore (profile_db.py): memory.py solo usa estas.
+
+    def person_names(self) -> List[Tuple[str, List[str]]]:
+        """(nombre, nombre y alias) de cada persona en memoria."""
+        with self.transaction() as memory_data:
+            novio = memory_data.get("novio") or {}
+            people = [novio] if novio.get("nombre") else []
+            for category in ("exnovios", "conocidos"):
+                people.extend(p for p in memory_data.get(category, []) if p.get("nombre"))
+            return [(person["nombre"], person_names(person)) for person in people]
+
+    def novio_name(self) -> Optional[str]:
+        with self.transaction() as memory_data:
+            return (memory_data.get("novio") or {}).get("nombre") or None
+
+    def find_person(self, name: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        with self.transaction() as memory_data:
+            return find_person(memory_data, name)
+
+    def add_person(self, name: str) -> bool:
+        """Añade a `name` a conocidos si no está en la memoria. True si se añadió."""
+        with self.transaction() as memory_data:
+            if find_person(memory_data, name)[0] is not None:
+                return False
+            memory_data.setdefault("conocidos", []).append(new_person(name))
+            self.mark_dirty()
+            return True
+
+    def add_profile_items(self, name: str, new_data: Dict[str, list]) -> List[Tuple[str, Any]]:
+        """
+        Añade gustos/disgustos/hechos sin repetidos ni casi repetidos (profile_facts.py).
+        Devuelve los (campo, dato) añadidos.
+        """
+        added: List[Tuple[str, Any]] = []
+        with self.transaction() as memory_data:
+            _, person = find_person(memory_data, name)
+            if not person:
+                return added
+            perfil = person.setdefault("perfil", {field: [] for field in PROFILE_FIELDS})
+            mentions = person.get(MENTIONS_KEY) or {}
+            changed = False
+            for field in PROFILE_FIELDS:
+                items = new_data.get(field) or []
+                if not items:
+                    continue
+                current = perfil.get(field) or []
+                result = consolidate(field, current, items, mentions.get(field), self.profile_max_items,
+                                     self.duplicate_threshold)
+                if result.items != current or result.counts != mentions.get(field, {}):
+                    changed = True
+                perfil[field] = result.items
+                if result.counts:
+                    mentions[field] = result.counts
+                else:
+                    mentions.pop(field, None)
+                added.extend((field, item) for item in result.added)
+            if changed:
+                if mentions:
+                    person[MENTIONS_KEY] = mentions
+                else:
+                    person.pop(MENTIONS_KEY, None)
+                self.mark_dirty()
+        return added
+
+    def get_summary(self, name: str) -> str:
+        with self.transaction() as memory_data:
+            _, person = find_person(memory_data, name)
+            return (person or {}).get("resumen_conversacion", "")
+
+    def end_session(self, name: str, summary: str = "", demote: bool = True) -> bool:
+        """
+        Guarda el resumen de `name` (sea novio, ex o conocido). Si es el novio actual y
+        `demote`, lo pasa a exnovios (sustituyendo su entrada anterior si ya estaba).
+        True si `name` está en la memoria.
+        """
+        with self.transaction() as memory_data:
+            category, person = find_person(memory_data, name)
+            if person is None:
+                return False
+            if summary and person.get("resumen_conversacion") != summary:
+                person["resumen_conversacion"] = summary
+                self.mark_dirty()
+            if category == "novio" and demote:
+                memory_data["novio"] = {}
+                exnovios = memory_data.setdefault("exnovios", [])
+                for i, ex in enumerate(exnovios):
+                    if name_key(ex.get("nombre", "")) == name_key(name):
+                        exnovios[i] = person  # Datos más recientes
+                        break
+                else:
+                    exnovios.append(person)
+                self.mark_dirty()
+            return True
+
+    def promote_ex(self, name: str) -> bool:
+        """Mueve un ex a novio (el novio actual, si lo hay, pasa a exnovios). True si era un ex."""
+        with self.transaction() as memory_data:
+            exnovios = memory_data.get("exnovios", [])
+            for i, ex in enumerate(exnovios):
+                if name_key(ex.get("nombre", "")) == name_key(name):
+                    ex_found = exnovios.pop(i)
+                    break
+            else:
+                return False
+            current = memory_data.get("novio")
+            if current and current.get("nombre"):
+                memory_data.setdefault("exnovios", []).append(current)
+            memory_data["novio"] = ex_found
+            self.mark_dirty()
+            return True
@@ -0,0 +1,42 @@
+# metrics.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import threading
+from typing import Dict
+
+# --- CONTADORES ---
+# Contadores en proceso, seguros entre hilos (el event loop y el hilo de persistencia).
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+
+
+def inc(name: str, amount: float = 1) -> None:
+    """Incrementa el contador `name`."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def get(name: str) -> float:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> Dict[str, float]:
+    """Copia de todos los contadores."""
+    with _lock:
+        return dict(_counters)
+
+
+def ratio(numerator: str, denominator: str) -> float:
+    """numerator / denominator (0 si el denominador es 0)."""
+    with _lock:
+        total = _counters.get(denominator, 0)
+        return _counters.get(numerator, 0) / total if total else 0.0
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
@@ -0,0 +1,252 @@
+# ollama_client.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import asyncio
+import json
+import logging
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
+
+from config import Config
+import metrics
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# --- CLIENTE NATIVO DE OLLAMA ---
+# Con Ollama en local, litellm no aporta nada y cuesta: importarlo tarda segundos y cada
+# llamada resuelve el proveedor, construye la petición y envuelve cada token en un objeto.
+# Este cliente habla directamente con /api/chat (NDJSON en streaming) y mantiene las
+# conexiones HTTP abiertas entre turnos: después de la primera, cada petición reutiliza un
+# socket ya conectado. La concurrencia la limita el planificador (llm_scheduler.py), así que
+# aquí el pool no tiene tope: solo guarda las conexiones libres para la siguiente.
+# aiohttp se importa con la primera petición: no debe retrasar el primer frame de la interfaz.
+# Cada host cierra las conexiones de su event loop antes de terminarlo con `await ashutdown()`
+# (main.py al desmontar la app, server.py al apagarse, las variantes síncronas de brain.py).
+
+DEFAULT_API_BASE = "http://localhost:11434"
+_HEADERS = {"Content-Type": "application/json"}
+
+# Campos de tiempo del último fragmento (nanosegundos) y de tokens, con el nombre de su métrica
+_DURATIONS = (
+    ("load_duration", "load_seconds"),
+    ("prompt_eval_duration", "prompt_eval_seconds"),
+    ("eval_duration", "eval_seconds"),
+    ("total_duration", "request_seconds"),
+)
+_COUNTS = (("prompt_eval_count", "prompt_tokens"), ("eval_count", "eval_tokens"))
+
+Stats = Dict[str, float]
+OnStats = Optional[Callable[[Stats], None]]
+
+
+class OllamaError(Exception):
+    """Error devuelto por Ollama. Lleva `status_code` como las de litellm, para los reintentos."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Ollama respondió {status_code}: {message}")
+        self.status_code = status_code
+
+
+def model_name(model: str) -> str:
+    """"ollama/phi3.5:3.8b" -> "phi3.5:3.8b" (el prefijo del proveedor es cosa de litellm)."""
+    provider, sep, name = model.partition("/")
+    return name if sep and provider in ("ollama", "ollama_chat") else model
+
+
+def build_request(model: str, messages: List[Dict], stream: bool, format: Any = None,
+                  keep_alive: Optional[str] = None, num_ctx: Optional[int] = None,
+                  options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Cuerpo de /api/chat. `format` es "json" o un esquema JSON (salida estructurada)."""
+    body: Dict[str, Any] = {"model": model_name(model), "messages": messages, "stream": stream}
+    if format is not None:
+        body["format"] = format
+    if keep_alive is not None:
+        body["keep_alive"] = keep_alive
+    options = dict(options or {})
+    if num_ctx:
+        options["num_ctx"] = num_ctx
+    if options:
+        body["options"] = options
+    return body
+
+
+def _error_message(raw: Union[str, bytes]) -> str:
+    try:
+        return str(json.loads(raw).get("error") or raw)
+    except (ValueError, AttributeError):
+        return raw.decode("utf-8", "replace") if isinstance(raw, bytes) else raw
+
+
+def _finish(chunk: Dict[str, Any], on_stats: OnStats) -> Stats:
+    """Tiempos y tokens que informa Ollama al terminar, como métricas (y para quien los pida)."""
+    stats: Stats = {}
+    for field, name in _DURATIONS:
+        if chunk.get(field):
+            stats[name] = chunk[field] / 1e9
+    for field, name in _COUNTS:
+        if chunk.get(field):
+            stats[name] = chunk[field]
+    metrics.inc("ollama_requests_total")
+    for name, value in stats.items():
+        metrics.inc(f"ollama_{name}_total", value)
+    if on_stats is not None:
+        on_stats(stats)
+    return stats
+
+
+def _chunk_text(chunk: Dict[str, Any]) -> str:
+    if "error" in chunk:
+        raise OllamaError(500, str(chunk["error"]))
+    return (chunk.get("message") or {}).get("content") or ""
+
+
+class ChatStream:
+    """Respuesta en streaming: itera los fragmentos de texto. Al acabar, `stats` tiene los tiempos."""
+
+    def __init__(self, response: "aiohttp.ClientResponse", on_stats: OnStats):
+        self._response = response
+        self._lines = response.content.__aiter__()
+        self._on_stats = on_stats
+        self._done = False
+        self.stats: Optional[Stats] = None
+
+    def __aiter__(self) -> "ChatStream":
+        return self
+
+    async def __anext__(self) -> str:
+        try:
+            while not self._done:
+                try:
+                    line = await self._lines.__anext__()
+                except StopAsyncIteration:
+                    raise ConnectionError("Ollama cortó la respuesta antes de terminar")
+                except Exception as e:
+                    import aiohttp
+                    if isinstance(e, aiohttp.ClientError):
+                        raise ConnectionError(f"Se perdió la conexión con Ollama: {e}") from e
+                    raise
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                text = _chunk_text(chunk)
+                if chunk.get("done"):
+                    # Leer el final de la respuesta para que la conexión vuelva al pool
+                    await self._response.content.read()
+                    self._done = True
+                    self._response.release()
+                    self.stats = _finish(chunk, self._on_stats)
+                if text:
+                    return text
+        except BaseException:
+            # Cancelado a mitad (hedging, el usuario se fue...): esta conexión no se reutiliza
+            self.close()
+            raise
+        raise StopAsyncIteration
+
+    def close(self) -> None:
+        if not self._done:
+            self._done = True
+            self._response.close()
+
+
+class OllamaClient:
+    """Cliente asíncrono de /api/chat (aiohttp) con conexiones persistentes."""
+
+    def __init__(self, api_base: Optional[str] = None, keepalive: float = 300):
+        self.api_base = (api_base or DEFAULT_API_BASE).rstrip("/")
+        self.url = f"{self.api_base}/api/chat"
+        self.keepalive = keepalive
+        # La sesión de aiohttp va ligada a su event loop (cada asyncio.run de los benchmarks tiene
+        # el suyo): una por loop, que se cierra con aclose() antes de que termine
+        self._sessions: Dict[asyncio.AbstractEventLoop, "aiohttp.ClientSession"] = {}
+
+    def _http(self) -> "aiohttp.ClientSession":
+        import aiohttp
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            for old in [old for old in self._sessions if old.is_closed()]:
+                logging.warning("Un event loop terminó sin cerrar su sesión con Ollama (falta aclose())")
+                self._sessions.pop(old)
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(_count_connection)
+            session = self._sessions[loop] = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0, keepalive_timeout=self.keepalive),
+                trace_configs=[trace],
+            )
+        return session
+
+    async def _apost(self, body: Dict[str, Any], timeout: float) -> "aiohttp.ClientResponse":
+        import aiohttp
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        for attempt in range(2):
+            try:
+                response = await self._http().post(self.url, data=data, headers=_HEADERS,
+                                                   timeout=aiohttp.ClientTimeout(total=timeout))
+            except aiohttp.ServerDisconnectedError as e:
+                # Conexión del pool que Ollama ya había cerrado: se repite con una nueva
+                if attempt:
+                    raise ConnectionError(f"Ollama cerró la conexión: {e}") from e
+                metrics.inc("ollama_stale_connections_total")
+                continue
+            except aiohttp.ClientConnectionError as e:
+                raise ConnectionError(f"No se pudo conectar con Ollama en {self.api_base}: {e}") from e
+            if response.status != 200:
+                raw = await response.read()
+                response.release()
+                raise OllamaError(response.status, _error_message(raw))
+            return response
+        raise AssertionError("inalcanzable")
+
+    async def achat(self, model: str, messages: List[Dict], timeout: float, stream: bool = False,
+                    on_stats: OnStats = None, **params: Any) -> Union[str, ChatStream]:
+        """
+        Pide una respuesta a /api/chat. Sin `stream` devuelve el texto; con `stream`, un
+        ChatStream que itera los fragmentos. `params` son los de build_request (format,
+        keep_alive, num_ctx, options). `on_stats` recibe los tiempos que informa Ollama.
+        """
+        response = await self._apost(build_request(model, messages, stream, **params), timeout)
+        if stream:
+            return ChatStream(response, on_stats)
+        try:
+            chunk = json.loads(await response.read())
+        finally:
+            response.release()
+        text = _chunk_text(chunk)
+        _finish(chunk, on_stats)
+        return text
+
+    async def aclose(self) -> None:
+        """Cierra la sesión (y sus conexiones) del event loop actual."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+
+async def _count_connection(session, context, params) -> None:
+    metrics.inc("ollama_connections_opened_total")
+
+
+_client: Optional[OllamaClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    """Cliente compartido; se rehace si cambia Config.OLLAMA_API_BASE (p.ej. en los benchmarks)."""
+    global _client
+    api_base = (Config.OLLAMA_API_BASE or DEFAULT_API_BASE).rstrip("/")
+    with _client_lock:
+        if _client is None or _client.api_base != api_base:
+            if _client is not None:
+                logging.info(f"Cliente de Ollama apuntando ahora a {api_base}")
+            _client = OllamaClient(api_base, Config.OLLAMA_CONNECTION_KEEPALIVE)
+        return _client
+
+
+async def ashutdown() -> None:
+    """Cierra las conexiones abiertas con Ollama (al salir, antes de cerrar el event loop)."""
+    if _client is not None:
+        await _client.aclose()
@@ -0,0 +1,131 @@
+# persistence.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import logging
+import os
+import queue
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Hashable, Optional
+
+import metrics
+
+# --- ESCRITURA ATÓMICA ---
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Escribe en un temporal, hace fsync y lo renombra: el archivo nunca queda a medias."""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open("wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    atomic_write_bytes(path, text.encode("utf-8"))
+
+
+# --- HILO DE PERSISTENCIA (WRITE-BEHIND) ---
+
+class WriteBehindWriter:
+    """
+    Hilo de persistencia con cola acotada.
+
+    `submit(key, fn)` agrupa trabajos con la misma clave: si ya hay uno pendiente
+    para ese archivo, se sustituye y solo se ejecuta el último (varias mutaciones
+    de memoria.json = una escritura). `submit(None, fn)` encola un trabajo que no
+    se agrupa (p.ej. un append al historial). Todo se ejecuta en orden FIFO.
+
+    Quien llama a submit() es la interfaz o el event loop del servidor: nunca espera
+    al disco. Si la cola está llena (el disco no da abasto), los trabajos pasan a una
+    lista de desbordamiento, en orden, que el hilo va vaciando en la cola; cada trabajo
+    desbordado suma en `persistence_queue_overflow_total` y se avisa en el log al
+    empezar a desbordar. La lista no tiene tope: los trabajos con clave se siguen
+    agrupando, así que solo crece con los appends al historial.
+    """
+
+    def __init__(self, maxsize: int = 256, name: str = "novia-writer"):
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=maxsize)
+        self._overflow: Deque[Any] = deque()
+        self._pending: Dict[Hashable, Callable[[], None]] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, key: Optional[Hashable], fn: Callable[[], None]) -> None:
+        if self._closed:
+            fn()
+            return
+        with self._lock:
+            if key is None:
+                item: Any = fn
+            else:
+                already_queued = key in self._pending
+                self._pending[key] = fn
+                if already_queued:
+                    return
+                item = ("key", key)
+            # Con trabajos desbordados, los nuevos van detrás de ellos (orden FIFO)
+            if not self._overflow:
+                try:
+                    self._queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    logging.warning("Cola de persistencia llena: el disco va por detrás de las escrituras")
+            self._overflow.append(item)
+        metrics.inc("persistence_queue_overflow_total")
+
+    def _refill(self) -> None:
+        """Pasa a la cola los trabajos desbordados que quepan (desde el hilo de persistencia)."""
+        with self._lock:
+            while self._overflow:
+                try:
+                    self._queue.put_nowait(self._overflow[0])
+                except queue.Full:
+                    return
+                self._overflow.popleft()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if isinstance(item, tuple):
+                    with self._lock:
+                        fn = self._pending.pop(item[1], None)
+                else:
+                    fn = item
+                if fn is not None:
+                    fn()
+            except Exception as e:
+                logging.error(f"Error en el hilo de persistencia: {e}")
+            finally:
+                # Antes de task_done: flush() no debe ver la cola vacía con trabajos desbordados
+                self._refill()
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Bloquea hasta que todo lo encolado esté en disco."""
+        if self._thread is threading.current_thread():
+            return
+        self._queue.join()
+
+    def close(self) -> None:
+        """Vacía la cola y detiene el hilo."""
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
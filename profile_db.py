@@ -0,0 +1,463 @@
+# profile_db.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from memory_store import PROFILE_FIELDS, empty_memory, person_names
+from profile_facts import MENTIONS_KEY, consolidate
+from persistence import atomic_write_text
+from text_utils import name_key
+
+# --- PERFILES EN SQLITE ---
+# Alternativa a memoria.json (Config.PROFILE_BACKEND = "sqlite"). Cada persona es una fila
+# con su nombre normalizado (índice único) y su categoría; gustos, disgustos, hechos y
+# detalles van en una tabla aparte. Buscar o actualizar a alguien es O(log n) y no
+# reescribe el documento. En modo WAL varias instancias de NovIA pueden compartir la
+# base de datos: cada transacción de escritura toma el lock de escritura (BEGIN IMMEDIATE);
+# las de lectura (BEGIN diferido) no esperan a nadie ni hacen esperar a los que escriben.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS people (
+    id         INTEGER PRIMARY KEY,
+    nombre     TEXT NOT NULL,
+    nombre_key TEXT NOT NULL UNIQUE,
+    categoria  TEXT NOT NULL CHECK (categoria IN ('novio', 'exnovios', 'conocidos')),
+    orden      INTEGER NOT NULL,
+    resumen    TEXT NOT NULL DEFAULT '',
+    extra      TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS people_categoria ON people (categoria, orden);
+CREATE UNIQUE INDEX IF NOT EXISTS people_un_novio ON people (categoria) WHERE categoria = 'novio';
+CREATE TABLE IF NOT EXISTS profile_items (
+    id        INTEGER PRIMARY KEY,
+    person_id INTEGER NOT NULL REFERENCES people (id) ON DELETE CASCADE,
+    campo     TEXT NOT NULL,
+    valor     TEXT NOT NULL,
+    UNIQUE (person_id, campo, valor)
+);
+"""
+
+CATEGORIES = ("novio", "exnovios", "conocidos")
+# Campos de la persona que tienen columna o tabla propia; el resto se guarda en `extra`
+_STRUCTURED_KEYS = {"nombre", "perfil", "detalles", "resumen_conversacion"}
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+
+class _LazyDocument(Mapping):
+    """Documento con la forma de memoria.json que solo se construye si alguien lo lee."""
+
+    def __init__(self, load: Callable[[], Dict[str, Any]]):
+        self._load = load
+        self._data: Optional[Dict[str, Any]] = None
+
+    def _doc(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = self._load()
+        return self._data
+
+    def __getitem__(self, key: str) -> Any:
+        return self._doc()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._doc())
+
+    def __len__(self) -> int:
+        return len(self._doc())
+
+
+class SqliteProfileStore:
+    """
+    Perfiles en SQLite con el mismo contrato que MemoryStore.
+
+    `transaction()` abre una transacción de escritura (anidable) y entrega el documento
+    completo en modo lectura, construido solo si se lee y cacheado por `generation`.
+    Las mutaciones se hacen con los métodos de personas, no editando el documento.
+    """
+
+    def __init__(self, path: Path, legacy_json: Optional[Path] = None, timeout: float = 5.0,
+                 profile_max_items: Optional[int] = None, duplicate_threshold: float = 0.8):
+        self.path = Path(path)
+        self.profile_max_items = profile_max_items
+        self.duplicate_threshold = duplicate_threshold
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), timeout=timeout, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._depth = 0
+        self._writing = False
+        self._data_version: Optional[int] = None
+        self._document: Optional[Dict[str, Any]] = None
+        self._document_generation = -1
+        # Sube con cada cambio (propio o de otro proceso); sirve para invalidar cachés derivadas
+        self.generation = 0
+        if legacy_json is not None:
+            self._migrate_once(Path(legacy_json))
+
+    # --- TRANSACCIONES ---
+
+    def _check_external(self) -> None:
+        """Detecta commits de otras conexiones (otra instancia de NovIA) con PRAGMA data_version."""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._data_version is not None and version != self._data_version:
+            self.generation += 1
+        self._data_version = version
+
+    @contextmanager
+    def transaction(self) -> Iterator[Mapping]:
+        """Transacción de escritura anidable: solo la más externa hace BEGIN IMMEDIATE / COMMIT."""
+        with self._transaction(write=True) as document:
+            yield document
+
+    @contextmanager
+    def read(self) -> Iterator[Mapping]:
+        """Transacción de lectura (BEGIN diferido): ve un estado consistente sin tomar el lock de escritura."""
+        with self._transaction(write=False) as document:
+            yield document
+
+    @contextmanager
+    def _transaction(self, write: bool) -> Iterator[Mapping]:
+        with self._lock:
+            if not self._depth:
+                self._conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+                self._writing = write
+                self._check_external()
+            elif write and not self._writing:
+                raise RuntimeError("No se puede escribir dentro de una transacción de lectura de perfiles")
+            self._depth += 1
+            try:
+                yield _LazyDocument(self._materialize)
+            except BaseException:
+                self._depth -= 1
+                if not self._depth:
+                    self._conn.execute("ROLLBACK")
+                    if self._writing:
+                        # Lo que se hubiera cacheado dentro de la transacción ya no vale
+                        self.generation += 1
+                raise
+            self._depth -= 1
+            if not self._depth:
+                self._conn.execute("COMMIT")
+
+    def mark_dirty(self) -> None:
+        self.generation += 1
+
+    def flush(self) -> None:
+        """Cada transacción ya queda en disco al hacer COMMIT."""
+
+    @property
+    def dirty(self) -> bool:
+        return False
+
+    @property
+    def write_pending(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # --- DOCUMENTO COMPLETO ---
+
+    def data(self) -> Mapping:
+        """Documento con la forma de memoria.json (solo lectura)."""
+        with self.read() as document:
+            return dict(document)
+
+    def _materialize(self) -> Dict[str, Any]:
+        if self._document is not None and self._document_generation == self.generation:
+            return self._document
+        items: Dict[int, List[sqlite3.Row]] = {}
+        for row in self._conn.execute("SELECT person_id, campo, valor FROM profile_items ORDER BY id"):
+            items.setdefault(row["person_id"], []).append(row)
+        document = empty_memory()
+        for row in self._conn.execute("SELECT * FROM people ORDER BY categoria, orden"):
+            person = self._build_person(row, items.get(row["id"], []))
+            if row["categoria"] == "novio":
+                document["novio"] = person
+            else:
+                document[row["categoria"]].append(person)
+        self._document = document
+        self._document_generation = self.generation
+        return document
+
+    def replace(self, data: Dict[str, Any]) -> None:
+        """Sustituye todos los perfiles por los del documento (equivale a save_memory)."""
+        with self.transaction():
+            self._conn.execute("DELETE FROM people")
+            self._insert_document(data)
+            self.mark_dirty()
+
+    def export_json(self, path: Path) -> int:
+        """Escribe los perfiles con el formato de memoria.json. Devuelve cuántas personas exportó."""
+        document = self.data()
+        atomic_write_text(Path(path), json.dumps(document, indent=2, ensure_ascii=False))
+        return (1 if document.get("novio") else 0) + len(document["exnovios"]) + len(document["conocidos"])
+
+    # --- MIGRACIÓN DESDE memoria.json ---
+
+    def _migrate_once(self, legacy_json: Path) -> None:
+        with self.transaction():
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from'").fetchone():
+                return
+            if legacy_json.exists():
+                count = self.import_json(legacy_json)
+                logging.info(f"{legacy_json} migrado a {self.path} ({count} personas)")
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_from', ?)", (str(legacy_json),))
+
+    def import_json(self, path: Path) -> int:
+        """Añade los perfiles de un memoria.json. Devuelve cuántas personas nuevas insertó."""
+        with Path(path).open("r", encoding="utf-8") as f:
+            document = json.load(f)
+        with self.transaction():
+            count = self._insert_document(document)
+            self.mark_dirty()
+        return count
+
+    def _insert_document(self, document: Dict[str, Any]) -> int:
+        inserted = 0
+        novio = document.get("novio") or {}
+        groups = [("novio", [novio] if novio.get("nombre") else [])]
+        groups += [(category, document.get(category) or []) for category in ("exnovios", "conocidos")]
+        for category, people in groups:
+            for person in people:
+                name = person.get("nombre")
+                if not isinstance(name, str) or not name.strip():
+                    continue
+                row = self._row(name)
+                if row is None:
+                    extra = {k: v for k, v in person.items() if k not in _STRUCTURED_KEYS}
+                    person_id = self._conn.execute(
+                        "INSERT INTO people (nombre, nombre_key, categoria, orden, resumen, extra) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (name, name_key(name), category, self._next_order(category),
+                         person.get("resumen_conversacion") or "", _encode(extra)),
+                    ).lastrowid
+                    inserted += 1
+                else:
+                    # memoria.json permitía a la misma persona en dos listas: se queda la primera
+                    # (novio > exnovios > conocidos) y se le suman los datos de la otra
+                    logging.warning(f"'{name}' aparece repetido en la memoria; se fusionan sus datos")
+                    person_id = row["id"]
+                perfil = person.get("perfil") or {}
+                for field in PROFILE_FIELDS:
+                    self._insert_items(person_id, field, perfil.get(field) or [])
+                self._insert_items(person_id, "detalles", person.get("detalles") or [])
+        return inserted
+
+    # --- OPERACIONES SOBRE PERSONAS ---
+
+    def _row(self, name: str) -> Optional[sqlite3.Row]:
+        return self._conn.execute("SELECT * FROM people WHERE nombre_key = ?", (name_key(name),)).fetchone()
+
+    def _next_order(self, category: str) -> int:
+        row = self._conn.execute("SELECT MAX(orden) FROM people WHERE categoria = ?", (category,)).fetchone()
+        return (row[0] or 0) + 1
+
+    def _insert_items(self, person_id: int, field: str, items: List[Any]) -> List[Any]:
+        added = []
+        for item in items:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO profile_items (person_id, campo, valor) VALUES (?, ?, ?)",
+                (person_id, field, _encode(item)),
+            )
+            if cursor.rowcount:
+                added.append(item)
+        return added
+
+    def _build_person(self, row: sqlite3.Row, items: List[sqlite3.Row]) -> Dict[str, Any]:
+        perfil: Dict[str, List[Any]] = {field: [] for field in PROFILE_FIELDS}
+        detalles: List[Any] = []
+        for item in items:
+            value = json.loads(item["valor"])
+            if item["campo"] == "detalles":
+                detalles.append(value)
+            else:
+                perfil.setdefault(item["campo"], []).append(value)
+        return {
+            "nombre": row["nombre"],
+            "detalles": detalles,
+            "perfil": perfil,
+            "resumen_conversacion": row["resumen"],
+            **json.loads(row["extra"]),
+        }
+
+    def person_names(self) -> List[Tuple[str, List[str]]]:
+        """(nombre, nombre y alias) de cada persona, sin leer sus perfiles."""
+        with self.read():
+            rows = self._conn.execute(
+                "SELECT nombre, CASE json_type(extra, '$.alias') "
+                "WHEN 'array' THEN json_extract(extra, '$.alias') "
+                "WHEN 'text' THEN json_array(json_extract(extra, '$.alias')) END FROM people"
+            ).fetchall()
+        return [(nombre, person_names({"nombre": nombre, "alias": json.loads(alias)}) if alias else [nombre])
+                for nombre, alias in rows]
+
+    def novio_name(self) -> Optional[str]:
+        with self.read():
+            row = self._conn.execute("SELECT nombre FROM people WHERE categoria = 'novio'").fetchone()
+            return row["nombre"] if row is not None else None
+
+    def find_person(self, name: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        with self.read():
+            row = self._row(name)
+            if row is None:
+                return None, None
+            items = self._conn.execute(
+                "SELECT campo, valor FROM profile_items WHERE person_id = ? ORDER BY id", (row["id"],)
+            ).fetchall()
+            return row["categoria"], self._build_person(row, items)
+
+    def add_person(self, name: str) -> bool:
+        """Añade a `name` a conocidos si no está en la memoria. True si se añadió."""
+        with self.transaction():
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO people (nombre, nombre_key, categoria, orden) VALUES (?, ?, 'conocidos', ?)",
+                (name, name_key(name), self._next_order("conocidos")),
+            )
+            if not cursor.rowcount:
+                return False
+            self.mark_dirty()
+            return True
+
+    def add_profile_items(self, name: str, new_data: Dict[str, list]) -> List[Tuple[str, Any]]:
+        """
+        Añade gustos/disgustos/hechos sin repetidos ni casi repetidos (profile_facts.py).
+        Devuelve los (campo, dato) añadidos.
+        """
+        added: List[Tuple[str, Any]] = []
+        with self.transaction():
+            row = self._row(name)
+            if row is None:
+                return added
+            extra = json.loads(row["extra"])
+            mentions = extra.get(MENTIONS_KEY) or {}
+            changed = False
+            for field in PROFILE_FIELDS:
+                items = new_data.get(field) or []
+                if not items:
+                    continue
+                current = [json.loads(r["valor"]) for r in self._conn.execute(
+                    "SELECT valor FROM profile_items WHERE person_id = ? AND campo = ? ORDER BY id", (row["id"], field))]
+                result = consolidate(field, current, items, mentions.get(field), self.profile_max_items,
+                                     self.duplicate_threshold)
+                if result.items != current:
+                    changed = True
+                    if result.items[:len(current)] == current:
+                        self._insert_items(row["id"], field, result.items[len(current):])
+                    else:
+                        # El orden de inserción es la recencia: se reescribe el campo entero (son pocos datos)
+                        self._conn.execute("DELETE FROM profile_items WHERE person_id = ? AND campo = ?",
+                                           (row["id"], field))
+                        self._insert_items(row["id"], field, result.items)
+                if result.counts != mentions.get(field, {}):
+                    changed = True
+                if result.counts:
+                    mentions[field] = result.counts
+                else:
+                    mentions.pop(field, None)
+                added.extend((field, item) for item in result.added)
+            if changed:
+                if mentions:
+                    extra[MENTIONS_KEY] = mentions
+                else:
+                    extra.pop(MENTIONS_KEY, None)
+                self._conn.execute("UPDATE people SET extra = ? WHERE id = ?", (_encode(extra), row["id"]))
+                self.mark_dirty()
+        return added
+
+    def get_summary(self, name: str) -> str:
+        with self.read():
+            row = self._row(name)
+            return row["resumen"] if row is not None else ""
+
+    def end_session(self, name: str, summary: str = "", demote: bool = True) -> bool:
+        """
+        Guarda el resumen de `name` (sea novio, ex o conocido). Si es el novio actual y
+        `demote`, lo pasa a exnovios. True si `name` está en la memoria.
+        """
+        with self.transaction():
+            row = self._row(name)
+            if row is None:
+                return False
+            if row["categoria"] == "novio" and demote:
+                self._conn.execute(
+                    "UPDATE people SET categoria = 'exnovios', orden = ?, resumen = ? WHERE id = ?",
+                    (self._next_order("exnovios"), summary or row["resumen"], row["id"]),
+                )
+            elif summary and summary != row["resumen"]:
+                self._conn.execute("UPDATE people SET resumen = ? WHERE id = ?", (summary, row["id"]))
+            else:
+                return True
+            self.mark_dirty()
+            return True
+
+    def promote_ex(self, name: str) -> bool:
+        """Mueve un ex a novio (el novio actual, si lo hay, pasa a exnovios). True si era un ex."""
+        with self.transaction():
+            row = self._row(name)
+            if row is None or row["categoria"] != "exnovios":
+                return False
+            self._conn.execute(
+                "UPDATE people SET categoria = 'exnovios', orden = ? WHERE categoria = 'novio'",
+                (self._next_order("exnovios"),),
+            )
+            self._conn.execute("UPDATE people SET categoria = 'novio', orden = 0 WHERE id = ?", (row["id"],))
+            self.mark_dirty()
+            return True
+
+
+# --- LÍNEA DE COMANDOS ---
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Perfiles de NovIA en SQLite")
+    parser.add_argument("--db", type=Path, default=Config.PROFILE_DB_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="importa un memoria.json a la base de datos")
+    migrate.add_argument("source", type=Path, nargs="?", default=Config.MEMORY_FILE)
+    migrate.add_argument("--replace", action="store_true", help="borra antes los perfiles de la base de datos")
+    export = sub.add_parser("export", help="exporta los perfiles con el formato de memoria.json")
+    export.add_argument("target", type=Path)
+    args = parser.parse_args(argv)
+
+    store = SqliteProfileStore(args.db, timeout=Config.PROFILE_DB_TIMEOUT)
+    try:
+        if args.command == "migrate":
+            if args.replace:
+                with args.source.open("r", encoding="utf-8") as f:
+                    store.replace(json.load(f))
+                print(f"{args.db}: perfiles sustituidos por los de {args.source}")
+            else:
+                print(f"{args.db}: {store.import_json(args.source)} personas nuevas desde {args.source}")
+        else:
+            print(f"{args.target}: {store.export_json(args.target)} personas exportadas")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+# profile_facts.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+"""
+Consolidación de los datos del perfil (gustos, disgustos, hechos).
+
+La IA repite lo mismo con otras palabras ("Le gusta Linux", "Linux", "Ama Linux") y
+sin esto las listas crecen sin límite y todo entra en el prompt. Cada dato se
+normaliza (sin tildes, palabras vacías ni verbos de relleno). Los que quedan iguales
+se detectan con un set de claves; los casi iguales, con firmas MinHash de sus
+trigramas repartidas en bandas (LSH): un dato nuevo solo se compara con los que
+comparten alguna banda, no con toda la lista. Un dato repetido no se añade: suma una
+mención y pasa a ser el más reciente. Cada campo guarda como mucho `max_items`, los
+mejores por menciones y recencia.
+
+    python profile_facts.py                     # compacta memoria.json (deja memoria.json.bak)
+    python profile_facts.py --db perfiles.db    # compacta la base de datos SQLite
+    python profile_facts.py --dry-run --max-items 15
+"""
+
+import argparse
+import json
+import math
+import re
+import shutil
+import sys
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from context_selector import render_person
+from text_utils import SPANISH_STOPWORDS, fold_accents
+from tokens import estimate_tokens
+
+# Menciones de cada dato repetido, por campo y clave normalizada: {"gustos": {"linux": 3}}.
+# Solo se guardan los que tienen más de una.
+MENTIONS_KEY = "perfil_menciones"
+
+# Verbos y muletillas con que la IA envuelve el dato ("Le gusta Linux", "Odia madrugar")
+_FILLER = frozenset("""
+gusta gustan gustaba gustaban encanta encantan encantaba fascina fascinan interesa interesan apasiona
+apasionan ama adora disfruta prefiere odia odian detesta soporta molesta molestan aburre aburren fan
+""".split())
+_NEGATIONS = frozenset({"no", "nunca", "jamas", "ni", "sin", "nada"})
+# En gustos y disgustos la polaridad la da el campo; en los hechos "no" cambia el dato
+_NEGATION_FIELDS = frozenset({"hechos"})
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+NUM_HASHES = 32
+BANDS = 8  # 8 bandas de 4: con similitud 0.8 se encuentra como candidato ~98 de cada 100 veces
+_ROWS = NUM_HASHES // BANDS
+
+
+def normalize_fact(item: Any, keep_negation: bool = False) -> Tuple[str, Tuple]:
+    """
+    Devuelve (clave, guarda) de un dato. La clave son sus palabras con contenido, sin
+    orden ni repeticiones. Dos datos solo pueden ser casi iguales si tienen la misma
+    guarda (negación y números): "tiene 2 gatos" no se fusiona con "tiene 3 gatos".
+    """
+    words = _WORD_RE.findall(fold_accents(str(item)))
+    negated = keep_negation and any(w in _NEGATIONS for w in words)
+    content = sorted({w for w in words
+                      if w not in SPANISH_STOPWORDS and w not in _FILLER and w not in _NEGATIONS
+                      and (len(w) >= 3 or w.isdigit())})
+    if not content:
+        content = sorted(set(words))
+    key = ("no " if negated else "") + " ".join(content)
+    return key, (negated, tuple(w for w in content if w.isdigit()))
+
+
+def _shingles(key: str) -> Set[str]:
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(max(1, len(padded) - 2))}
+
+
+def _minhash(shingles: Set[str]) -> List[int]:
+    # Doble hashing (h1 + i*h2): NUM_HASHES funciones a partir de dos crc32 por trigrama
+    pairs = []
+    for shingle in shingles:
+        data = shingle.encode("utf-8")
+        pairs.append((zlib.crc32(data), zlib.crc32(data, 0x9E3779B9) | 1))
+    return [min((h1 + i * h2) & 0xFFFFFFFF for h1, h2 in pairs) for i in range(NUM_HASHES)]
+
+
+class FactIndex:
+    """Índice de los datos de un campo: claves exactas y bandas LSH de sus firmas MinHash."""
+
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+        self._exact: Dict[Tuple, int] = {}
+        self._buckets: Dict[Tuple, List[int]] = {}
+        self._entries: Dict[int, Tuple[Tuple, Set[str], List[Tuple]]] = {}
+
+    def find(self, key: str, guard: Tuple) -> Optional[int]:
+        """Id del dato igual o casi igual a `key` (None si es nuevo)."""
+        fact_id = self._exact.get((guard, key))
+        if fact_id is not None:
+            return fact_id
+        shingles = _shingles(key)
+        best, best_score = None, self.threshold
+        seen: Set[int] = set()
+        for band in self._bands(guard, _minhash(shingles)):
+            for candidate in self._buckets.get(band, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                other = self._entries[candidate][1]
+                score = len(shingles & other) / len(shingles | other)
+                if score >= best_score:
+                    best, best_score = candidate, score
+        return best
+
+    def add(self, fact_id: int, key: str, guard: Tuple) -> None:
+        shingles = _shingles(key)
+        bands = self._bands(guard, _minhash(shingles))
+        self._exact[(guard, key)] = fact_id
+        for band in bands:
+            self._buckets.setdefault(band, []).append(fact_id)
+        self._entries[fact_id] = ((guard, key), shingles, bands)
+
+    def remove(self, fact_id: int) -> None:
+        exact, _, bands = self._entries.pop(fact_id)
+        if self._exact.get(exact) == fact_id:
+            del self._exact[exact]
+        for band in bands:
+            bucket = self._buckets[band]
+            bucket.remove(fact_id)
+            if not bucket:
+                del self._buckets[band]
+
+    @staticmethod
+    def _bands(guard: Tuple, signature: List[int]) -> List[Tuple]:
+        return [(guard, band, tuple(signature[band * _ROWS:(band + 1) * _ROWS])) for band in range(BANDS)]
+
+
+@dataclass
+class _Fact:
+    item: Any
+    key: str
+    guard: Tuple
+    count: int
+
+
+@dataclass
+class Consolidated:
+    """Resultado de consolidar un campo."""
+    items: List[Any]                                  # Del más antiguo al más reciente
+    counts: Dict[str, int]                            # Menciones (> 1) por clave normalizada
+    added: List[Any] = field(default_factory=list)    # Datos nuevos de verdad
+    merged: int = 0                                   # Repetidos fusionados con otro dato
+    dropped: List[Any] = field(default_factory=list)  # Quitados por el límite del campo
+
+
+def consolidate(field_name: str, items: Iterable[Any], new_items: Iterable[Any] = (),
+                counts: Optional[Dict[str, int]] = None, max_items: Optional[int] = None,
+                threshold: float = 0.8) -> Consolidated:
+    """
+    Añade `new_items` a los datos `items` del campo `field_name` sin casi-duplicados (los
+    que ya hubiera repetidos en `items` también se fusionan) y lo recorta a `max_items`.
+    De dos datos repetidos queda la redacción más corta y la posición del más reciente.
+    """
+    if isinstance(new_items, str):
+        new_items = [new_items]
+    keep_negation = field_name in _NEGATION_FIELDS
+    counts = counts or {}
+    index = FactIndex(threshold)
+    facts: Dict[int, _Fact] = {}  # En orden de recencia: el último es el más reciente
+    touched: Set[int] = set()
+    result = Consolidated(items=[], counts={})
+
+    def put(fact_id: int, item: Any, is_new: bool) -> None:
+        key, guard = normalize_fact(item, keep_negation)
+        if not key:
+            return
+        mentions = 1 if is_new else counts.get(key, 1)
+        existing = index.find(key, guard)
+        if existing is None:
+            facts[fact_id] = _Fact(item, key, guard, mentions)
+            index.add(fact_id, key, guard)
+            if is_new:
+                result.added.append(item)
+                touched.add(fact_id)
+            return
+        fact = facts.pop(existing)
+        fact.count += mentions
+        result.merged += 1
+        if len(str(item)) < len(str(fact.item)):
+            # Redacción más corta: menos tokens en el prompt
+            index.remove(existing)
+            fact.item, fact.key, fact.guard = item, key, guard
+            index.add(existing, key, guard)
+        facts[existing] = fact  # Pasa a ser el más reciente
+        if is_new:
+            touched.add(existing)
+
+    next_id = 0
+    for item in items:
+        put(next_id, item, False)
+        next_id += 1
+    for item in new_items:
+        put(next_id, item, True)
+        next_id += 1
+
+    ordered = list(facts.items())
+    if max_items is not None and len(ordered) > max_items:
+        ordered, dropped = _top_k(ordered, max(1, max_items), touched)
+        result.dropped = [fact.item for _, fact in dropped]
+    result.items = [fact.item for _, fact in ordered]
+    result.counts = {fact.key: fact.count for _, fact in ordered if fact.count > 1}
+    return result
+
+
+def _top_k(ordered: List[Tuple[int, _Fact]], max_items: int,
+           keep: Set[int]) -> Tuple[List[Tuple[int, _Fact]], List[Tuple[int, _Fact]]]:
+    """
+    Los `max_items` mejores (los de `keep`, recién mencionados, siempre entran). Puntuación:
+    log2(1 + menciones) + recencia (de 0, el más antiguo, a 1, el más reciente); así un
+    dato mencionado tres veces aguanta tanto como uno nuevo.
+    """
+    newest = max(1, len(ordered) - 1)
+    scores = {fact_id: (fact_id in keep, math.log2(1 + fact.count) + position / newest, position)
+              for position, (fact_id, fact) in enumerate(ordered)}
+    best = set(sorted(scores, key=scores.get, reverse=True)[:max_items])
+    return ([entry for entry in ordered if entry[0] in best],
+            [entry for entry in ordered if entry[0] not in best])
+
+
+# --- COMPACTACIÓN DE UN DOCUMENTO ---
+
+def _iter_people(document: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    novio = document.get("novio") or {}
+    if novio.get("nombre"):
+        yield novio
+    for category in ("exnovios", "conocidos"):
+        yield from document.get(category) or []
+
+
+def compact_person(person: Dict[str, Any], fields: Iterable[str], max_items: Optional[int],
+                   threshold: float = 0.8) -> Tuple[int, int]:
+    """Consolida los campos del perfil de una persona. Devuelve (datos antes, datos después)."""
+    perfil = person.get("perfil") or {}
+    mentions = person.get(MENTIONS_KEY) or {}
+    before = after = 0
+    for field_name in fields:
+        items = perfil.get(field_name) or []
+        before += len(items)
+        if not items:
+            continue
+        result = consolidate(field_name, items, (), mentions.get(field_name), max_items, threshold)
+        perfil[field_name] = result.items
+        after += len(result.items)
+        if result.counts:
+            mentions[field_name] = result.counts
+        else:
+            mentions.pop(field_name, None)
+    if mentions:
+        person[MENTIONS_KEY] = mentions
+    else:
+        person.pop(MENTIONS_KEY, None)
+    return before, after
+
+
+def compact_document(document: Dict[str, Any], fields: Iterable[str], max_items: Optional[int],
+                     threshold: float = 0.8) -> Dict[str, int]:
+    """Consolida todos los perfiles de un documento con la forma de memoria.json (lo modifica)."""
+    fields = tuple(fields)
+    stats = {"people": 0, "items_before": 0, "items_after": 0, "tokens_before": 0, "tokens_after": 0}
+    for person in _iter_people(document):
+        stats["people"] += 1
+        stats["tokens_before"] += estimate_tokens(render_person("", person))
+        before, after = compact_person(person, fields, max_items, threshold)
+        stats["items_before"] += before
+        stats["items_after"] += after
+        stats["tokens_after"] += estimate_tokens(render_person("", person))
+    return stats
+
+
+# --- LÍNEA DE COMANDOS ---
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from config import Config
+    from memory_store import PROFILE_FIELDS
+    from persistence import atomic_write_text
+
+    parser = argparse.ArgumentParser(description="Fusiona los datos repetidos de los perfiles y limita su tamaño")
+    parser.add_argument("memory", type=Path, nargs="?", default=Config.MEMORY_FILE, help="memoria.json a compactar")
+    parser.add_argument("--db", type=Path, default=None, help="compactar esta base de datos SQLite en su lugar")
+    parser.add_argument("--max-items", type=int, default=Config.PROFILE_MAX_ITEMS, help="datos por campo como mucho")
+    parser.add_argument("--threshold", type=float, default=Config.PROFILE_DUPLICATE_THRESHOLD,
+                        help="similitud a partir de la cual dos datos son el mismo (0-1)")
+    parser.add_argument("--dry-run", action="store_true", help="solo mostrar lo que se ganaría")
+    args = parser.parse_args(argv)
+
+    store = None
+    if args.db is not None:
+        from profile_db import SqliteProfileStore
+        store = SqliteProfileStore(args.db, timeout=Config.PROFILE_DB_TIMEOUT)
+        # Copia editable del documento (el de la base de datos es de solo lectura)
+        document = json.loads(json.dumps(store.data(), ensure_ascii=False))
+        source = args.db
+    else:
+        try:
+            with args.memory.open("r", encoding="utf-8") as f:
+                document = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            parser.error(f"No se pudo leer {args.memory}: {e}")
+        source = args.memory
+
+    try:
+        stats = compact_document(document, PROFILE_FIELDS, args.max_items, args.threshold)
+        print(f"{source}: {stats['people']} personas, datos {stats['items_before']} -> {stats['items_after']}, "
+              f"tokens de perfil ~{stats['tokens_before']} -> ~{stats['tokens_after']}")
+        if args.dry_run:
+            return 0
+        if store is not None:
+            store.replace(document)
+        else:
+            backup = args.memory.with_name(args.memory.name + ".bak")
+            shutil.copyfile(args.memory, backup)
+            atomic_write_text(args.memory, json.dumps(document, indent=2, ensure_ascii=False))
+            print(f"Copia del original en {backup}")
+    finally:
+        if store is not None:
+            store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
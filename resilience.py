@@ -0,0 +1,187 @@
+# resilience.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+import metrics
+
+# Códigos HTTP que merecen reintento (límite de peticiones, errores del servidor, timeouts)
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+# Excepciones de litellm sin status_code fiable, reconocidas por nombre para no importarlo aquí
+_RETRYABLE_NAMES = {"Timeout", "APIConnectionError", "RateLimitError", "ServiceUnavailableError",
+                    "InternalServerError", "BadGatewayError"}
+
+
+class CircuitOpenError(Exception):
+    """Todos los backends tienen el circuito abierto: se falla rápido en lugar de esperar timeouts."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True para errores transitorios (429, 5xx, timeouts, conexión)."""
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int) and status in RETRYABLE_STATUS:
+        return True
+    return type(exc).__name__ in _RETRYABLE_NAMES
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Backoff exponencial con jitter completo: uniforme en [0, min(cap, base * 2^intento)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# --- PRESUPUESTO DEL TURNO ---
+
+class TurnBudget:
+    """Tiempo total de un turno: cada intento recibe como mucho lo que queda."""
+
+    def __init__(self, total: float):
+        self.started = time.monotonic()
+        self.deadline = self.started + total
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def attempt_timeout(self, per_attempt: float) -> float:
+        return min(per_attempt, self.remaining())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+# --- CIRCUIT BREAKER ---
+
+class CircuitBreaker:
+    """
+    Tras `failure_threshold` fallos seguidos el backend se da por caído durante
+    `reset_timeout` segundos. Pasado ese tiempo se deja pasar una prueba
+    (semiabierto): si sale bien se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def available(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logging.info(f"Circuito de {self.name} cerrado de nuevo")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logging.warning(f"Circuito de {self.name} abierto ({self.failures} fallos seguidos)")
+                metrics.inc("llm_circuit_opened_total")
+            self.opened_at = time.monotonic()
+
+
+# --- LATENCIAS ---
+
+class LatencyTracker:
+    """Ventana de las últimas latencias (p.ej. hasta el primer token) para estimar percentiles."""
+
+    def __init__(self, window: int = 50, min_samples: int = 5):
+        self._samples: deque = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float, default: Optional[float] = None) -> Optional[float]:
+        """Percentil q (0-100) por rango más cercano; `default` si aún hay pocas muestras."""
+        if len(self._samples) < self.min_samples:
+            return default
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+_breakers: Dict[Hashable, CircuitBreaker] = {}
+_latencies: Dict[Hashable, LatencyTracker] = {}
+
+
+def get_breaker(backend: str, failure_threshold: int = 3, reset_timeout: float = 30.0) -> CircuitBreaker:
+    breaker = _breakers.get(backend)
+    if breaker is None:
+        breaker = _breakers[backend] = CircuitBreaker(backend, failure_threshold, reset_timeout)
+    return breaker
+
+
+def get_latency(key: Hashable) -> LatencyTracker:
+    tracker = _latencies.get(key)
+    if tracker is None:
+        tracker = _latencies[key] = LatencyTracker()
+    return tracker
+
+
+# --- PETICIONES CUBIERTAS (HEDGING) ---
+
+async def hedged(starters: List[Callable[[], Awaitable[Any]]], hedge_delay: Optional[float]) -> Any:
+    """
+    Lanza starters[0]; si no termina en `hedge_delay` segundos (o falla) lanza el
+    siguiente, y así sucesivamente. Devuelve el primer resultado correcto y cancela
+    el resto. Con `hedge_delay=None` solo se pasa al siguiente cuando el anterior
+    falla (fallback puro). Si todos fallan, relanza el último error.
+    """
+    tasks: List[asyncio.Future] = []
+    error: Optional[BaseException] = None
+
+    def launch() -> None:
+        if tasks:
+            metrics.inc("llm_hedged_total")
+        tasks.append(asyncio.ensure_future(starters[len(tasks)]()))
+
+    launch()
+    try:
+        while True:
+            running = {t for t in tasks if not t.done()}
+            if running:
+                more = len(tasks) < len(starters)
+                done, _ = await asyncio.wait(running, timeout=hedge_delay if more else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if done and any(not t.done() for t in tasks):
+                    # Otro intento sigue en carrera: esperarlo antes de lanzar más
+                    continue
+            if len(tasks) >= len(starters):
+                raise error
+            launch()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,247 @@
+# search_index.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import heapq
+import logging
+import math
+import pickle
+import threading
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Tuple
+
+from persistence import atomic_write_bytes
+from text_utils import tokenize
+
+_SNAPSHOT_VERSION = 2
+
+
+class BM25Index:
+    """
+    Índice invertido incremental con puntuación BM25 sobre el historial episódico.
+
+    Los ids de documento son los ids de HistoryLog, así que el propio log hace de
+    diario: el snapshot en disco guarda hasta qué id está indexado y al arrancar
+    solo se indexan las entradas posteriores. Solo cubre el log activo: `base` es
+    su primer id (lo anterior está en los segmentos archivados).
+    """
+
+    def __init__(self, snapshot_path: Path, k1: float = 1.2, b: float = 0.75,
+                 snapshot_every: int = 200, max_postings_scan: int = 20000):
+        self.snapshot_path = Path(snapshot_path)
+        self.k1 = k1
+        self.b = b
+        self.snapshot_every = snapshot_every
+        # Para términos muy frecuentes solo se recorren las apariciones más recientes
+        self.max_postings_scan = max_postings_scan
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self, base: int = 0) -> None:
+        self.base = base
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doc_len = array("I")
+        self._total_len = 0
+        self._unsaved = 0
+
+    # --- CONSTRUCCIÓN ---
+
+    def __len__(self) -> int:
+        """Siguiente id por indexar."""
+        return self.base + len(self._doc_len)
+
+    def add(self, doc_id: int, text: str) -> None:
+        """Indexa un documento. Los ids deben llegar en orden creciente."""
+        with self._lock:
+            self._add(doc_id, text)
+            if self.snapshot_every and self._unsaved >= self.snapshot_every:
+                self.save()
+
+    def _add(self, doc_id: int, text: str) -> None:
+        # Rellenar huecos (entradas corruptas o sin texto) para mantener ids densos
+        while len(self) < doc_id:
+            self._doc_len.append(0)
+        if doc_id < len(self):
+            return
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        self._doc_len.append(length)
+        self._total_len += length
+        for term, tf in terms.items():
+            entry = self._postings.get(term)
+            if entry is None:
+                entry = self._postings[term] = (array("I"), array("H"))
+            entry[0].append(doc_id)
+            entry[1].append(min(tf, 0xFFFF))
+        self._unsaved += 1
+
+    def add_entries(self, entries: Iterable[Dict[str, Any]]) -> None:
+        """Indexa muchas entradas seguidas y guarda un solo snapshot al final (no uno cada `snapshot_every`)."""
+        with self._lock:
+            for entry in entries:
+                self._add(entry["id"], document_text(entry))
+            self.save()
+
+    def rebuild(self, entries: Iterable[Dict[str, Any]], base: int = 0) -> None:
+        with self._lock:
+            self._reset(base)
+            self.add_entries(entries)
+
+    # --- CONSULTA ---
+
+    def search(self, query: str, limit: int = 3) -> List[Tuple[float, int]]:
+        """
+        Devuelve [(score, doc_id)] ordenado por BM25 y, a igual score, por recencia.
+        El score va normalizado (ver bm25_top) para poder mezclarlo con el de los segmentos.
+        """
+        terms = set(tokenize(query))
+        if not terms or limit <= 0:
+            return []
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return []
+            plan: List[Tuple[Postings, float, int]] = []
+            for term in terms:
+                entry = self._postings.get(term)
+                if entry is None:
+                    continue
+                df = len(entry[0])
+                plan.append((entry, bm25_idf(n_docs, df), max(0, df - self.max_postings_scan)))
+            avgdl = (self._total_len / n_docs) or 1.0
+            return bm25_top(plan, self._doc_len, self.base, avgdl, self.k1, self.b, limit)
+
+    # --- PERSISTENCIA ---
+
+    def load(self) -> bool:
+        """Carga el snapshot de disco. Devuelve False si no existe o no es válido."""
+        try:
+            with self.snapshot_path.open("rb") as f:
+                data = pickle.load(f)
+            if data.get("version") != _SNAPSHOT_VERSION:
+                return False
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logging.warning(f"Snapshot del índice BM25 inválido, se reconstruirá: {e}")
+            return False
+        with self._lock:
+            self.base = data["base"]
+            self._postings = data["postings"]
+            self._doc_len = data["doc_len"]
+            self._total_len = data["total_len"]
+            self._unsaved = 0
+        return True
+
+    def save(self) -> None:
+        """Guarda el snapshot de forma atómica (temporal + os.replace)."""
+        with self._lock:
+            if not self._unsaved and self.snapshot_path.exists():
+                return
+            data = {
+                "version": _SNAPSHOT_VERSION,
+                "base": self.base,
+                "postings": self._postings,
+                "doc_len": self._doc_len,
+                "total_len": self._total_len,
+            }
+            try:
+                atomic_write_bytes(self.snapshot_path, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+                self._unsaved = 0
+            except OSError as e:
+                logging.error(f"Error guardando índice BM25: {e}")
+
+
+# --- PUNTUACIÓN BM25 ---
+# Compartida con los segmentos archivados (history_segments.py). Con numpy cada término es
+# una pasada vectorial sobre sus postings en vez de un bucle de Python por aparición; las
+# operaciones son las mismas y en el mismo orden, así que los scores no cambian.
+# Cada índice calcula idf y longitud media con sus propios documentos: sus BM25 no se pueden
+# comparar con los de otro. Por eso se devuelven divididos entre el máximo posible para la
+# consulta en ese índice (cada término aporta menos de idf * (k1 + 1)), entre 0 y 1.
+
+Postings = Tuple[array, array]  # (ids en orden creciente, frecuencias) de un término
+
+
+def bm25_idf(n_docs: int, df: int) -> float:
+    return math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+
+
+def bm25_top(plan: List[Tuple[Postings, float, int]], doc_len: array, base: int, avgdl: float,
+             k1: float, b: float, limit: int) -> List[Tuple[float, int]]:
+    """
+    Los `limit` mejores [(score, doc_id)] por BM25 y, a igual score, por id más alto.
+    `plan` es [(postings, idf, primera aparición que se recorre)]; `doc_len[id - base]`
+    es la longitud de cada documento. Los scores van normalizados (entre 0 y 1).
+    """
+    if not plan or limit <= 0:
+        return []
+    bound = (k1 + 1.0) * sum(idf for _postings, idf, _start in plan)
+    return [(score / bound, doc_id) for score, doc_id in _bm25_top(plan, doc_len, base, avgdl, k1, b, limit)]
+
+
+def _bm25_top(plan: List[Tuple[Postings, float, int]], doc_len: array, base: int, avgdl: float,
+              k1: float, b: float, limit: int) -> List[Tuple[float, int]]:
+    np = _numpy()
+    if np is not None:
+        return _bm25_top_numpy(np, plan, doc_len, base, avgdl, k1, b, limit)
+    scores: Dict[int, float] = {}
+    for (ids, tfs), idf, start in plan:
+        for i in range(start, len(ids)):
+            doc_id = ids[i]
+            tf = tfs[i]
+            norm = k1 * (1.0 - b + b * doc_len[doc_id - base] / avgdl)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+    best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+    return [(score, doc_id) for doc_id, score in best]
+
+
+def _bm25_top_numpy(np, plan: List[Tuple[Postings, float, int]], doc_len: array, base: int, avgdl: float,
+                    k1: float, b: float, limit: int) -> List[Tuple[float, int]]:
+    # Copias (slices) de los arrays: una vista de numpy impediría los append del índice
+    lengths = np.frombuffer(doc_len[:], dtype=np.uint32)
+    scores = np.zeros(len(lengths))
+    for (ids, tfs), idf, start in plan:
+        rows = np.frombuffer(ids[start:], dtype=np.uint32) - base
+        tf = np.frombuffer(tfs[start:], dtype=np.uint16).astype(np.float64)
+        norm = k1 * (1.0 - b + b * lengths[rows] / avgdl)
+        # Cada documento sale una vez por término: += por índice no pierde sumas
+        scores[rows] += idf * tf * (k1 + 1.0) / (tf + norm)
+    rows = np.flatnonzero(scores)
+    found = scores[rows]
+    if len(rows) > limit:
+        # Se quedan también los empatados con el último de los `limit` mejores: desempata el id
+        keep = found >= np.partition(found, len(found) - limit)[len(found) - limit]
+        rows, found = rows[keep], found[keep]
+    order = np.lexsort((rows, found))[::-1][:limit]
+    return [(float(found[i]), int(rows[i]) + base) for i in order]
+
+
+def _numpy():
+    """numpy si está instalado; se importa con la primera búsqueda, no al arrancar la app."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def document_text(entry: Dict[str, Any]) -> str:
+    """Texto indexable de una interacción."""
+    return f"{entry.get('mensaje_usuario', '')} {entry.get('respuesta_ia', '')}"
+
+
+def open_index(snapshot_path: Path, history_log, **kwargs) -> BM25Index:
+    """Carga el índice desde disco y lo pone al día con las entradas nuevas del log."""
+    index = BM25Index(snapshot_path, **kwargs)
+    total = len(history_log)
+    first_id = history_log.first_id
+    if not index.load() or len(index) > total or index.base != first_id:
+        logging.info("Construyendo índice BM25 del historial...")
+        index.rebuild(history_log.iter_entries(first_id), base=first_id)
+    elif len(index) < total:
+        index.add_entries(history_log.iter_entries(len(index)))
+    return index
@@ -0,0 +1,229 @@
+# semantic_index.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import json
+import logging
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él solo está disponible la búsqueda BM25
+    np = None
+
+from persistence import atomic_write_text
+from search_index import document_text
+from text_utils import fold_accents, tokenize
+
+_INITIAL_CAPACITY = 1024
+_EMBED_BATCH = 64
+
+
+def available() -> bool:
+    """Indica si la búsqueda semántica puede usarse (requiere numpy)."""
+    return np is not None
+
+
+# --- EMBEDDERS ---
+
+class HashingEmbedder:
+    """
+    Vectorizador por hashing sin dependencias: palabras + n-gramas de caracteres
+    proyectados a `dim` dimensiones con signo. Los n-gramas hacen que variantes
+    como 'programar' / 'programación' queden cerca.
+    """
+
+    def __init__(self, dim: int = 512, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+        self.name = f"hashing-{dim}-{ngram}"
+
+    def _features(self, text: str) -> Iterable[Tuple[str, float]]:
+        for word in tokenize(text, min_len=2):
+            yield "w:" + word, 1.0
+            padded = f"#{word}#"
+            for i in range(max(1, len(padded) - self.ngram + 1)):
+                yield "g:" + padded[i:i + self.ngram], 0.5
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                # crc32 es estable entre ejecuciones (hash() de Python no lo es)
+                h = zlib.crc32(feature.encode("utf-8"))
+                out[row, h % self.dim] += weight if (h >> 31) & 1 else -weight
+        return _normalize(out)
+
+
+class OllamaEmbedder:
+    """Embeddings de un modelo local de Ollama (p.ej. 'ollama/nomic-embed-text') vía litellm."""
+
+    def __init__(self, model: str, api_base: Optional[str] = None):
+        self.model = model
+        self.api_base = api_base
+        self.name = f"litellm-{model}"
+        self.dim: Optional[int] = None
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        # llm_loader: si la precarga en segundo plano ya empezó, se espera a esa en vez de importar otra vez
+        import llm_loader
+        litellm = llm_loader.get()
+        params = {"api_base": self.api_base} if self.api_base else {}
+        response = litellm.embedding(model=self.model, input=[fold_accents(t) or " " for t in texts], **params)
+        vectors = np.asarray([item["embedding"] for item in response.data], dtype=np.float32)
+        self.dim = vectors.shape[1]
+        return _normalize(vectors)
+
+
+def _normalize(vectors: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# --- MATRIZ DE EMBEDDINGS ---
+
+class SemanticIndex:
+    """
+    Matriz float32 de embeddings (una fila por id del historial) en un .npy
+    abierto con memmap. El top-k es un único producto matriz-vector + argpartition,
+    así que nunca se carga el historial en objetos Python.
+    """
+
+    def __init__(self, matrix_path: Path, embedder):
+        self.matrix_path = Path(matrix_path)
+        self.meta_path = self.matrix_path.with_suffix(".json")
+        self.embedder = embedder
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._count = 0
+        self._dim: Optional[int] = getattr(embedder, "dim", None)
+
+    # --- ARCHIVOS ---
+
+    def _load(self) -> bool:
+        """Abre la matriz existente si corresponde al mismo embedder."""
+        try:
+            meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+            if meta.get("embedder") != self.embedder.name or not self.matrix_path.exists():
+                return False
+            matrix = np.lib.format.open_memmap(self.matrix_path, mode="r+")
+        except (OSError, ValueError) as e:
+            logging.info(f"Matriz de embeddings no disponible, se reconstruirá: {e}")
+            return False
+        self._matrix = matrix
+        self._dim = matrix.shape[1]
+        self._count = min(int(meta.get("count", 0)), matrix.shape[0])
+        return True
+
+    def _write_meta(self) -> None:
+        atomic_write_text(self.meta_path, json.dumps({"embedder": self.embedder.name, "dim": self._dim, "count": self._count}))
+
+    def _reserve(self, rows: int) -> None:
+        """Garantiza capacidad para `rows` filas; crece duplicando (append amortizado O(1))."""
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(_INITIAL_CAPACITY, capacity * 2)
+        while new_capacity < rows:
+            new_capacity *= 2
+        tmp = self.matrix_path.with_name(self.matrix_path.stem + ".tmp.npy")
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(new_capacity, self._dim))
+        if self._count:
+            grown[:self._count] = self._matrix[:self._count]
+        grown.flush()
+        del grown
+        self._matrix = None
+        os.replace(tmp, self.matrix_path)
+        self._matrix = np.lib.format.open_memmap(self.matrix_path, mode="r+")
+
+    # --- API PÚBLICA ---
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add_texts(self, first_id: int, texts: List[str]) -> None:
+        """Añade embeddings para ids consecutivos a partir de `first_id`."""
+        if not texts:
+            return
+        vectors = self.embedder.embed(texts)
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+            if first_id < self._count:
+                # Ya indexados (p.ej. tras un arranque que se puso al día)
+                vectors = vectors[self._count - first_id:]
+                first_id = self._count
+                if not len(vectors):
+                    return
+            end = first_id + len(vectors)
+            self._reserve(end)
+            # Los huecos (entradas corruptas) quedan como filas a cero
+            self._matrix[self._count:first_id] = 0.0
+            self._matrix[first_id:end] = vectors
+            self._matrix.flush()
+            self._count = end
+            self._write_meta()
+
+    def add_entries(self, entries: Iterable[Dict[str, Any]]) -> None:
+        batch: List[Dict[str, Any]] = []
+        for entry in entries:
+            if batch and entry["id"] != batch[-1]["id"] + 1:
+                self._add_batch(batch)
+                batch = []
+            batch.append(entry)
+            if len(batch) >= _EMBED_BATCH:
+                self._add_batch(batch)
+                batch = []
+        self._add_batch(batch)
+
+    def _add_batch(self, batch: List[Dict[str, Any]]) -> None:
+        if batch:
+            self.add_texts(batch[0]["id"], [document_text(e) for e in batch])
+
+    def search(self, query: str, limit: int = 3, min_score: float = 0.0) -> List[Tuple[float, int]]:
+        """Devuelve [(similitud coseno, doc_id)] de mayor a menor."""
+        if not query.strip() or limit <= 0:
+            return []
+        q = self.embedder.embed([query])[0]
+        with self._lock:
+            n = self._count
+            if not n or self._matrix is None or q.shape[0] != self._dim:
+                return []
+            scores = self._matrix[:n] @ q
+        k = min(limit, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Orden final: similitud y, a igualdad, el más reciente
+        order = sorted(top.tolist(), key=lambda i: (float(scores[i]), i), reverse=True)
+        return [(float(scores[i]), i) for i in order if scores[i] > min_score]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._matrix = None
+            self._count = 0
+            self.matrix_path.unlink(missing_ok=True)
+            self.meta_path.unlink(missing_ok=True)
+
+
+def make_embedder(model: Optional[str], dim: int = 512, api_base: Optional[str] = None):
+    """Crea el embedder configurado: hashing por defecto u Ollama si se indica un modelo."""
+    if model:
+        return OllamaEmbedder(model, api_base=api_base)
+    return HashingEmbedder(dim=dim)
+
+
+def open_semantic_index(matrix_path: Path, history_log, embedder) -> SemanticIndex:
+    """Abre la matriz de embeddings y la pone al día con el historial."""
+    index = SemanticIndex(matrix_path, embedder)
+    total = len(history_log)
+    if not index._load() or len(index) > total:
+        logging.info("Construyendo matriz de embeddings del historial...")
+        index.reset()
+    if len(index) < total:
+        index.add_entries(history_log.iter_entries(len(index)))
+    return index
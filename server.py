@@ -0,0 +1,333 @@
+# server.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+"""
+Servidor HTTP/WebSocket: el mismo motor que la TUI (ChatSession) sin terminal, con
+muchas sesiones a la vez. Cada sesión tiene su ventana de conversación y su resumen,
+y solo ve los recuerdos de su usuario.
+
+    python server.py --port 8765
+    python server.py --ollama        # fuerza Ollama (p.ej. contra fake_llm.py)
+
+HTTP (JSON):
+    POST   /sessions                  {"nombre": "Ricardo"}  -> saludo + session_id
+    POST   /sessions/{id}/messages    {"texto": "...", "stream": false}
+           con "stream": true la respuesta es NDJSON: líneas {"tipo": "parcial", ...}
+           y al final {"tipo": "respuesta", ...}
+    DELETE /sessions/{id}             cierra la sesión (guarda el resumen)
+    GET    /health                    sesiones abiertas, cola de llamadas a la IA y métricas
+
+WebSocket (GET /ws), una sesión por conexión:
+    -> {"tipo": "hola", "nombre": "Ricardo"}     <- {"tipo": "saludo", ...}
+    -> {"tipo": "mensaje", "texto": "..."}        <- {"tipo": "parcial", ...}* {"tipo": "respuesta", ...}
+    -> {"tipo": "borrador", "texto": "..."}       (opcional, sin respuesta: lo que el usuario lleva
+                                                   escrito, con debounce en el cliente; se prepara el prompt)
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiohttp import WSMsgType, web
+
+from config import Config, validate_config, setup_logging
+from chat_session import ChatSession, Greeting, TurnResult
+from memory import flush_all, preload_search_index
+from brain import warm_up_model
+from llm_scheduler import get_scheduler
+import llm_loader
+import ollama_client
+import metrics
+import tracing
+
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+# --- SESIONES ---
+
+class SessionManager:
+    """Sesiones abiertas por id, con límite de sesiones y cierre de las inactivas."""
+
+    def __init__(self, max_sessions: int = 1000, idle_timeout: float = 1800):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: Dict[str, ChatSession] = {}
+        self._last_used: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self) -> Optional[ChatSession]:
+        """Abre una sesión nueva (None si se alcanzó el límite)."""
+        if len(self._sessions) >= self.max_sessions:
+            return None
+        # Todas comparten la memoria: ninguna ocupa ni libera el hueco de novio
+        session = ChatSession(uuid.uuid4().hex, single_user=False)
+        self._sessions[session.session_id] = session
+        self._last_used[session.session_id] = time.monotonic()
+        metrics.inc("server_sessions_opened_total")
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._last_used[session_id] = time.monotonic()
+        return session
+
+    async def close(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        self._last_used.pop(session_id, None)
+        if session is None:
+            return False
+        await session.close()
+        metrics.inc("server_sessions_closed_total")
+        return True
+
+    async def close_all(self) -> None:
+        for session_id in list(self._sessions):
+            await self.close(session_id)
+
+    async def reap_idle(self) -> int:
+        """Cierra las sesiones que llevan más de `idle_timeout` segundos sin usarse."""
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [session_id for session_id, last in self._last_used.items() if last < deadline]
+        for session_id in idle:
+            logging.info(f"Sesión {session_id} cerrada por inactividad")
+            await self.close(session_id)
+        return len(idle)
+
+
+def _greeting_payload(session: ChatSession, greeting: Greeting) -> Dict[str, Any]:
+    return {
+        "session_id": session.session_id,
+        "emocion": greeting.emotion,
+        "texto": greeting.text,
+        "categoria": greeting.category,
+    }
+
+
+async def stream_turn(session: ChatSession, prompt: str, send: Send) -> TurnResult:
+    """
+    Ejecuta un turno en streaming mandando los parciales con `send`. Si el cliente va
+    más lento que los tokens, solo se manda el último parcial (no se acumula cola).
+    """
+    latest: Optional[Dict[str, Any]] = None
+    changed = asyncio.Event()
+
+    def on_partial(emotion: Optional[str], text: str) -> None:
+        nonlocal latest
+        latest = {"tipo": "parcial", "emocion": emotion, "texto": text}
+        changed.set()
+
+    turn = asyncio.ensure_future(session.respond(prompt, on_partial))
+    try:
+        while not turn.done():
+            waiter = asyncio.ensure_future(changed.wait())
+            await asyncio.wait({turn, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if changed.is_set() and not turn.done():
+                changed.clear()
+                await send(latest)
+        result = turn.result()
+    finally:
+        # El cliente se fue a mitad del turno: no seguir pidiendo tokens
+        if not turn.done():
+            turn.cancel()
+    await send({"tipo": "respuesta", **result.to_dict()})
+    return result
+
+
+# --- HTTP ---
+
+async def _read_json(request: web.Request) -> Dict[str, Any]:
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise web.HTTPBadRequest(text="JSON inválido")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="Se esperaba un objeto JSON")
+    return body
+
+
+def _text_field(body: Dict[str, Any], key: str) -> str:
+    value = body.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise web.HTTPBadRequest(text=f"Falta '{key}'")
+    return value.strip()
+
+
+def _session_or_404(request: web.Request) -> ChatSession:
+    session = request.app["sessions"].get(request.match_info["session_id"])
+    if session is None:
+        raise web.HTTPNotFound(text="Sesión no encontrada")
+    return session
+
+
+async def create_session(request: web.Request) -> web.Response:
+    name = _text_field(await _read_json(request), "nombre")
+    session = request.app["sessions"].create()
+    if session is None:
+        raise web.HTTPServiceUnavailable(text="Demasiadas sesiones abiertas")
+    greeting = await session.identify(name)
+    return web.json_response(_greeting_payload(session, greeting), status=201)
+
+
+async def post_message(request: web.Request) -> web.StreamResponse:
+    session = _session_or_404(request)
+    body = await _read_json(request)
+    prompt = _text_field(body, "texto")
+    if not body.get("stream"):
+        result = await session.respond(prompt)
+        return web.json_response(result.to_dict())
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+
+    async def send(payload: Dict[str, Any]) -> None:
+        await response.write(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    await stream_turn(session, prompt, send)
+    await response.write_eof()
+    return response
+
+
+async def delete_session(request: web.Request) -> web.Response:
+    if not await request.app["sessions"].close(request.match_info["session_id"]):
+        raise web.HTTPNotFound(text="Sesión no encontrada")
+    return web.Response(status=204)
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({
+        "sesiones": len(request.app["sessions"]),
+        "planificador": get_scheduler().stats(),
+        "metricas": metrics.snapshot(),
+    })
+
+
+# --- WEBSOCKET ---
+
+async def websocket(request: web.Request) -> web.WebSocketResponse:
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    sessions: SessionManager = request.app["sessions"]
+    session: Optional[ChatSession] = None
+
+    async def send(payload: Dict[str, Any]) -> None:
+        await ws.send_str(json.dumps(payload, ensure_ascii=False))
+
+    try:
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                data = json.loads(msg.data)
+            except json.JSONDecodeError:
+                await send({"tipo": "error", "error": "JSON inválido"})
+                continue
+            kind = data.get("tipo") if isinstance(data, dict) else None
+            text = data.get("nombre" if kind == "hola" else "texto") if kind else None
+            if not isinstance(text, str) or not text.strip():
+                await send({"tipo": "error", "error": "Mensaje no reconocido"})
+                continue
+
+            if kind == "hola" and session is None:
+                session = sessions.create()
+                if session is None:
+                    await send({"tipo": "error", "error": "Demasiadas sesiones abiertas"})
+                    break
+                await send({"tipo": "saludo", **_greeting_payload(session, await session.identify(text))})
+            elif kind == "borrador" and session is not None:
+                session.prefetch(text)
+            elif kind == "mensaje" and session is not None:
+                sessions.get(session.session_id)  # marca la sesión como activa
+                result = await stream_turn(session, text.strip(), send)
+                if result.quit:
+                    break
+            else:
+                await send({"tipo": "error", "error": "Primero 'hola' con el nombre, luego 'mensaje'"})
+    finally:
+        if session is not None:
+            await sessions.close(session.session_id)
+    return ws
+
+
+# --- APLICACIÓN ---
+
+async def _reaper(app: web.Application) -> None:
+    sessions: SessionManager = app["sessions"]
+    while True:
+        await asyncio.sleep(max(1.0, sessions.idle_timeout / 4))
+        await sessions.reap_idle()
+
+
+async def _on_startup(app: web.Application) -> None:
+    llm_loader.preload()
+    preload_search_index()
+    app["reaper"] = asyncio.create_task(_reaper(app))
+    app["warmup"] = asyncio.create_task(warm_up_model())
+
+
+async def _on_cleanup(app: web.Application) -> None:
+    for key in ("reaper", "warmup"):
+        app[key].cancel()
+    await app["sessions"].close_all()
+    await llm_loader.ashutdown()
+    await ollama_client.ashutdown()
+    await asyncio.to_thread(flush_all)
+    await asyncio.to_thread(tracing.flush)
+
+
+def create_app(max_sessions: int = Config.SERVER_MAX_SESSIONS,
+               idle_timeout: float = Config.SERVER_SESSION_IDLE_SECONDS) -> web.Application:
+    """Aplicación aiohttp con las rutas HTTP y WebSocket."""
+    app = web.Application()
+    app["sessions"] = SessionManager(max_sessions, idle_timeout)
+    app.router.add_post("/sessions", create_session)
+    app.router.add_post("/sessions/{session_id}/messages", post_message)
+    app.router.add_delete("/sessions/{session_id}", delete_session)
+    app.router.add_get("/health", health)
+    app.router.add_get("/ws", websocket)
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Servidor de NovIA (HTTP/WebSocket, varias sesiones)")
+    parser.add_argument("--host", default=Config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=Config.SERVER_PORT)
+    parser.add_argument("--ollama", action="store_true", help="usar Ollama aunque USE_OLLAMA sea False")
+    parser.add_argument("--llm-concurrency", type=int, default=None,
+                        help="llamadas simultáneas al backend principal (por defecto, las de config.py)")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    tracing.configure(
+        Config.TRACING,
+        Config.TRACE_FILE if Config.TRACING else None,
+        Config.PROMETHEUS_FILE if Config.TRACING else None,
+    )
+    if args.ollama:
+        Config.USE_OLLAMA = True
+    if args.llm_concurrency:
+        if Config.USE_OLLAMA:
+            Config.LLM_CONCURRENCY_OLLAMA = args.llm_concurrency
+        else:
+            Config.LLM_CONCURRENCY_GEMINI = args.llm_concurrency
+    if not validate_config():
+        print("Error: Configuración inválida. Revisa debug.log")
+        return 1
+    print(f"NovIA escuchando en http://{args.host}:{args.port}")
+    web.run_app(create_app(), host=args.host, port=args.port, print=None)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,142 @@
+# summarizer.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import metrics
+
+SummarizeFn = Callable[[List[Dict[str, Any]], str], Awaitable[str]]
+
+
+class RollingSummarizer:
+    """
+    Resumen incremental de la sesión.
+
+    Los mensajes nuevos se acumulan como pendientes y, cada N turnos (o cuando un
+    mensaje pendiente sale de la ventana de conversación), se integran al resumen
+    existente con una llamada corta a la IA en segundo plano. Al salir solo hay que
+    guardar `summary`, que ya está calculado.
+
+    Si la IA falla, se espera cada vez más mensajes antes de reintentar, y los
+    pendientes nunca pasan de `max_pending`: los más antiguos se añaden recortados
+    al resumen tal cual (plain_summary), sin llamar a la IA. Lo mismo con los que
+    quedan pendientes al cerrar la sesión (close()).
+    """
+
+    def __init__(self, every_n_turns: int, summarize: Optional[SummarizeFn] = None,
+                 max_pending: Optional[int] = None):
+        self.every_n_messages = max(1, every_n_turns) * 2  # un turno = usuario + Miku
+        self.max_pending = max_pending or self.every_n_messages * 4
+        self.summary = ""
+        self._summarize = summarize
+        self._pending: List[Dict[str, Any]] = []
+        self._urgent = False
+        self._failures = 0
+        self._cooldown = 0  # Mensajes que faltan para reintentar tras un fallo
+        self._lock = asyncio.Lock()
+        # Sube con start() y close(): un resumen que estaba en curso ya no es de esta sesión
+        self._generation = 0
+
+    def start(self, previous_summary: str) -> None:
+        """Arranca la sesión a partir del resumen guardado del usuario."""
+        self._generation += 1
+        self.summary = previous_summary or ""
+        self._pending.clear()
+        self._urgent = False
+        self._failures = 0
+        self._cooldown = 0
+
+    def add(self, message: Dict[str, Any]) -> None:
+        """Registra un mensaje nuevo de la conversación."""
+        self._pending.append(message)
+        self._cooldown -= 1
+        # Con un resumen en curso no se toca la cola: fold() quita después los que resumió
+        if len(self._pending) > self.max_pending and not self._lock.locked():
+            overflow = len(self._pending) - self.max_pending
+            self.summary = plain_summary(self.summary, self._pending[:overflow])
+            del self._pending[:overflow]
+            metrics.inc("summary_plain_messages_total", overflow)
+
+    def evicted(self, message: Dict[str, Any]) -> None:
+        """Avisa de que un mensaje salió de la ventana: si no estaba resumido, hay que integrarlo ya."""
+        if any(m is message for m in self._pending):
+            self._urgent = True
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def should_fold(self) -> bool:
+        if not self._pending or self._cooldown > 0:
+            return False
+        return self._urgent or len(self._pending) >= self.every_n_messages
+
+    async def fold(self) -> str:
+        """Integra los mensajes pendientes al resumen. Si ya hay uno en curso, no hace nada."""
+        if self._lock.locked() or not self._pending:
+            return self.summary
+        async with self._lock:
+            generation = self._generation
+            batch = list(self._pending)
+            if self._summarize is None:
+                from brain import generate_summary_async
+                self._summarize = generate_summary_async
+            try:
+                new_summary = await self._summarize(batch, self.summary)
+            except Exception as e:
+                logging.error(f"Error en el resumen incremental: {e}")
+                new_summary = ""
+            if generation != self._generation:
+                # start() o close() mientras se resumía: ni el resumen ni los pendientes son ya estos
+                metrics.inc("summary_discarded_total")
+                return self.summary
+            if not new_summary:
+                self._failed()
+                return self.summary
+            self.summary = new_summary
+            # Solo se quitan los que entraron en este resumen (pudieron llegar más mientras tanto)
+            del self._pending[:len(batch)]
+            self._urgent = False
+            self._failures = 0
+            self._cooldown = 0
+            logging.info(f"Resumen incremental actualizado ({len(batch)} mensajes): {new_summary}")
+            return self.summary
+
+    def close(self) -> str:
+        """
+        Al cerrar la sesión: los mensajes aún pendientes se añaden al resumen con
+        plain_summary (sin esperar a la IA) y se descarta el resumen que estuviera en curso.
+        """
+        self._generation += 1
+        if self._pending:
+            self.summary = plain_summary(self.summary, self._pending)
+            metrics.inc("summary_plain_messages_total", len(self._pending))
+            self._pending.clear()
+        return self.summary
+
+    def _failed(self) -> None:
+        """Backoff: tras cada fallo seguido se espera el doble de mensajes (hasta 8 veces N turnos)."""
+        self._failures += 1
+        self._cooldown = self.every_n_messages * 2 ** min(self._failures - 1, 3)
+        metrics.inc("summary_failures_total")
+        logging.warning(f"Resumen incremental fallido ({self._failures} seguidos): "
+                        f"se reintenta dentro de {self._cooldown} mensajes")
+
+
+PLAIN_SUMMARY_CHARS = 600
+_SPEAKERS = {"user": "Él", "assistant": "Yo"}  # El resumen está escrito por Miku
+
+
+def plain_summary(summary: str, messages: List[Dict[str, Any]], limit: int = PLAIN_SUMMARY_CHARS) -> str:
+    """Resumen sin IA: el resumen anterior más el comienzo de cada mensaje, con los últimos `limit` caracteres."""
+    lines = []
+    for message in messages:
+        if message["role"] in _SPEAKERS:
+            content = " ".join(str(message["content"]).split())
+            lines.append(f"{_SPEAKERS[message['role']]}: {content[:80]}")
+    text = " ".join(part for part in (summary, *lines) if part)
+    return text if len(text) <= limit else "..." + text[-limit:]
@@ -0,0 +1,58 @@
+# tests/conftest.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Los módulos de NovIA están en la raíz del repositorio (sin paquete)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def _reset_metrics():
+    """Cada prueba empieza con los contadores a cero."""
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Apunta todos los archivos de la app a un directorio temporal (y cierra lo abierto al acabar)."""
+    from config import Config
+    import memory
+
+    memory.close_all()
+    for name, filename in (("MEMORY_FILE", "memoria.json"), ("PROFILE_DB_FILE", "memoria.db"),
+                           ("HISTORY_FILE", "historial.jsonl"), ("HISTORY_INDEX_FILE", "historial.idx"),
+                           ("LEGACY_HISTORY_FILE", "historial.json"), ("SEARCH_INDEX_FILE", "historial_bm25.pkl"),
+                           ("EMBEDDINGS_FILE", "historial_vec.npy"), ("HISTORY_SEGMENTS_DIR", "historial_segmentos")):
+        monkeypatch.setattr(Config, name, tmp_path / filename)
+    yield tmp_path
+    memory.close_all()
+
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    """LLM falso compatible con Ollama (fake_llm.py) y Config apuntando a él. Devuelve su comportamiento."""
+    from config import Config
+    from fake_llm import start_fake_llm
+    import llm_loader
+
+    server, api_base = start_fake_llm()
+    monkeypatch.setattr(Config, "USE_OLLAMA", True)
+    monkeypatch.setattr(Config, "MODEL_OLLAMA", "ollama/fake")
+    monkeypatch.setattr(Config, "OLLAMA_API_BASE", api_base)
+    monkeypatch.setattr(Config, "OLLAMA_WARMUP", False)
+    monkeypatch.setattr(Config, "STRUCTURED_OUTPUT", False)
+    # Importar litellm tarda segundos y el cliente nativo de Ollama no lo necesita
+    monkeypatch.setattr(llm_loader, "preload", lambda: None)
+    yield server.behaviour
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,35 @@
+# tests/test_brain.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+import brain
+import metrics
+from fake_llm import DEFAULT_REPLY
+
+HISTORY = [{"role": "user", "content": "Hola"}, {"role": "assistant", "content": "Hola, amor"}]
+
+
+def test_sync_response_runs_the_async_pipeline(fake_ollama, data_dir):
+    for _ in range(2):
+        # Cada llamada usa su propio event loop y cierra sus conexiones al acabar
+        assert brain.get_ai_response("¿Cómo estás?", HISTORY, "El usuario actual se llama Ricardo.",
+                                     user_name="Ricardo") == DEFAULT_REPLY
+    assert metrics.get("llm_turns_total") == 2
+    assert metrics.get("ollama_connections_opened_total") == 2
+
+
+def test_sync_stream_reports_partials(fake_ollama, data_dir):
+    partials = []
+    reply = brain.stream_ai_response("¿Cómo estás?", HISTORY, "", on_partial=lambda emotion, text: partials.append(text))
+    assert reply == DEFAULT_REPLY
+    assert partials and partials[-1] == brain.safe_json_parse(DEFAULT_REPLY)["texto"]
+
+
+def test_sync_summary(fake_ollama):
+    assert brain.generate_summary(HISTORY, "antes") == DEFAULT_REPLY
+    assert brain.generate_summary([], "antes") == "antes"
@@ -0,0 +1,111 @@
+# tests/test_context_window.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import pytest
+
+from context_window import MESSAGE_OVERHEAD_TOKENS, ContextWindow, compact_assistant_message
+
+
+def _words(text):
+    """Contador de tokens predecible: una palabra, un token."""
+    return len(text.split())
+
+
+def _user(text):
+    return {"role": "user", "content": text}
+
+
+def _miku(text):
+    return {"role": "assistant", "content": text}
+
+
+@pytest.fixture
+def evicted():
+    return []
+
+
+def _window(budget, evicted):
+    return ContextWindow(budget, count=_words, on_evict=evicted.append)
+
+
+# --- PRESUPUESTO ---
+
+def test_messages_are_counted_once_with_their_overhead(evicted):
+    window = _window(100, evicted)
+    assert window.append(_user("hola miku")) == []
+    assert window.append(_miku("hola ricardo, ¿qué tal?")) == []
+    assert window.tokens == 2 + 4 + 2 * MESSAGE_OVERHEAD_TOKENS
+    assert len(window) == 2 and evicted == []
+
+
+def test_oldest_messages_leave_when_over_budget(evicted):
+    window = _window(3 * (3 + MESSAGE_OVERHEAD_TOKENS), evicted)
+    for i in range(3):
+        window.append(_user(f"mensaje número {i}"))
+    out = window.append(_user("mensaje número 3"))
+    assert out == [_user("mensaje número 0")] and evicted == out
+    assert [m["content"] for m in window] == ["mensaje número 1", "mensaje número 2", "mensaje número 3"]
+    assert window.tokens <= window.budget
+
+
+def test_window_never_starts_with_an_assistant_message(evicted):
+    window = _window(3 * (2 + MESSAGE_OVERHEAD_TOKENS), evicted)
+    window.append(_user("uno dos"))
+    window.append(_miku("tres cuatro"))
+    window.append(_user("cinco seis"))
+    out = window.append(_miku("siete ocho"))
+    # Salió el mensaje del usuario y, con él, la respuesta que lo seguía
+    assert out == [_user("uno dos"), _miku("tres cuatro")]
+    assert window.messages[0]["role"] == "user"
+    assert window.tokens == 2 * (2 + MESSAGE_OVERHEAD_TOKENS)
+
+
+def test_last_message_is_kept_even_over_budget(evicted):
+    window = _window(5, evicted)
+    window.append(_user("corto"))
+    out = window.append(_user("un mensaje mucho más largo que todo el presupuesto"))
+    assert out == [_user("corto")]
+    assert len(window) == 1 and window.tokens > window.budget
+
+
+def test_set_budget_trims_only_when_shrinking(evicted):
+    window = _window(1000, evicted)
+    for i in range(4):
+        window.append(_user(f"mensaje {i}"))
+    assert window.set_budget(2000) == []
+    out = window.set_budget(2 * (2 + MESSAGE_OVERHEAD_TOKENS))
+    assert [m["content"] for m in out] == ["mensaje 0", "mensaje 1"]
+    assert len(window) == 2
+
+
+def test_version_changes_with_every_mutation(evicted):
+    window = _window(100, evicted)
+    versions = [window.version]
+    window.append(_user("hola"))
+    versions.append(window.version)
+    window.set_budget(50)
+    versions.append(window.version)
+    window.clear()
+    versions.append(window.version)
+    assert versions == sorted(set(versions))
+    assert len(window) == 0 and window.tokens == 0
+
+
+def test_default_counter_counts_something():
+    window = ContextWindow(1000)
+    window.append(_user("hola, ¿cómo estás hoy?"))
+    assert window.tokens > MESSAGE_OVERHEAD_TOKENS
+
+
+# --- MENSAJES COMPACTOS ---
+
+def test_compact_assistant_message_keeps_only_the_text():
+    raw = '{"emocion": "feliz", "texto": "¡Hola!", "memoria": ["algo"]}'
+    assert compact_assistant_message(raw, {"emocion": "feliz", "texto": "¡Hola!"}) == _miku("¡Hola!")
+
+
+@pytest.mark.parametrize("data", [None, {}, {"texto": ""}, {"texto": 3}, ["texto"]])
+def test_compact_assistant_message_falls_back_to_the_raw_reply(data):
+    assert compact_assistant_message("respuesta sin JSON", data) == _miku("respuesta sin JSON")
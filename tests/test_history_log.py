@@ -0,0 +1,101 @@
+# tests/test_history_log.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import json
+
+import pytest
+
+from history_log import HistoryLog
+
+
+def _entry(i):
+    return {"usuario": "Ricardo", "mensaje_usuario": f"mensaje {i}", "respuesta_ia": f"respuesta {i}"}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return tmp_path / "historial.jsonl", tmp_path / "historial.idx"
+
+
+def _filled(paths, n=5, **kwargs):
+    log = HistoryLog(*paths, fsync=False, **kwargs)
+    for i in range(n):
+        log.append(_entry(i))
+    log.close()
+    return log
+
+
+def test_append_and_get_by_id(paths):
+    log = HistoryLog(*paths, fsync=False)
+    assert [log.append(_entry(i)) for i in range(3)] == [0, 1, 2]
+    assert log.get(1)["mensaje_usuario"] == "mensaje 1"
+    assert log.get(3) is None and log.get(-1) is None
+    assert len(log) == 3
+    log.close()
+    reopened = HistoryLog(*paths, fsync=False)
+    assert [e["id"] for e in reopened.iter_entries(1)] == [1, 2]
+
+
+def test_torn_tail_is_discarded_on_open(paths):
+    log_path, _ = paths
+    _filled(paths, 3)
+    with log_path.open("ab") as f:
+        f.write(b'{"usuario": "Ricardo", "mensaje_us')
+    log = HistoryLog(*paths, fsync=False)
+    assert len(log) == 3
+    assert log.append(_entry(3)) == 3
+    assert log.get(3)["mensaje_usuario"] == "mensaje 3"
+    assert log_path.read_bytes().endswith(b"\n")
+
+
+@pytest.mark.parametrize("damage", ["missing", "truncated", "stale"])
+def test_offset_index_is_rebuilt_when_it_does_not_match(paths, damage):
+    log_path, index_path = paths
+    _filled(paths, 4)
+    if damage == "missing":
+        index_path.unlink()
+    elif damage == "truncated":
+        index_path.write_bytes(index_path.read_bytes()[:-3])
+    else:
+        # Una entrada escrita sin su offset (el proceso murió entre las dos escrituras)
+        with log_path.open("ab") as f:
+            f.write((json.dumps({**_entry(4), "id": 4}) + "\n").encode("utf-8"))
+    log = HistoryLog(*paths, fsync=False)
+    expected = 5 if damage == "stale" else 4
+    assert len(log) == expected
+    assert [log.get(i)["mensaje_usuario"] for i in range(expected)] == [f"mensaje {i}" for i in range(expected)]
+
+
+def test_corrupt_first_line_falls_back_to_min_first_id(paths):
+    log_path, index_path = paths
+    _filled(paths, 3, min_first_id=100)
+    lines = log_path.read_bytes().splitlines(keepends=True)
+    log_path.write_bytes(b"{no es json}\n" + b"".join(lines[1:]))
+    index_path.unlink()
+    log = HistoryLog(*paths, fsync=False, min_first_id=100)
+    assert log.first_id == 100
+    assert log.get(101)["mensaje_usuario"] == "mensaje 1"
+
+
+def test_drop_before_keeps_the_ids(paths):
+    log = _filled(paths, 6)
+    log.drop_before(4)
+    assert log.first_id == 4
+    assert len(log) == 6
+    assert log.get(3) is None
+    assert log.get(5)["mensaje_usuario"] == "mensaje 5"
+    assert log.append(_entry(6)) == 6
+    log.close()
+    assert HistoryLog(*paths, fsync=False, min_first_id=4).first_id == 4
+
+
+def test_migrates_the_legacy_json_once(paths, tmp_path):
+    legacy = tmp_path / "historial.json"
+    legacy.write_text(json.dumps([_entry(i) for i in range(3)]), encoding="utf-8")
+    log = HistoryLog(*paths, legacy_path=legacy, fsync=False)
+    assert [e["id"] for e in log.read_all()] == [0, 1, 2]
+    log.append(_entry(3))
+    log.close()
+    assert len(HistoryLog(*paths, legacy_path=legacy, fsync=False)) == 4
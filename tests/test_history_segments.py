@@ -0,0 +1,157 @@
+# tests/test_history_segments.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import time
+
+import pytest
+
+from history_log import HistoryLog
+from history_segments import BloomFilter, SegmentStore, TieredHistory, period_key
+
+ENERO = time.mktime((2024, 1, 15, 12, 0, 0, 0, 0, -1))
+FEBRERO = time.mktime((2024, 2, 15, 12, 0, 0, 0, 0, -1))
+
+
+def _entry(timestamp, text, user="Ricardo"):
+    return {"timestamp": timestamp, "usuario": user, "mensaje_usuario": text, "respuesta_ia": ""}
+
+
+def _history(tmp_path, entries=(), **kwargs):
+    hot = HistoryLog(tmp_path / "historial.jsonl", tmp_path / "historial.idx", fsync=False)
+    for entry in entries:
+        hot.append(entry)
+    history = TieredHistory(hot, SegmentStore(tmp_path / "segmentos", codec="gzip"), **kwargs)
+    history.wait_maintenance()
+    return history
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = _history(tmp_path, [
+        _entry(ENERO, "me gustan los gatos"),
+        _entry(ENERO + 60, "fuimos al concierto", user="Luis"),
+        _entry(FEBRERO, "llovió todo el día"),
+        _entry(time.time(), "hoy hablamos de perros"),
+    ])
+    yield history
+    history.close()
+
+
+# --- FILTRO DE BLOOM ---
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter.for_capacity(500)
+    words = [f"palabra{i}" for i in range(500)]
+    for word in words:
+        bloom.add(word)
+    restored = BloomFilter.from_dict(bloom.to_dict())
+    assert all(word in restored for word in words)
+    # Con un 1% de error esperado, casi ninguna palabra ajena debería pasar
+    assert sum(f"otra{i}" in restored for i in range(1000)) < 50
+
+
+# --- SELLADO ---
+
+def test_old_periods_are_sealed_one_segment_each(history):
+    assert [(s["period"], s["first_id"], s["last_id"]) for s in history.segments.segments] == [
+        (period_key(ENERO, "month"), 0, 1), (period_key(FEBRERO, "month"), 2, 2)]
+    assert history.segments.segments[0]["users"] == {"Ricardo": 1, "Luis": 1}
+    # El log activo solo conserva el periodo actual, con su id de siempre
+    assert history.first_id == 3
+    assert len(history) == 4
+
+
+def test_ids_are_kept_across_tiers(history):
+    assert history.get(1)["mensaje_usuario"] == "fuimos al concierto"
+    assert history.get(3)["mensaje_usuario"] == "hoy hablamos de perros"
+    assert history.get(99) is None
+    assert [e["id"] for e in history.iter_entries()] == [0, 1, 2, 3]
+    assert [e["id"] for e in history.iter_entries(2)] == [2, 3]
+    assert history.append(_entry(time.time(), "otra vez")) == 4
+
+
+def test_reopening_keeps_the_archive(tmp_path, history):
+    history.close()
+    reopened = _history(tmp_path)
+    try:
+        assert reopened.first_id == 3
+        assert reopened.get(0)["mensaje_usuario"] == "me gustan los gatos"
+        assert reopened.append(_entry(time.time(), "de vuelta")) == 4
+    finally:
+        reopened.close()
+
+
+def test_interrupted_seal_is_finished_on_open(tmp_path):
+    hot = HistoryLog(tmp_path / "historial.jsonl", tmp_path / "historial.idx", fsync=False)
+    for entry in [_entry(ENERO, "gatos"), _entry(time.time(), "perros")]:
+        hot.append(entry)
+    # Se escribió el segmento pero el proceso murió antes de recortar el log activo
+    SegmentStore(tmp_path / "segmentos", codec="gzip").seal("2024-01", [hot.get(0)])
+    hot.close()
+    history = _history(tmp_path)
+    try:
+        assert history.first_id == 1
+        assert [e["id"] for e in history.iter_entries()] == [0, 1]
+    finally:
+        history.close()
+
+
+def test_on_sealed_callbacks_run_after_sealing(tmp_path):
+    calls = []
+    history = _history(tmp_path, [_entry(ENERO, "gatos"), _entry(time.time(), "perros")],
+                       on_sealed=[lambda: calls.append("sellado")])
+    history.close()
+    assert calls == ["sellado"]
+
+
+# --- BÚSQUEDA ---
+
+def test_bloom_filter_skips_segments_without_the_terms(history):
+    store = history.segments
+    assert [s["first_id"] for s in store.candidates(["concierto"])] == [0]
+    assert store.candidates(["inexistente"]) == []
+    store._cache.clear()
+    assert [doc_id for _, doc_id in history.search_archive("concierto")] == [1]
+    # Solo se descomprimió el segmento de enero
+    assert list(store._cache) == [store.segments[0]["file"]]
+
+
+def test_archive_search_mixes_segments_newest_first(tmp_path):
+    history = _history(tmp_path, [
+        _entry(ENERO, "gatos"),
+        _entry(FEBRERO, "gatos"),
+        _entry(time.time(), "gatos"),
+    ])
+    try:
+        assert [doc_id for _, doc_id in history.search_archive("gatos", limit=2)] == [1, 0]
+        assert [doc_id for _, doc_id in history.search_archive("gatos", max_segments=1)] == [1]
+    finally:
+        history.close()
+
+
+# --- RETENCIÓN ---
+
+def test_retention_by_age_drops_the_oldest_segments(tmp_path):
+    history = _history(tmp_path, [_entry(ENERO, "gatos"), _entry(time.time() - 86400 * 40, "perros"),
+                                  _entry(time.time(), "hoy")], max_age_days=60)
+    try:
+        assert [s["first_id"] for s in history.segments.segments] == [1]
+        assert history.get(0) is None
+        assert len(list((tmp_path / "segmentos").glob("*.gz"))) == 1
+    finally:
+        history.close()
+
+
+def test_retention_by_size_keeps_the_newest(tmp_path):
+    history = _history(tmp_path, [_entry(ENERO, "gatos " * 50), _entry(FEBRERO, "perros " * 50),
+                                  _entry(time.time(), "hoy")])
+    try:
+        newest = history.segments.segments[-1]["bytes"]
+        assert [s["first_id"] for s in history.segments.apply_retention(None, newest)] == [0]
+        assert [s["first_id"] for s in history.segments.segments] == [1]
+        # El manifiesto se guardó sin el segmento borrado
+        assert [s["first_id"] for s in SegmentStore(tmp_path / "segmentos").segments] == [1]
+    finally:
+        history.close()
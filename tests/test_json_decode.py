@@ -0,0 +1,61 @@
+# tests/test_json_decode.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import json
+
+import pytest
+
+from json_decode import decode_json_object
+
+RESPUESTA = {"emocion": "celosa", "texto": "¿Y quién es Ana?", "personas_mencionadas": ["Ana"],
+             "nueva_memoria": {"gustos": ["Café"]}}
+
+
+@pytest.mark.parametrize("text", [
+    json.dumps(RESPUESTA, ensure_ascii=False),
+    "Claro, aquí tienes:\n" + json.dumps(RESPUESTA, ensure_ascii=False) + "\n¡Listo!",
+    "```json\n" + json.dumps(RESPUESTA, ensure_ascii=False, indent=2) + "\n```",
+])
+def test_finds_the_object_inside_surrounding_text(text):
+    assert decode_json_object(text) == (RESPUESTA, False)
+
+
+def test_braces_and_quotes_inside_strings_do_not_count():
+    text = '{"texto": "una llave { y otra } y \\"comillas\\""}'
+    assert decode_json_object(text) == ({"texto": 'una llave { y otra } y "comillas"'}, False)
+
+
+def test_skips_a_balanced_but_invalid_object():
+    assert decode_json_object("{esto no} y luego {\"a\": 2}") == ({"a": 2}, False)
+
+
+@pytest.mark.parametrize("text", ["", "sin json", "[1, 2, 3]", "} suelta"])
+def test_no_object(text):
+    assert decode_json_object(text) == (None, False)
+
+
+# --- REPARACIÓN DE RESPUESTAS CORTADAS ---
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"emocion": "feliz", "texto": "Hola, qu', {"emocion": "feliz", "texto": "Hola, qu"}),
+    ('{"a": 1,', {"a": 1}),
+    ('{"a": 1, "b":', {"a": 1, "b": None}),
+    ('{"a": 1, "b"', {"a": 1}),
+    ('{"a": [1, 2', {"a": [1, 2]}),
+    ('{"a": {"b": [{"c": 1}, {"d"', {"a": {"b": [{"c": 1}]}}),
+    ('{"texto": "barra al final \\', {"texto": "barra al final "}),
+])
+def test_repairs_truncated_objects(text, expected):
+    assert decode_json_object(text) == (expected, True)
+
+
+def test_every_prefix_of_a_response_decodes_or_fails_cleanly():
+    # Lo que llega en streaming se corta en cualquier punto: nunca debe lanzar excepciones
+    text = json.dumps(RESPUESTA, ensure_ascii=False)
+    for end in range(len(text) + 1):
+        obj, repaired = decode_json_object(text[:end])
+        assert obj is None or isinstance(obj, dict)
+        if end == len(text):
+            assert (obj, repaired) == (RESPUESTA, False)
@@ -0,0 +1,38 @@
+# tests/test_llm_loader.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import asyncio
+import logging
+
+import pytest
+
+import llm_loader
+
+
+@pytest.fixture(scope="module")
+def litellm():
+    pytest.importorskip("litellm")
+    return llm_loader.get()
+
+
+def test_shutdown_flushes_and_stops_the_logging_worker(litellm, fake_ollama):
+    from config import Config
+
+    async def main():
+        response = await litellm.acompletion(model="ollama/fake", messages=[{"role": "user", "content": "hola"}],
+                                             api_base=Config.OLLAMA_API_BASE)
+        await asyncio.wait_for(llm_loader.ashutdown(timeout=2.0), 5.0)
+        return response.choices[0].message.content
+
+    assert asyncio.run(main())
+
+
+def test_shutdown_without_a_known_logging_worker(litellm, monkeypatch, caplog):
+    from litellm.litellm_core_utils import logging_worker
+
+    monkeypatch.setattr(logging_worker, "GLOBAL_LOGGING_WORKER", object())
+    with caplog.at_level(logging.INFO):
+        asyncio.run(llm_loader.ashutdown())
+    assert "no se vacía al salir" in caplog.text
@@ -0,0 +1,176 @@
+# tests/test_llm_scheduler.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import asyncio
+
+import pytest
+
+import metrics
+from llm_scheduler import LLMScheduler, Priority
+
+
+def _scheduler(limit=1):
+    return LLMScheduler(lambda backend: limit)
+
+
+async def _settle():
+    """Deja correr a las tareas pendientes del bucle."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+# --- LÍMITE Y PRIORIDAD ---
+
+def test_concurrency_is_limited_per_backend():
+    scheduler = _scheduler(limit=2)
+    running = peak = 0
+
+    async def call():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "ok"
+
+    async def main():
+        results = await asyncio.gather(*(scheduler.run("gemini", Priority.INTERACTIVE, call) for _ in range(6)),
+                                       scheduler.run("ollama", Priority.INTERACTIVE, call))
+        assert results == ["ok"] * 7
+
+    asyncio.run(main())
+    # Dos en gemini y una en ollama a la vez, como mucho
+    assert peak == 3
+
+
+def test_slots_go_by_priority_then_arrival():
+    scheduler = _scheduler()
+    order = []
+
+    async def wait_turn(name, priority):
+        slot = await scheduler.acquire("gemini", priority)
+        order.append(name)
+        slot.release()
+
+    async def main():
+        busy = await scheduler.acquire("gemini")
+        waiters = [asyncio.ensure_future(wait_turn(name, priority)) for name, priority in [
+            ("precarga", Priority.BACKGROUND), ("resumen", Priority.SUMMARY),
+            ("turno 1", Priority.INTERACTIVE), ("turno 2", Priority.INTERACTIVE)]]
+        await _settle()
+        assert order == []
+        busy.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(main())
+    assert order == ["turno 1", "turno 2", "resumen", "precarga"]
+
+
+def test_cancelled_waiter_does_not_keep_a_slot():
+    scheduler = _scheduler()
+
+    async def main():
+        busy = await scheduler.acquire("gemini")
+        waiter = asyncio.ensure_future(scheduler.acquire("gemini", Priority.SUMMARY))
+        await _settle()
+        waiter.cancel()
+        await _settle()
+        busy.release()
+        busy.release()  # Devolverlo dos veces no libera dos huecos
+        slot = await asyncio.wait_for(scheduler.acquire("gemini"), 1)
+        assert scheduler.stats()["backends"]["gemini"]["running"] == 1
+        slot.release()
+
+    asyncio.run(main())
+
+
+# --- EXPULSIÓN ---
+
+def test_interactive_turn_preempts_background_work():
+    scheduler = _scheduler()
+    attempts = []
+    events = []
+
+    async def background():
+        attempts.append(len(attempts))
+        await asyncio.sleep(0.05)
+        return "precargado"
+
+    async def main():
+        job = asyncio.ensure_future(scheduler.run("gemini", Priority.BACKGROUND, background))
+        await _settle()
+        slot = await asyncio.wait_for(scheduler.acquire("gemini"), 1)
+        events.append("turno")
+        slot.release()
+        assert await job == "precargado"
+
+    asyncio.run(main())
+    # La precarga se canceló, cedió el hueco al turno y se repitió entera
+    assert attempts == [0, 1] and events == ["turno"]
+    assert metrics.get("llm_preempted_total") == 1
+    assert metrics.get("llm_requeued_total") == 1
+
+
+@pytest.mark.parametrize("priority, preemptable", [
+    (Priority.INTERACTIVE, True),   # No se expulsa a alguien igual de prioritario
+    (Priority.BACKGROUND, False),   # Ni lo que se lanzó como no expulsable
+])
+def test_some_work_is_never_preempted(priority, preemptable):
+    scheduler = _scheduler()
+    order = []
+
+    async def call():
+        await asyncio.sleep(0.02)
+        order.append("en curso")
+
+    async def main():
+        job = asyncio.ensure_future(scheduler.run("gemini", priority, call, preemptable=preemptable))
+        await _settle()
+        slot = await scheduler.acquire("gemini")
+        order.append("turno")
+        slot.release()
+        await job
+
+    asyncio.run(main())
+    assert order == ["en curso", "turno"]
+    assert metrics.get("llm_preempted_total") == 0
+
+
+def test_errors_propagate_and_free_the_slot():
+    scheduler = _scheduler()
+
+    async def broken():
+        raise ValueError("respuesta inválida")
+
+    async def main():
+        with pytest.raises(ValueError):
+            await scheduler.run("gemini", Priority.SUMMARY, broken)
+        slot = await asyncio.wait_for(scheduler.acquire("gemini"), 1)
+        slot.release()
+
+    asyncio.run(main())
+
+
+# --- ESTADÍSTICAS ---
+
+def test_stats_report_running_queued_and_waits():
+    scheduler = _scheduler()
+
+    async def main():
+        busy = await scheduler.acquire("gemini")
+        waiter = asyncio.ensure_future(scheduler.acquire("gemini", Priority.SUMMARY))
+        await _settle()
+        stats = scheduler.stats()
+        assert stats["backends"]["gemini"] == {
+            "limit": 1, "running": 1, "queued": {"interactive": 0, "summary": 1, "background": 0}}
+        busy.release()
+        (await waiter).release()
+        return scheduler.stats()
+
+    stats = asyncio.run(main())
+    assert stats["backends"]["gemini"]["running"] == 0
+    assert set(stats["wait"]) == {"interactive", "summary"}
+    assert stats["wait"]["summary"]["p50_ms"] > 0
+    assert metrics.get("llm_queue_requests_interactive_total") == 1
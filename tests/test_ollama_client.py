@@ -0,0 +1,144 @@
+# tests/test_ollama_client.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import asyncio
+import socket
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+import metrics
+from fake_llm import DEFAULT_REPLY, FakeBehaviour, start_fake_llm
+from ollama_client import ChatStream, OllamaClient, OllamaError, build_request, model_name
+
+MESSAGES = [{"role": "user", "content": "Hola"}]
+
+
+@pytest.fixture
+def fake_llm():
+    """Servidor falso compatible con Ollama en un puerto libre: devuelve (comportamiento, api_base)."""
+    behaviour = FakeBehaviour()
+    server, api_base = start_fake_llm(behaviour=behaviour)
+    yield behaviour, api_base
+    server.shutdown()
+    server.server_close()
+
+
+def _run(api_base, coro_fn):
+    """Ejecuta coro_fn(client) en su propio event loop y cierra la sesión al acabar."""
+    async def main():
+        client = OllamaClient(api_base)
+        try:
+            return await coro_fn(client)
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+
+# --- PETICIÓN ---
+
+@pytest.mark.parametrize("model, expected", [
+    ("ollama/phi3.5:3.8b", "phi3.5:3.8b"),
+    ("ollama_chat/llama3", "llama3"),
+    ("phi3.5:3.8b", "phi3.5:3.8b"),
+    ("gemini/gemini-2.5-flash", "gemini/gemini-2.5-flash"),
+])
+def test_model_name_drops_the_litellm_provider(model, expected):
+    assert model_name(model) == expected
+
+
+def test_build_request_only_sends_what_is_set():
+    assert build_request("ollama/phi3", MESSAGES, stream=False) == {
+        "model": "phi3", "messages": MESSAGES, "stream": False}
+    body = build_request("ollama/phi3", MESSAGES, stream=True, format="json", keep_alive="30m",
+                         num_ctx=4096, options={"temperature": 0.7})
+    assert body["format"] == "json"
+    assert body["keep_alive"] == "30m"
+    assert body["options"] == {"temperature": 0.7, "num_ctx": 4096}
+
+
+# --- RESPUESTAS ---
+
+def test_achat_returns_the_text_and_reports_stats(fake_llm):
+    _, api_base = fake_llm
+    received = []
+    text = _run(api_base, lambda client: client.achat("ollama/fake", MESSAGES, timeout=5,
+                                                        on_stats=received.append))
+    assert text == DEFAULT_REPLY
+    assert metrics.get("ollama_requests_total") == 1
+    assert len(received) == 1
+    assert received[0]["eval_tokens"] == len(DEFAULT_REPLY) // 4
+    assert received[0]["request_seconds"] >= 0
+
+
+def test_streaming_yields_every_fragment(fake_llm):
+    behaviour, api_base = fake_llm
+    behaviour.chunk_size = 5
+
+    async def consume(client):
+        stream = await client.achat("ollama/fake", MESSAGES, timeout=5, stream=True)
+        assert isinstance(stream, ChatStream)
+        pieces = [piece async for piece in stream]
+        return pieces, stream.stats
+
+    pieces, stats = _run(api_base, consume)
+    assert "".join(pieces) == DEFAULT_REPLY
+    assert len(pieces) == -(-len(DEFAULT_REPLY) // 5)
+    assert stats is not None and "eval_seconds" in stats
+    assert metrics.get("ollama_requests_total") == 1
+
+
+def test_connections_are_reused_between_requests(fake_llm):
+    _, api_base = fake_llm
+
+    async def several(client):
+        for _ in range(3):
+            await client.achat("ollama/fake", MESSAGES, timeout=5)
+        stream = await client.achat("ollama/fake", MESSAGES, timeout=5, stream=True)
+        async for _ in stream:
+            pass
+        await client.achat("ollama/fake", MESSAGES, timeout=5)
+
+    _run(api_base, several)
+    assert metrics.get("ollama_requests_total") == 5
+    assert metrics.get("ollama_connections_opened_total") == 1
+
+
+# --- ERRORES ---
+
+def test_error_status_raises_ollama_error(fake_llm):
+    behaviour, api_base = fake_llm
+    behaviour.error_rate = 1.0
+    behaviour.error_status = 503
+    with pytest.raises(OllamaError) as info:
+        _run(api_base, lambda client: client.achat("ollama/fake", MESSAGES, timeout=5))
+    assert info.value.status_code == 503
+    assert "fake error" in str(info.value)
+    assert metrics.get("ollama_requests_total") == 0
+
+
+def test_unreachable_server_raises_connection_error():
+    # Un puerto que estaba libre hace un momento: nadie escucha en él
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    with pytest.raises(ConnectionError):
+        _run(f"http://127.0.0.1:{port}", lambda client: client.achat("ollama/fake", MESSAGES, timeout=5))
+
+
+def test_aclose_closes_the_session_of_the_loop(fake_llm):
+    _, api_base = fake_llm
+
+    async def main():
+        client = OllamaClient(api_base)
+        await client.achat("ollama/fake", MESSAGES, timeout=5)
+        session = client._http()
+        await client.aclose()
+        return client, session
+
+    client, session = asyncio.run(main())
+    assert session.closed
+    assert client._sessions == {}
@@ -0,0 +1,86 @@
+# tests/test_persistence.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import threading
+import time
+
+import pytest
+
+import metrics
+from persistence import WriteBehindWriter, atomic_write_text
+
+
+@pytest.fixture
+def writer():
+    writer = WriteBehindWriter(maxsize=2, name="novia-writer-test")
+    yield writer
+    writer.close()
+
+
+def _blocked(writer):
+    """Ocupa el hilo de persistencia hasta que se suelte el evento devuelto."""
+    release, started = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+
+    writer.submit(None, job)
+    assert started.wait(5)
+    return release
+
+
+def test_atomic_write_replaces_without_leaving_temporaries(tmp_path):
+    path = tmp_path / "memoria.json"
+    atomic_write_text(path, "uno")
+    atomic_write_text(path, "dos")
+    assert path.read_text(encoding="utf-8") == "dos"
+    assert [p.name for p in tmp_path.iterdir()] == ["memoria.json"]
+
+
+def test_jobs_with_the_same_key_are_coalesced(writer):
+    done = []
+    release = _blocked(writer)
+    for i in range(5):
+        writer.submit(("memory", "memoria.json"), lambda i=i: done.append(i))
+    release.set()
+    writer.flush()
+    assert done == [4]
+
+
+def test_submit_never_blocks_when_the_queue_is_full(writer):
+    done = []
+    release = _blocked(writer)
+    started = time.perf_counter()
+    for i in range(20):
+        writer.submit(None, lambda i=i: done.append(i))
+    writer.submit(("memory", "memoria.json"), lambda: done.append("memoria"))
+    writer.submit(("memory", "memoria.json"), lambda: done.append("memoria final"))
+    assert time.perf_counter() - started < 0.5
+    assert metrics.get("persistence_queue_overflow_total") == 19
+    release.set()
+    # flush espera también a los desbordados, y todo sale en orden
+    writer.flush()
+    assert done == [*range(20), "memoria final"]
+
+
+def test_errors_do_not_stop_the_thread(writer):
+    done = []
+
+    def broken():
+        raise OSError("disco lleno")
+
+    writer.submit(None, broken)
+    writer.submit(None, lambda: done.append("después"))
+    writer.flush()
+    assert done == ["después"]
+
+
+def test_after_close_jobs_run_inline():
+    writer = WriteBehindWriter(maxsize=2)
+    writer.close()
+    done = []
+    writer.submit(None, lambda: done.append(threading.current_thread().name))
+    assert done == [threading.current_thread().name]
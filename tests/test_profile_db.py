@@ -0,0 +1,148 @@
+# tests/test_profile_db.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import json
+import sqlite3
+
+import pytest
+
+from memory_store import MemoryStore
+from profile_db import SqliteProfileStore, main as profile_db_main
+
+MEMORIA = {
+    "novio": {"nombre": "Ricardo", "detalles": ["toca la guitarra"],
+              "perfil": {"gustos": ["gatos"], "disgustos": [], "hechos": []},
+              "resumen_conversacion": "Hablamos de gatos.", "alias": ["Richy"]},
+    "exnovios": [{"nombre": "Luis", "detalles": [], "perfil": {"gustos": [], "disgustos": ["lunes"], "hechos": []},
+                  "resumen_conversacion": ""}],
+    "conocidos": [{"nombre": "Jürgen Weiß", "detalles": [], "perfil": {"gustos": [], "disgustos": [], "hechos": []},
+                   "resumen_conversacion": ""}],
+}
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    path = tmp_path / "memoria.json"
+    path.write_text(json.dumps(MEMORIA, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def db(tmp_path, legacy):
+    store = SqliteProfileStore(tmp_path / "memoria.db", legacy_json=legacy, timeout=0.2)
+    yield store
+    store.close()
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path, legacy):
+    """Los dos almacenes de perfiles, con el mismo contrato."""
+    if request.param == "json":
+        yield MemoryStore(legacy)
+    else:
+        store = SqliteProfileStore(tmp_path / "memoria.db", legacy_json=legacy, timeout=0.2)
+        yield store
+        store.close()
+
+
+# --- MIGRACIÓN Y EXPORTACIÓN ---
+
+def test_migrates_memoria_json_once(db, legacy, tmp_path):
+    assert db.data() == MEMORIA
+    db.add_person("Ana")
+    db.close()
+    # Al reabrir no se vuelve a importar (Ana sigue y no hay duplicados)
+    reopened = SqliteProfileStore(tmp_path / "memoria.db", legacy_json=legacy)
+    document = reopened.data()
+    reopened.close()
+    assert [p["nombre"] for p in document["conocidos"]] == ["Jürgen Weiß", "Ana"]
+
+
+def test_export_round_trips(db, tmp_path):
+    target = tmp_path / "exportado.json"
+    assert db.export_json(target) == 3
+    assert json.loads(target.read_text(encoding="utf-8")) == MEMORIA
+
+
+def test_command_line_migrate_and_export(tmp_path, legacy):
+    target = tmp_path / "exportado.json"
+    assert profile_db_main(["--db", str(tmp_path / "cli.db"), "migrate", str(legacy)]) == 0
+    assert profile_db_main(["--db", str(tmp_path / "cli.db"), "export", str(target)]) == 0
+    assert json.loads(target.read_text(encoding="utf-8")) == MEMORIA
+
+
+# --- TRANSACCIONES (WAL) ---
+
+def test_reads_do_not_wait_for_another_writer(db, tmp_path):
+    other = sqlite3.connect(str(tmp_path / "memoria.db"), timeout=0.2, isolation_level=None)
+    try:
+        other.execute("BEGIN IMMEDIATE")
+        other.execute("UPDATE people SET resumen = 'otra instancia' WHERE nombre = 'Luis'")
+        assert db.find_person("Ricardo")[0] == "novio"
+        # Escribir sí espera al lock y, pasado el timeout, falla
+        with pytest.raises(sqlite3.OperationalError):
+            db.add_person("Ana")
+        other.execute("COMMIT")
+    finally:
+        other.close()
+    generation = db.generation
+    assert db.get_summary("Luis") == "otra instancia"
+    assert db.generation > generation
+
+
+def test_writing_inside_a_read_transaction_is_an_error(db):
+    with db.read():
+        with pytest.raises(RuntimeError):
+            db.add_person("Ana")
+    assert db.find_person("Ana") == (None, None)
+
+
+def test_failed_transaction_rolls_back(db):
+    with pytest.raises(ValueError):
+        with db.transaction():
+            db.add_person("Ana")
+            raise ValueError("a medias")
+    assert db.find_person("Ana") == (None, None)
+
+
+# --- MISMO CONTRATO EN LOS DOS ALMACENES ---
+
+@pytest.mark.parametrize("name", ["ricardo", " RICARDO ", "jürgen weiss", "JÜRGEN WEISS"])
+def test_names_match_case_insensitively(store, name):
+    # casefold: 'ß' y 'ss' son el mismo nombre en los dos almacenes
+    category, person = store.find_person(name)
+    assert person is not None
+    assert not store.add_person(name)
+
+
+def test_person_names_include_aliases(store):
+    assert sorted(store.person_names()) == [("Jürgen Weiß", ["Jürgen Weiß"]), ("Luis", ["Luis"]),
+                                            ("Ricardo", ["Ricardo", "Richy"])]
+    assert store.novio_name() == "Ricardo"
+
+
+def test_profile_items_are_consolidated(store):
+    added = store.add_profile_items("Ricardo", {"gustos": ["Gatos", "el café"], "hechos": ["vive en Lima"]})
+    assert ("gustos", "el café") in added and ("hechos", "vive en Lima") in added
+    assert not any(item == "Gatos" for _, item in added)
+    assert store.find_person("Ricardo")[1]["perfil"]["gustos"][-1] == "el café"
+
+
+def test_end_session_saves_the_summary_and_demotes_the_novio(store):
+    assert store.end_session("luis", "Hablamos de lunes.", demote=True)
+    assert store.get_summary("Luis") == "Hablamos de lunes."
+    assert store.end_session("RICARDO", "Adiós.", demote=False)
+    assert store.novio_name() == "Ricardo"
+    assert store.end_session("Ricardo", "Adiós.")
+    assert store.novio_name() is None
+    assert store.find_person("Ricardo")[0] == "exnovios"
+    assert not store.end_session("Nadie", "resumen")
+
+
+def test_promote_ex(store):
+    assert store.promote_ex("LUIS")
+    assert store.novio_name() == "Luis"
+    assert store.find_person("Ricardo")[0] == "exnovios"
+    assert not store.promote_ex("Jürgen Weiß")
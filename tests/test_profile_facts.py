@@ -0,0 +1,118 @@
+# tests/test_profile_facts.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import json
+
+from profile_facts import MENTIONS_KEY, FactIndex, compact_document, consolidate, main, normalize_fact
+
+
+# --- NORMALIZACIÓN ---
+
+def test_filler_words_and_accents_are_removed():
+    assert normalize_fact("Le gusta Linux")[0] == normalize_fact("LINUX")[0] == "linux"
+    assert normalize_fact("la comida picante mexicana")[0] == normalize_fact("Comida mexicana, picante")[0]
+    assert normalize_fact("Ama la música")[0] == "musica"
+
+
+def test_guard_keeps_numbers_and_negation_apart():
+    assert normalize_fact("tiene 2 gatos")[1] != normalize_fact("tiene 3 gatos")[1]
+    # La negación solo cuenta en los hechos: en disgustos la da el campo
+    assert normalize_fact("no fuma", keep_negation=True)[0] == "no fuma"
+    assert normalize_fact("no fuma")[0] == "fuma"
+
+
+def test_fact_index_finds_near_duplicates_only_with_the_same_guard():
+    index = FactIndex(threshold=0.8)
+    key, guard = normalize_fact("leer novelas de ciencia ficción")
+    index.add(0, key, guard)
+    assert index.find(*normalize_fact("leer novela de ciencia ficcion")) == 0
+    assert index.find(*normalize_fact("leer novelas de terror")) is None
+    assert index.find(normalize_fact("leer 2 novelas de ciencia ficción")[0], (False, ("2",))) is None
+    index.remove(0)
+    assert index.find(key, guard) is None
+
+
+# --- FUSIÓN ---
+
+def test_rephrasings_add_mentions_instead_of_items():
+    result = consolidate("gustos", ["Linux"], ["Le gusta Linux", "Ama Linux"])
+    assert result.items == ["Linux"]
+    assert result.counts == {"linux": 3}
+    assert result.added == [] and result.merged == 2
+
+
+def test_near_duplicates_keep_the_shortest_wording_as_most_recent():
+    result = consolidate("gustos", ["leer novelas de ciencia ficción", "el café"],
+                         ["Le encanta leer novela de ciencia ficcion"])
+    assert result.items == ["el café", "leer novelas de ciencia ficción"]
+    assert result.counts == {"ciencia ficcion leer novelas": 2}
+    assert result.added == []
+
+
+def test_different_facts_are_not_merged():
+    result = consolidate("hechos", ["tiene 2 gatos", "fuma"], ["tiene 3 gatos", "no fuma", "vive en Lima"])
+    assert result.items == ["tiene 2 gatos", "fuma", "tiene 3 gatos", "no fuma", "vive en Lima"]
+    assert result.added == ["tiene 3 gatos", "no fuma", "vive en Lima"]
+    assert result.merged == 0
+
+
+def test_existing_duplicates_are_merged_with_their_mentions():
+    result = consolidate("gustos", ["Linux", "gatos", "le gusta linux"], counts={"linux": 4})
+    # Cada copia aporta las menciones guardadas para su clave
+    assert result.items == ["gatos", "Linux"]
+    assert result.counts == {"linux": 8}
+
+
+def test_threshold_controls_what_counts_as_the_same():
+    items = ["leer novelas de ciencia ficción"]
+    assert len(consolidate("gustos", items, ["leer novela de ciencia ficcion"], threshold=0.8).items) == 1
+    assert len(consolidate("gustos", items, ["leer novela de ciencia ficcion"], threshold=0.95).items) == 2
+
+
+# --- LÍMITE POR CAMPO ---
+
+def test_max_items_keeps_new_and_often_mentioned_facts():
+    old = [f"dato antiguo {word}" for word in ("alfa", "beta", "gamma", "delta", "epsilon")]
+    result = consolidate("hechos", old, ["dato nuevo"], counts={"alfa antiguo dato": 7}, max_items=3)
+    assert "dato nuevo" in result.items
+    assert "dato antiguo alfa" in result.items
+    assert len(result.items) == 3
+    assert sorted(result.dropped) == sorted(set(old) - set(result.items))
+
+
+# --- DOCUMENTO COMPLETO ---
+
+def _document():
+    return {
+        "novio": {"nombre": "Ricardo", "perfil": {"gustos": ["Linux", "le gusta linux", "ama Linux"],
+                                                   "disgustos": [], "hechos": ["vive en Lima"]}},
+        "exnovios": [],
+        "conocidos": [{"nombre": "Ana", "perfil": {"gustos": ["gatos"], "disgustos": [], "hechos": []},
+                       MENTIONS_KEY: {"gustos": {"perros": 3}}}],
+    }
+
+
+def test_compact_document_reports_items_and_tokens():
+    document = _document()
+    stats = compact_document(document, ("gustos", "disgustos", "hechos"), max_items=10)
+    assert stats["people"] == 2
+    assert (stats["items_before"], stats["items_after"]) == (5, 3)
+    assert stats["tokens_after"] < stats["tokens_before"]
+    assert document["novio"]["perfil"]["gustos"] == ["Linux"]
+    assert document["novio"][MENTIONS_KEY] == {"gustos": {"linux": 3}}
+    # Menciones de datos que ya no están: se limpian
+    assert MENTIONS_KEY not in document["conocidos"][0]
+
+
+def test_command_line_dry_run_and_backup(tmp_path, capsys):
+    path = tmp_path / "memoria.json"
+    path.write_text(json.dumps(_document(), ensure_ascii=False), encoding="utf-8")
+    original = path.read_text(encoding="utf-8")
+    assert main([str(path), "--dry-run"]) == 0
+    assert path.read_text(encoding="utf-8") == original
+    assert "datos 5 -> 3" in capsys.readouterr().out
+    assert main([str(path)]) == 0
+    assert (tmp_path / "memoria.json.bak").read_text(encoding="utf-8") == original
+    assert json.loads(path.read_text(encoding="utf-8"))["novio"]["perfil"]["gustos"] == ["Linux"]
@@ -0,0 +1,204 @@
+# tests/test_resilience.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import asyncio
+
+import pytest
+
+import brain
+import metrics
+import resilience
+from config import Config
+
+
+class FakeClock:
+    """Sustituye time.monotonic en resilience para avanzar el tiempo a mano."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", fake)
+    return fake
+
+
+@pytest.fixture(autouse=True)
+def _reset_breakers(monkeypatch):
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(resilience, "_latencies", {})
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+# --- ERRORES REINTENTABLES Y BACKOFF ---
+
+@pytest.mark.parametrize("exc", [
+    asyncio.TimeoutError(), TimeoutError(), ConnectionError(), HTTPError(429), HTTPError(503),
+    type("RateLimitError", (Exception,), {})(),
+])
+def test_transient_errors_are_retryable(exc):
+    assert resilience.is_retryable(exc)
+
+
+@pytest.mark.parametrize("exc", [HTTPError(400), HTTPError(401), ValueError("no es JSON"), KeyError("x")])
+def test_permanent_errors_are_not_retryable(exc):
+    assert not resilience.is_retryable(exc)
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    for attempt in range(8):
+        for _ in range(50):
+            delay = resilience.backoff_delay(attempt, base=0.5, cap=4.0)
+            assert 0 <= delay <= min(4.0, 0.5 * 2 ** attempt)
+
+
+def test_brain_backoff_never_exceeds_the_turn_budget(clock, monkeypatch):
+    monkeypatch.setattr(Config, "RETRY_BACKOFF_BASE", 10.0)
+    monkeypatch.setattr(Config, "RETRY_BACKOFF_CAP", 60.0)
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: high)
+    budget = resilience.TurnBudget(3.0)
+    clock.now += 1.0
+    assert brain._backoff(2, budget) == pytest.approx(2.0)
+    assert metrics.get("llm_backoff_total") == 1
+
+
+# --- PRESUPUESTO DEL TURNO ---
+
+def test_turn_budget_limits_each_attempt(clock):
+    budget = resilience.TurnBudget(10.0)
+    assert budget.attempt_timeout(4.0) == 4.0
+    clock.now += 8.0
+    assert budget.elapsed() == pytest.approx(8.0)
+    assert budget.attempt_timeout(4.0) == pytest.approx(2.0)
+    assert not budget.expired
+    clock.now += 5.0
+    assert budget.remaining() == 0.0
+    assert budget.attempt_timeout(4.0) == 0.0
+    assert budget.expired
+
+
+# --- CIRCUIT BREAKER ---
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = resilience.CircuitBreaker("ollama", failure_threshold=3, reset_timeout=30.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.available()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.available()
+    assert metrics.get("llm_circuit_opened_total") == 1
+
+
+def test_breaker_half_open_probe(clock):
+    breaker = resilience.CircuitBreaker("ollama", failure_threshold=1, reset_timeout=30.0)
+    breaker.record_failure()
+    clock.now += 29.0
+    assert breaker.state == "open"
+    clock.now += 1.0
+    assert breaker.state == "half_open"
+    assert breaker.available()
+    # La prueba falla: vuelve a abrirse otros reset_timeout segundos
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 30.0
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_latency_percentile_needs_enough_samples():
+    tracker = resilience.LatencyTracker(window=10, min_samples=5)
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        tracker.record(seconds)
+    assert tracker.percentile(95, default=2.0) == 2.0
+    tracker.record(1.0)
+    assert tracker.percentile(95) == 1.0
+    assert tracker.percentile(50) == 0.3
+
+
+# --- FALLBACK ENTRE BACKENDS ---
+
+def test_backend_order_skips_open_circuits(monkeypatch):
+    monkeypatch.setattr(Config, "USE_OLLAMA", True)
+    monkeypatch.setattr(Config, "BACKEND_FALLBACK", True)
+    monkeypatch.setattr(Config, "GEMINI_API_KEY", "clave", raising=False)
+    monkeypatch.setattr(Config, "CIRCUIT_FAILURE_THRESHOLD", 1)
+    assert brain._backend_order() == ["ollama", "gemini"]
+    brain._breaker("ollama").record_failure()
+    assert brain._backend_order() == ["gemini"]
+    brain._breaker("gemini").record_failure()
+    with pytest.raises(resilience.CircuitOpenError):
+        brain._backend_order()
+
+
+def test_backend_order_without_fallback(monkeypatch):
+    monkeypatch.setattr(Config, "USE_OLLAMA", False)
+    monkeypatch.setattr(Config, "BACKEND_FALLBACK", False)
+    assert brain._backend_order() == ["gemini"]
+
+
+def _starter(result=None, error=None, delay=0.0, log=None, name=""):
+    async def start():
+        if log is not None:
+            log.append(f"{name}:start")
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(f"{name}:cancelled")
+            raise
+        if error is not None:
+            raise error
+        return result
+    return start
+
+
+def test_hedged_returns_the_primary_when_it_answers():
+    log = []
+    starters = [_starter("ollama", log=log, name="a"), _starter("gemini", log=log, name="b")]
+    assert asyncio.run(resilience.hedged(starters, hedge_delay=None)) == "ollama"
+    assert log == ["a:start"]
+    assert metrics.get("llm_hedged_total") == 0
+
+
+def test_hedged_falls_back_when_the_primary_fails():
+    starters = [_starter(error=ConnectionError("caído")), _starter("gemini")]
+    assert asyncio.run(resilience.hedged(starters, hedge_delay=None)) == "gemini"
+    assert metrics.get("llm_hedged_total") == 1
+
+
+def test_hedged_raises_the_last_error_when_everything_fails():
+    starters = [_starter(error=ConnectionError("uno")), _starter(error=HTTPError(503))]
+    with pytest.raises(HTTPError):
+        asyncio.run(resilience.hedged(starters, hedge_delay=None))
+
+
+def test_hedged_races_a_slow_primary_and_cancels_the_loser():
+    log = []
+    starters = [_starter("lento", delay=5.0, log=log, name="a"), _starter("rápido", delay=0.01, log=log, name="b")]
+    assert asyncio.run(resilience.hedged(starters, hedge_delay=0.05)) == "rápido"
+    assert log == ["a:start", "b:start", "a:cancelled"]
+
+
+def test_hedged_keeps_waiting_for_the_primary_without_hedging():
+    log = []
+    starters = [_starter("lento", delay=0.1, log=log, name="a"), _starter("otro", log=log, name="b")]
+    assert asyncio.run(resilience.hedged(starters, hedge_delay=None)) == "lento"
+    assert log == ["a:start"]
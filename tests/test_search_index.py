@@ -0,0 +1,121 @@
+# tests/test_search_index.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import pytest
+
+import search_index
+from history_log import HistoryLog
+from search_index import BM25Index, open_index
+
+
+@pytest.fixture(params=["numpy", "python"])
+def scoring(request, monkeypatch):
+    """Las dos implementaciones de la puntuación tienen que dar lo mismo."""
+    if request.param == "python":
+        monkeypatch.setattr(search_index, "_numpy", lambda: None)
+    return request.param
+
+
+@pytest.fixture
+def index(tmp_path, scoring):
+    return BM25Index(tmp_path / "indice.pkl", snapshot_every=0)
+
+
+def _log(tmp_path, messages):
+    log = HistoryLog(tmp_path / "historial.jsonl", tmp_path / "historial.idx", fsync=False)
+    for message in messages:
+        log.append({"mensaje_usuario": message, "respuesta_ia": ""})
+    return log
+
+
+# --- RANKING ---
+
+def test_rare_terms_and_short_documents_rank_higher(index):
+    index.add(0, "gatos perros gatos")
+    index.add(1, "perros perros parque paseo largo domingo")
+    index.add(2, "gatos")
+    index.add(3, "perros parque")
+    assert [doc_id for _, doc_id in index.search("gatos", limit=5)] == [2, 0]
+    # 'gatos' aparece en menos documentos que 'perros': pesa más
+    assert index.search("gatos perros", limit=1)[0][1] == 0
+
+
+def test_ties_are_broken_by_recency(index):
+    for doc_id in range(4):
+        index.add(doc_id, "hablamos del concierto")
+    assert [doc_id for _, doc_id in index.search("concierto", limit=2)] == [3, 2]
+
+
+def test_query_is_normalized_like_the_documents(index):
+    index.add(0, "Mañana vamos a la CANCIÓN del café")
+    index.add(1, "nada que ver")
+    assert [doc_id for _, doc_id in index.search("cancion cafe", limit=3)] == [0]
+    # Palabras vacías o demasiado cortas no buscan nada
+    assert index.search("de la y", limit=3) == []
+    assert index.search("", limit=3) == []
+    assert index.search("cancion", limit=0) == []
+
+
+def test_scores_are_normalized_between_zero_and_one(index):
+    for doc_id, text in enumerate(["gatos", "gatos gatos gatos gatos", "perros gatos parque", "lluvia"]):
+        index.add(doc_id, text)
+    results = index.search("gatos lluvia perros", limit=5)
+    assert results and all(0.0 < score <= 1.0 for score, _ in results)
+    assert results == sorted(results, reverse=True)
+
+
+def test_numpy_and_python_give_the_same_scores(tmp_path, monkeypatch):
+    index = BM25Index(tmp_path / "indice.pkl", snapshot_every=0)
+    for doc_id in range(60):
+        index.add(doc_id, f"mensaje {doc_id % 7} gatos " + "perros " * (doc_id % 5) + ("parque" if doc_id % 3 else ""))
+    vectorized = index.search("gatos perros parque", limit=10)
+    monkeypatch.setattr(search_index, "_numpy", lambda: None)
+    assert index.search("gatos perros parque", limit=10) == pytest.approx(vectorized)
+
+
+# --- LÍMITE DE POSTINGS ---
+
+def test_frequent_terms_only_scan_the_latest_postings(tmp_path, scoring):
+    index = BM25Index(tmp_path / "indice.pkl", snapshot_every=0, max_postings_scan=3)
+    for doc_id in range(10):
+        index.add(doc_id, "hola" if doc_id % 2 else "hola hola hola")
+    assert sorted(doc_id for _, doc_id in index.search("hola", limit=10)) == [7, 8, 9]
+
+
+def test_ids_with_gaps_keep_their_place(index):
+    index.add(0, "gatos")
+    index.add(3, "gatos perros")
+    assert len(index) == 4
+    assert [doc_id for _, doc_id in index.search("perros")] == [3]
+
+
+# --- PERSISTENCIA ---
+
+def test_open_index_catches_up_with_the_log(tmp_path, scoring):
+    log = _log(tmp_path, ["me gustan los gatos", "prefiero los perros"])
+    snapshot = tmp_path / "indice.pkl"
+    assert len(open_index(snapshot, log)) == 2
+    log.append({"mensaje_usuario": "un gato negro", "respuesta_ia": "los gatos son geniales"})
+    index = open_index(snapshot, log)
+    assert len(index) == 3
+    assert sorted(doc_id for _, doc_id in index.search("gatos", limit=5)) == [0, 2]
+
+
+def test_open_index_rebuilds_when_the_log_was_archived(tmp_path, scoring):
+    log = _log(tmp_path, ["gatos", "perros", "gatos y perros"])
+    snapshot = tmp_path / "indice.pkl"
+    open_index(snapshot, log)
+    log.drop_before(2)
+    index = open_index(snapshot, log)
+    assert index.base == 2
+    assert [doc_id for _, doc_id in index.search("gatos perros")] == [2]
+
+
+def test_invalid_snapshot_is_rebuilt(tmp_path, scoring):
+    log = _log(tmp_path, ["gatos", "perros"])
+    snapshot = tmp_path / "indice.pkl"
+    snapshot.write_bytes(b"no es un pickle")
+    index = open_index(snapshot, log)
+    assert [doc_id for _, doc_id in index.search("perros")] == [1]
@@ -0,0 +1,106 @@
+# tests/test_server.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import asyncio
+import json
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+import memory
+from config import Config
+from server import create_app
+
+MEMORIA = {
+    "novio": {},
+    "exnovios": [
+        {"nombre": "Ricardo", "detalles": [], "perfil": {"gustos": ["gatos"], "disgustos": [], "hechos": []},
+         "resumen_conversacion": "Ricardo me habló de sus gatos."},
+        {"nombre": "Luis", "detalles": [], "perfil": {"gustos": [], "disgustos": [], "hechos": []},
+         "resumen_conversacion": ""},
+    ],
+    "conocidos": [],
+}
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def server_env(request, data_dir, fake_ollama, monkeypatch):
+    """Memoria de prueba en cada backend de perfiles, con el LLM falso."""
+    (data_dir / "memoria.json").write_text(json.dumps(MEMORIA, ensure_ascii=False), encoding="utf-8")
+    monkeypatch.setattr(Config, "PROFILE_BACKEND", request.param)
+    monkeypatch.setattr(Config, "SUMMARY_EVERY_N_TURNS", 50)
+
+
+async def _with_server(scenario):
+    runner = web.AppRunner(create_app(max_sessions=10))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        async with aiohttp.ClientSession(f"http://127.0.0.1:{port}") as http:
+            return await scenario(http)
+    finally:
+        await runner.cleanup()
+
+
+async def _open(http, name):
+    async with http.post("/sessions", json={"nombre": name}) as response:
+        assert response.status == 201
+        return await response.json()
+
+
+async def _say(http, session_id, text):
+    async with http.post(f"/sessions/{session_id}/messages", json={"texto": text}) as response:
+        assert response.status == 200
+        reply = await response.json()
+        assert "error" not in reply
+        return reply
+
+
+def test_two_sessions_keep_their_own_memory(server_env):
+    async def scenario(http):
+        a = await _open(http, "Ricardo")
+        b = await _open(http, "Luis")
+        assert a["categoria"] == b["categoria"] == "exnovios"
+        await _say(http, a["session_id"], "Hola, soy Ricardo y sigo con mis gatos")
+        await _say(http, b["session_id"], "Hola, soy Luis")
+        # Ninguna sesión ocupa el hueco de novio: el contexto de Ricardo no habla de Luis
+        context, _ = await asyncio.to_thread(memory.select_memory_context, "Ricardo", [])
+        assert "Luis" not in context
+        async with http.delete(f"/sessions/{a['session_id']}") as response:
+            assert response.status == 204
+        ricardo = memory.get_person("Ricardo")
+        async with http.delete(f"/sessions/{b['session_id']}") as response:
+            assert response.status == 204
+        return ricardo
+
+    category, ricardo = asyncio.run(_with_server(scenario))
+    assert category == "exnovios"
+    assert ricardo["resumen_conversacion"].startswith("Ricardo me habló de sus gatos. Él: Hola, soy Ricardo")
+    luis_category, luis = memory.get_person("Luis")
+    assert luis_category == "exnovios"
+    assert luis["resumen_conversacion"].startswith("Él: Hola, soy Luis")
+    assert not memory.load_memory()["novio"]
+
+
+def test_single_user_session_still_promotes_and_demotes_the_ex(data_dir):
+    from chat_session import ChatSession
+
+    (data_dir / "memoria.json").write_text(json.dumps(MEMORIA, ensure_ascii=False), encoding="utf-8")
+
+    async def main():
+        session = ChatSession()
+        greeting = await session.identify("Ricardo")
+        promoted = memory.get_person("Ricardo")[0]
+        await session.close()
+        return greeting, promoted
+
+    greeting, promoted = asyncio.run(main())
+    assert greeting.category == "exnovios"
+    assert promoted == "novio"
+    assert memory.get_person("Ricardo")[0] == "exnovios"
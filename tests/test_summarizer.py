@@ -0,0 +1,115 @@
+# tests/test_summarizer.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import asyncio
+
+import metrics
+from summarizer import RollingSummarizer, plain_summary
+
+
+def _turn(i):
+    return [{"role": "user", "content": f"pregunta {i}"}, {"role": "assistant", "content": f"respuesta {i}"}]
+
+
+class SlowSummary:
+    """Resumidor falso que espera a que la prueba lo suelte (para cambiar de sesión mientras resume)."""
+
+    def __init__(self, result="resumen nuevo"):
+        self.result = result
+        self.release = asyncio.Event()
+        self.calls = []
+
+    async def __call__(self, messages, previous):
+        self.calls.append((list(messages), previous))
+        await self.release.wait()
+        return self.result
+
+
+def test_fold_integrates_only_the_summarized_batch():
+    async def main():
+        summarize = SlowSummary()
+        summarizer = RollingSummarizer(1, summarize=summarize)
+        summarizer.start("antes")
+        for message in _turn(1):
+            summarizer.add(message)
+        assert summarizer.should_fold()
+        fold = asyncio.ensure_future(summarizer.fold())
+        await asyncio.sleep(0)
+        # Llega otro turno mientras se resume: sigue pendiente después
+        for message in _turn(2):
+            summarizer.add(message)
+        summarize.release.set()
+        assert await fold == "resumen nuevo"
+        return summarizer, summarize
+
+    summarizer, summarize = asyncio.run(main())
+    assert summarize.calls == [(_turn(1), "antes")]
+    assert summarizer.pending == 2
+
+
+def test_start_during_fold_discards_the_previous_session_result():
+    async def main():
+        summarize = SlowSummary("resumen de Ricardo")
+        summarizer = RollingSummarizer(1, summarize=summarize)
+        summarizer.start("de Ricardo")
+        for message in _turn(1):
+            summarizer.add(message)
+        fold = asyncio.ensure_future(summarizer.fold())
+        await asyncio.sleep(0)
+        # Otra sesión empieza antes de que termine el resumen
+        summarizer.start("de Luis")
+        summarizer.add({"role": "user", "content": "hola, soy Luis"})
+        summarize.release.set()
+        await fold
+        return summarizer
+
+    summarizer = asyncio.run(main())
+    assert summarizer.summary == "de Luis"
+    assert summarizer.pending == 1
+    assert metrics.get("summary_discarded_total") == 1
+
+
+def test_failures_back_off():
+    async def fail(messages, previous):
+        raise ConnectionError("caído")
+
+    async def main():
+        summarizer = RollingSummarizer(1, summarize=fail)
+        summarizer.start("")
+        for message in _turn(1):
+            summarizer.add(message)
+        await summarizer.fold()
+        return summarizer
+
+    summarizer = asyncio.run(main())
+    assert not summarizer.should_fold()
+    assert summarizer.pending == 2
+    assert metrics.get("summary_failures_total") == 1
+
+
+def test_pending_is_capped_with_a_plain_summary():
+    summarizer = RollingSummarizer(1, max_pending=4)
+    summarizer.start("")
+    for i in range(3):
+        for message in _turn(i):
+            summarizer.add(message)
+    assert summarizer.pending == 4
+    assert summarizer.summary == "Él: pregunta 0 Yo: respuesta 0"
+
+
+def test_close_keeps_the_unsummarized_messages():
+    summarizer = RollingSummarizer(5)
+    summarizer.start("Hablamos de gatos.")
+    for message in _turn(1):
+        summarizer.add(message)
+    assert summarizer.close() == "Hablamos de gatos. Él: pregunta 1 Yo: respuesta 1"
+    assert summarizer.pending == 0
+    assert summarizer.close() == "Hablamos de gatos. Él: pregunta 1 Yo: respuesta 1"
+
+
+def test_plain_summary_keeps_the_most_recent_characters():
+    text = plain_summary("x" * 50, [{"role": "user", "content": "y" * 80}], limit=40)
+    assert len(text) == 43
+    assert text.startswith("...") and text.endswith("y" * 30)
@@ -0,0 +1,36 @@
+# text_utils.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import re
+import unicodedata
+from typing import List
+
+# Palabras vacías del español (y algunas muletillas de chat) que no aportan a la búsqueda
+SPANISH_STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes aqui asi aun aunque bien cada casi como con contra cual
+cuando de del desde donde dos el ella ellas ello ellos en entre era eran eres es esa esas ese eso esos esta estaba
+estado estan estar estas este esto estos estoy fue fueron fui ha haber habia han has hasta hay he la las le les lo
+los mas me mi mis mucho muy nada ni no nos nosotros o os otra otro para pero poco por porque que quien se sea ser
+si sido sin sobre solo son soy su sus tambien tan tanto te tengo ti tiene tienen todo todos tu tus un una unas uno
+unos usted va vamos yo ya jaja jajaja ok oye pues bueno vale eh ah
+""".split())
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fold_accents(text: str) -> str:
+    """Pasa a minúsculas y quita tildes/diacríticos ('Canción' -> 'cancion')."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def name_key(name: str) -> str:
+    """Clave para comparar nombres de personas: sin mayúsculas (casefold) ni espacios alrededor."""
+    return name.strip().casefold()
+
+
+def tokenize(text: str, min_len: int = 3) -> List[str]:
+    """Tokeniza para búsqueda: minúsculas, sin tildes y sin palabras vacías."""
+    return [w for w in _WORD_RE.findall(fold_accents(text)) if len(w) >= min_len and w not in SPANISH_STOPWORDS]
@@ -0,0 +1,35 @@
+# tokens.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import functools
+import logging
+from typing import Optional
+
+import llm_loader
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens (~4 caracteres por token, suficiente para presupuestos)."""
+    return (len(text) + 3) // 4
+
+
+@functools.lru_cache(maxsize=4096)
+def _model_tokens(model: str, text: str) -> int:
+    return llm_loader.get().token_counter(model=model, text=text)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Tokens de `text` con el tokenizador del modelo (litellm.token_counter). Mientras
+    litellm no esté cargado, o si el tokenizador falla, se usa estimate_tokens: contar
+    nunca debe obligar a importar litellm ni bloquear la interfaz.
+    """
+    if not model or not text or not llm_loader.loaded():
+        return estimate_tokens(text)
+    try:
+        return _model_tokens(model, text)
+    except Exception as e:
+        logging.debug(f"token_counter falló para {model}: {e}")
+        return estimate_tokens(text)
@@ -0,0 +1,256 @@
+# tracing.py
+# NovIA
+# Creador: RichyKunBv
+# Licencia: Apache License 2.0
+
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import metrics
+from persistence import WriteBehindWriter, atomic_write_text
+
+# --- TRAZAS POR TURNO ---
+# Cada turno de chat registra la duración de sus fases (memoria, recuperación, prompt,
+# primer token, generación, parseo, persistencia) y los tokens. Con las trazas apagadas
+# span() devuelve un objeto vacío compartido: una comprobación de un booleano y nada más.
+
+_enabled = False
+_trace_file: Optional[Path] = None
+_prometheus_file: Optional[Path] = None
+_writer = None
+_current: contextvars.ContextVar[Optional["TurnTrace"]] = contextvars.ContextVar("novia_turn", default=None)
+
+PHASE_WINDOW = 500  # Turnos que se guardan por fase para los percentiles de la sesión
+_phases: Dict[str, Deque[float]] = {}
+_phase_counts: Dict[str, int] = {}
+_phase_sums: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+class TurnTrace:
+    """Fases (segundos acumulados por nombre) y atributos de un turno."""
+
+    __slots__ = ("started", "wall_start", "phases", "attrs")
+
+    def __init__(self, attrs: Dict[str, Any]):
+        self.started = time.perf_counter()
+        self.wall_start = time.time()
+        self.phases: Dict[str, float] = {}
+        self.attrs = attrs
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace: TurnTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.trace.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+# --- CONFIGURACIÓN ---
+
+def configure(enabled: bool, trace_file: Optional[Path] = None, prometheus_file: Optional[Path] = None) -> None:
+    """Activa/desactiva las trazas y dónde se exportan (None = no exportar)."""
+    global _enabled, _trace_file, _prometheus_file
+    _enabled = enabled
+    _trace_file = Path(trace_file) if trace_file else None
+    _prometheus_file = Path(prometheus_file) if prometheus_file else None
+
+
+def set_enabled(enabled: bool) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+# --- API DE INSTRUMENTACIÓN ---
+
+def begin_turn(**attrs: Any) -> Optional[TurnTrace]:
+    """Abre la traza de un turno en el contexto actual (las tareas y hilos que lance la heredan)."""
+    if not _enabled:
+        return None
+    trace = TurnTrace(attrs)
+    _current.set(trace)
+    return trace
+
+
+def resume(trace: Optional[TurnTrace]) -> None:
+    """Vuelve a activar un turno en otro contexto (p.ej. el handler que procesa la respuesta)."""
+    if trace is not None:
+        _current.set(trace)
+
+
+def current() -> Optional[TurnTrace]:
+    return _current.get() if _enabled else None
+
+
+def span(name: str):
+    """`with tracing.span("fase"):` mide la fase dentro del turno actual (sin turno, no hace nada)."""
+    if not _enabled:
+        return _NOOP
+    trace = _current.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name)
+
+
+def record(name: str, seconds: float, once: bool = False) -> None:
+    """Añade una duración medida a mano (p.ej. el tiempo hasta el primer token). `once`: solo la primera."""
+    if not _enabled:
+        return
+    trace = _current.get()
+    if trace is not None and not (once and name in trace.phases):
+        trace.add(name, seconds)
+
+
+def set_attr(key: str, value: Any) -> None:
+    if not _enabled:
+        return
+    trace = _current.get()
+    if trace is not None:
+        trace.attrs[key] = value
+
+
+def add_attr(key: str, value: float) -> None:
+    """Suma a un atributo numérico (p.ej. tokens de varios intentos)."""
+    if not _enabled:
+        return
+    trace = _current.get()
+    if trace is not None:
+        trace.attrs[key] = trace.attrs.get(key, 0) + value
+
+
+def end_turn(trace: Optional[TurnTrace]) -> Optional[Dict[str, Any]]:
+    """Cierra el turno: lo suma a las estadísticas de la sesión y lo exporta. Devuelve el registro."""
+    if trace is None:
+        return None
+    if _current.get() is trace:
+        _current.set(None)
+    trace.add("turn", time.perf_counter() - trace.started)
+
+    with _lock:
+        for name, seconds in trace.phases.items():
+            _phases.setdefault(name, deque(maxlen=PHASE_WINDOW)).append(seconds)
+            _phase_counts[name] = _phase_counts.get(name, 0) + 1
+            _phase_sums[name] = _phase_sums.get(name, 0.0) + seconds
+    metrics.inc("turns_traced_total")
+
+    entry = {
+        "ts": trace.wall_start,
+        "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in trace.phases.items()},
+        **trace.attrs,
+    }
+    _export(entry)
+    return entry
+
+
+# --- ESTADÍSTICAS DE LA SESIÓN ---
+
+def _percentile(ordered: List[float], q: float) -> float:
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summary() -> List[Tuple[str, int, float, float]]:
+    """(fase, turnos, p50 ms, p95 ms) de la sesión, en orden de aparición."""
+    with _lock:
+        items = [(name, list(values), _phase_counts[name]) for name, values in _phases.items()]
+    rows = []
+    for name, values, count in items:
+        ordered = sorted(values)
+        rows.append((name, count, _percentile(ordered, 50) * 1000, _percentile(ordered, 95) * 1000))
+    return rows
+
+
+def reset() -> None:
+    with _lock:
+        _phases.clear()
+        _phase_counts.clear()
+        _phase_sums.clear()
+
+
+# --- EXPORTACIÓN ---
+
+def _get_writer():
+    global _writer
+    if _writer is None:
+        _writer = WriteBehindWriter(maxsize=64, name="novia-trace")
+    return _writer
+
+
+def _export(entry: Dict[str, Any]) -> None:
+    if _trace_file is None and _prometheus_file is None:
+        return
+    writer = _get_writer()
+    if _trace_file is not None:
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        writer.submit(None, lambda path=_trace_file: _append_line(path, line))
+    if _prometheus_file is not None:
+        writer.submit(("trace", "prometheus"), lambda path=_prometheus_file: write_prometheus(path))
+
+
+def _append_line(path: Path, line: str) -> None:
+    with path.open("a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def prometheus_text() -> str:
+    """Snapshot en formato de texto de Prometheus: un summary por fase y los contadores de metrics."""
+    with _lock:
+        phases = [(name, sorted(values), _phase_counts[name], _phase_sums[name]) for name, values in _phases.items()]
+    lines = [
+        "# HELP novia_turn_phase_seconds Duración de cada fase de un turno de chat.",
+        "# TYPE novia_turn_phase_seconds summary",
+    ]
+    for name, ordered, count, total in phases:
+        for q in (0.5, 0.95, 0.99):
+            lines.append(f'novia_turn_phase_seconds{{phase="{name}",quantile="{q}"}} {_percentile(ordered, q * 100):.6f}')
+        lines.append(f'novia_turn_phase_seconds_sum{{phase="{name}"}} {total:.6f}')
+        lines.append(f'novia_turn_phase_seconds_count{{phase="{name}"}} {count}')
+    for name, value in sorted(metrics.snapshot().items()):
+        metric = "novia_" + "".join(c if c.isalnum() else "_" for c in name)
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: Path) -> None:
+    atomic_write_text(path, prometheus_text())
+
+
+def flush() -> None:
+    """Espera a que las trazas pendientes estén en disco."""
+    if _writer is not None:
+        _writer.flush()